@@ -3,7 +3,7 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from components.game import * 
 from components.frame import Agent, AgentFunctionCallingActionLanguage, AgentRegistry, ActionContext
-from components.model import generate_response
+from components.model import generate_response, agenerate_response
 import os
 import gspread
 from oauth2client.service_account import ServiceAccountCredentials
@@ -116,4 +116,4 @@ for public_action in public_tools_registry.get_actions(tags):
 
 # ----------------------------------------------------------
 # * Agent Creation
-google_sheet_agent = Agent("google_sheet_agent", goals, language, action_registry, generate_response, environment)
\ No newline at end of file
+google_sheet_agent = Agent("google_sheet_agent", goals, language, action_registry, generate_response, environment, agenerate_response = agenerate_response)
\ No newline at end of file
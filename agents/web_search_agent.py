@@ -3,18 +3,14 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from components.game import * 
 from components.frame import Agent, AgentFunctionCallingActionLanguage, AgentRegistry, ActionContext
-from components.model import generate_response
+from components.model import generate_response, agenerate_response
+from components.repo_scan import scan_report
+from components.resilience import http_get
 import os
 
 from public_tools import public_tools_registry
 
 
-import tempfile
-import subprocess
-import os
-import shutil
-import requests
-
 """
 agent file structure:
 
@@ -64,7 +60,7 @@ def google_search(action_context, search_keyword, num_results, *args, **kwargs):
     if not engine_id:
         return {"error": "Google Search Engine ID is not specified."}
 
-    response = requests.get(url, params = {
+    response = http_get("google_search", url, params = {
         "key": api_key,
         "cx": engine_id,
         "q": search_keyword,
@@ -83,73 +79,17 @@ def google_search(action_context, search_keyword, num_results, *args, **kwargs):
 def enhanced_full_scanner_tool(action_context, repo_url, *args, **kwargs):
     """
     scanner tool：
-    1. exclude specific directories and extensions.
-    2. load non-excluded files and concateneate contents to the report object
-    3. content of each file is limited to 5000 words
+    1. exclude specific directories and extensions, lockfiles, minified / generated / vendored files,
+       .gitignore'd files, oversized files, binaries and LFS pointers. exact duplicates are reported by reference.
+    2. read non-excluded files on a thread pool and stream their contents, in path order, into a manifest
+    3. pack the most important files into a report of at most SCAN_TOKEN_BUDGET tokens (whole files or excerpts)
+    4. reports are cached by the remote HEAD commit, so an unchanged repo is never read twice
+    5. the repo is kept as a local bare mirror: a re-scan only fetches new objects and re-reads the changed files
     """
-    tmp_dir = tempfile.mkdtemp(prefix="full_repo_scan_")
-    report = []
-    
-    # 3. 排除特定 extension 與目錄
-    exclude_dirs = {'.git', '__pycache__', '.pytest_cache', 'venv', 'node_modules', '.vscode'}
-    exclude_exts = {
-        '.png', '.jpg', '.jpeg', '.gif', '.ico',  # 圖片
-        '.mp4', '.mp3', '.wav',                   # 影音
-        '.zip', '.tar', '.gz', '.7z',             # 壓縮檔
-        '.exe', '.bin', '.dll', '.so', '.pyc',    # 二進位
-        '.DS_Store', '.env', '.pkl', '.model',    # 系統/模型/金鑰
-        '.onnx', '.tflite', '.pb',                # 機器學習模型
-        '.pdf', '.docx', '.xlsx', '.csv', '.parquet'                  
-    }
-
     try:
-        # 1. clone the git repo
-        subprocess.run(
-            ["git", "clone", "--depth", "1", repo_url, tmp_dir],
-            check=True, capture_output=True, text=True
-        )
-        
-        report.append(f"=== REPOSITORY FULL SCAN: {repo_url} ===\n")
-
-        # 2. 遞迴掃描所有內容
-        for root, dirs, files in os.walk(tmp_dir):
-            # 過濾排除目錄
-            dirs[:] = [d for d in dirs if d not in exclude_dirs]
-            
-            for f in files:
-                ext = os.path.splitext(f)[1].lower()
-                
-                # 3. 過濾排除副檔名
-                if ext in exclude_exts or f in exclude_exts:
-                    continue
-                
-                file_path = os.path.join(root, f)
-                rel_path = os.path.relpath(file_path, tmp_dir)
-                
-                report.append(f"\n--- FILE: {rel_path} ---")
-                
-                try:
-                    # 4. read contents
-                    with open(file_path, 'r', encoding='utf-8', errors='ignore') as content_file:
-                        content = content_file.read(5000)
-                        if not content.strip():
-                            report.append("[Empty File]")
-                        else:
-                            report.append(content)
-                            if len(content) >= 2500:
-                                report.append("\n[...CONTENT IS TOO LENGTHY. SLICED TO 5000 WORDS...]")
-                except Exception as e:
-                    report.append(f"[UNABLE TO READ FILE: {str(e)}]")
-                
-                report.append("-" * 40)
-
-        return "\n".join(report)
-
+        return scan_report(repo_url)
     except Exception as e:
         return f"FAILED TO SCAN THE REPO: {str(e)}"
-    finally:
-        # Clean the temporary directory
-        shutil.rmtree(tmp_dir)
 
 # ----------------------------------------------------------
 # * Register Public Tools
@@ -160,4 +100,4 @@ for public_action in public_tools_registry.get_actions(tags):
 
 # ----------------------------------------------------------
 # * Agent Creation
-web_search_agent = Agent("web_search_agent", goals, language, action_registry, generate_response, environment)
\ No newline at end of file
+web_search_agent = Agent("web_search_agent", goals, language, action_registry, generate_response, environment, agenerate_response = agenerate_response)
\ No newline at end of file
@@ -2,7 +2,7 @@ import os, sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from components.game import * 
 from components.frame import Agent, AgentFunctionCallingActionLanguage, AgentRegistry, ActionContext
-from components.model import generate_response
+from components.model import generate_response, agenerate_response
 
 from public_tools import public_tools_registry
 import os
@@ -46,4 +46,4 @@ environment = Environment()
 
 # ----------------------------------------------------------
 # * Agent Creation
-writer_agent = Agent("writer_agent", goals, language, action_registry, generate_response, environment)
\ No newline at end of file
+writer_agent = Agent("writer_agent", goals, language, action_registry, generate_response, environment, agenerate_response = agenerate_response)
\ No newline at end of file
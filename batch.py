@@ -0,0 +1,220 @@
+"""
+Headless batch mode: write the README of every repository of a file, in parallel.
+
+    python batch.py repos.txt                              # one repository url per line ('#' starts a comment)
+    python batch.py repos.txt --output-dir readmes --concurrency 8
+
+Each repository is one manager-agent run in a worker process, and its README is written to the output directory.
+Every finished repository is appended to a checkpoint file, so running the same command again after a crash
+(or Ctrl-C) only processes the repositories that are not done yet. Throughput and latency are printed at the end.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List
+
+TASK_PROMPT = "Write a README.md for the remote git repository {url} and save it."
+
+
+# ----------------------------------------------------------
+# * Inputs, outputs and checkpoint
+def read_urls(path: str) -> List[str]:
+    """Repository urls of the file, in order and without duplicates"""
+    urls = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            url = line.split("#", 1)[0].strip()
+            if url and url not in urls:
+                urls.append(url)
+    return urls
+
+
+def readme_path(output_dir: str, url: str) -> str:
+    """e.g. https://github.com/owner/repo -> <output_dir>/github.com_owner_repo.md"""
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", url.split("://", 1)[-1].removesuffix(".git")).strip("_")
+    return os.path.join(output_dir, f"{name}.md")
+
+
+def load_checkpoint(path: str) -> Dict[str, Dict]:
+    """The last recorded result of every url. A line cut by a crash is ignored"""
+    results = {}
+    if not os.path.exists(path):
+        return results
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            results[record["url"]] = record
+    return results
+
+
+def pending_urls(urls: List[str], previous: Dict[str, Dict]) -> List[str]:
+    """The urls still to process: all but those done in a previous run whose README is still there"""
+    return [url for url in urls
+            if not (previous.get(url, {}).get("status") == "done" and os.path.exists(previous[url].get("path", "")))]
+
+
+def append_checkpoint(path: str, record: Dict):
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+
+
+# ----------------------------------------------------------
+# * Worker process
+# created once per worker process by `init_worker`, like the cached runtime of the Streamlit app
+_runtime = {}
+
+
+def init_worker(workers: int, debug: bool):
+    # every process has its own rate limiters: give each one its share of the budgets of the provider
+    # (before components.model is imported, since it reads them when it is imported)
+    import config
+    for limits in [*config.LLM_RATE_LIMITS.values(), config.LLM_DEFAULT_RATE_LIMIT]:
+        for key in ("rpm", "tpm", "max_in_flight"):
+            if limits.get(key):
+                limits[key] = max(limits[key] // workers, 1)
+
+    from agents.manager import manager_agent
+    from components.frame import AgentRegistry
+    from components.game import ActionContext
+
+    registry = AgentRegistry()
+    registry.register_agent("web_search_agent", "agents.web_search_agent:web_search_agent")
+    manager_agent.bind_agent_registry(registry)
+    _runtime["manager"] = manager_agent
+    _runtime["context"] = ActionContext(agent_registry = registry,
+                                        debug = debug,
+                                        ui_option = "cli",
+                                        properties = {
+                                            "GOOGLE_SEARCH_API_KEY": os.getenv("GOOGLE_SEARCH_API_KEY"),
+                                            "GOOGLE_SEARCH_ENGINE_ID": os.getenv("GOOGLE_SEARCH_ENGINE_ID")
+                                        })
+
+
+def generate_readme(url: str, output_path: str, max_iterations: int, deadline_seconds: float | None) -> Dict:
+    """Run the manager agent on one repository and write its README. Never raises: errors are part of the result"""
+    from components.game import Memory, Session
+    from components.model import summarize_messages
+    from config import MAX_HISTORY, MEMORY_MAX_TOKENS, MEMORY_MAX_ITEMS, MEMORY_COMPACT_TOKENS, MEMORY_KEEP_TOKENS
+    from utils_st import session_id_var
+
+    started = time.perf_counter()
+    session = Session(memory = Memory(max_history = MAX_HISTORY, max_tokens = MEMORY_MAX_TOKENS, max_items = MEMORY_MAX_ITEMS,
+                                      summarizer = summarize_messages, compact_tokens = MEMORY_COMPACT_TOKENS, keep_tokens = MEMORY_KEEP_TOKENS))
+    # the global memory log of each repository is its own session
+    session_id_var.set(session.session_id)
+    record = {"url": url, "session": session.session_id}
+    try:
+        manager = _runtime["manager"]
+        context = _runtime["context"]
+        manager.run(TASK_PROMPT.format(url = url),
+                    memory = session.memory,
+                    max_iterations = max_iterations,
+                    action_context = context.for_session(session),
+                    debug = context.debug,
+                    ui_option = context.ui_option,
+                    deadline_seconds = deadline_seconds)
+        if not session.readme:
+            raise RuntimeError("The agent finished without saving a README.")
+
+        # write to a temporary file first so a crash never leaves a partial README
+        tmp_path = output_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(session.readme)
+        os.replace(tmp_path, output_path)
+        record.update({"status": "done", "path": output_path})
+    except Exception as e:
+        record.update({"status": "failed", "error": f"{type(e).__name__}: {e}"})
+    record["seconds"] = round(time.perf_counter() - started, 3)
+    return record
+
+
+# ----------------------------------------------------------
+# * Statistics
+def percentile(values: List[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(math.ceil(q * len(values)) - 1, len(values) - 1)]
+
+
+def print_stats(records: List[Dict], skipped: int, wall_seconds: float):
+    done = [r for r in records if r["status"] == "done"]
+    failed = [r for r in records if r["status"] == "failed"]
+    print(f"\nProcessed {len(records)} repositories in {wall_seconds:.1f}s ({skipped} already done, skipped)")
+    print(f"  done: {len(done)}  failed: {len(failed)}")
+    if records and wall_seconds > 0:
+        print(f"  throughput: {len(done) / wall_seconds * 60:.2f} READMEs / min")
+    latencies = [r["seconds"] for r in done]
+    if latencies:
+        print(f"  latency (s): mean {statistics.mean(latencies):.1f}  p50 {percentile(latencies, 0.5):.1f}  "
+              f"p95 {percentile(latencies, 0.95):.1f}  max {max(latencies):.1f}")
+    for r in failed:
+        print(f"  failed: {r['url']}: {r['error']}")
+
+
+# ----------------------------------------------------------
+# * Main
+def main():
+    parser = argparse.ArgumentParser(description="Write the README of many repositories in parallel")
+    parser.add_argument("urls_file", help="file with one repository url per line")
+    parser.add_argument("--output-dir", default="readmes", help="directory of the READMEs (default: readmes)")
+    parser.add_argument("--concurrency", type=int, default=4, help="repositories processed at the same time, one process each (default: 4)")
+    parser.add_argument("--checkpoint", help="progress file used to resume (default: <output-dir>/checkpoint.jsonl)")
+    parser.add_argument("--max-iterations", type=int, default=50, help="agent iterations per repository (default: 50)")
+    parser.add_argument("--deadline", type=float, default=None, help="seconds per repository (default: AGENT_RUN_DEADLINE of config.py)")
+    parser.add_argument("--debug", action="store_true", help="print the thinking process of the agents")
+    args = parser.parse_args()
+
+    from config import AGENT_RUN_DEADLINE
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint = args.checkpoint or os.path.join(args.output_dir, "checkpoint.jsonl")
+    previous = load_checkpoint(checkpoint)
+
+    urls = read_urls(args.urls_file)
+    todo = pending_urls(urls, previous)
+    skipped = len(urls) - len(todo)
+    print(f"{len(urls)} repositories, {skipped} already done, {len(todo)} to process with {args.concurrency} workers")
+    if not todo:
+        return
+
+    records = []
+    started = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers = args.concurrency, initializer = init_worker, initargs = (args.concurrency, args.debug))
+    try:
+        futures = {
+            pool.submit(generate_readme, url, readme_path(args.output_dir, url), args.max_iterations, args.deadline or AGENT_RUN_DEADLINE): url
+            for url in todo
+        }
+        for future in as_completed(futures):
+            try:
+                record = future.result()
+            except Exception as e:
+                # the worker process died (e.g. out of memory): the repository is retried by the next run
+                record = {"url": futures[future], "status": "failed", "error": f"{type(e).__name__}: {e}", "seconds": None}
+            records.append(record)
+            append_checkpoint(checkpoint, record)
+            latency = f"{record['seconds']:.1f}s" if record["seconds"] is not None else "-"
+            print(f"[{len(records)}/{len(todo)}] {record['status']:<6} {latency:>8}  {record['url']}", flush = True)
+    except KeyboardInterrupt:
+        print("\nInterrupted: finished repositories are in the checkpoint; run the same command again to resume.", file = sys.stderr)
+        pool.shutdown(wait = False, cancel_futures = True)
+        raise
+    finally:
+        pool.shutdown(wait = False, cancel_futures = True)
+
+    print_stats(records, skipped, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
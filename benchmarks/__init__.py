@@ -0,0 +1 @@
+"""Offline benchmarks of the agent framework and the repository scanner: no LLM provider or network needed"""
@@ -0,0 +1,100 @@
+"""Generated local git repositories, served to the scanner through file:// urls"""
+
+import os
+import random
+import subprocess
+from typing import Dict
+
+
+# * Fixture sizes: number of source files and average size of a file
+REPO_SIZES: Dict[str, Dict[str, int]] = {
+    "small": {"files": 50, "file_kb": 2},
+    "medium": {"files": 500, "file_kb": 4},
+    "large": {"files": 3000, "file_kb": 4}
+}
+
+WORDS = ["agent", "memory", "prompt", "scanner", "digest", "mirror", "registry", "action", "goal", "token"]
+
+
+def _git(repo: str, *args):
+    subprocess.run(["git", "-C", repo, *args], check=True, capture_output=True)
+
+
+def _python_module(rng: random.Random, index: int, target_bytes: int) -> str:
+    """A plausible Python module of about target_bytes, with imports, classes and functions"""
+    lines = [f'"""Module {index} of the benchmark fixture"""', "", "import os", f"from pkg{index % 7} import mod{(index * 3) % 11}", ""]
+    size = sum(len(line) + 1 for line in lines)
+    n = 0
+    while size < target_bytes:
+        name = f"{rng.choice(WORDS)}_{n}"
+        block = [
+            f"class {name.title().replace('_', '')}:",
+            "    def run(self, value: int) -> int:",
+            f"        # {' '.join(rng.choice(WORDS) for _ in range(8))}",
+            f"        return value * {rng.randint(1, 100)}",
+            "",
+            f"def {name}(items):",
+            f"    return [item for item in items if item != {rng.randint(0, 9)}]",
+            ""
+        ]
+        lines += block
+        size += sum(len(line) + 1 for line in block)
+        n += 1
+    return "\n".join(lines)
+
+
+def make_repo(root: str, size: str = "small", seed: int = 0) -> str:
+    """
+    Create a git repository with the files of `REPO_SIZES[size]` under root and return its file:// url.
+    The content only depends on size and seed, so runs are comparable.
+    """
+    spec = REPO_SIZES[size]
+    rng = random.Random(seed)
+    repo = os.path.join(root, f"fixture_{size}")
+    os.makedirs(repo, exist_ok=True)
+
+    files = {
+        "README.md": f"# Fixture {size}\n\nGenerated repository for the scanner benchmark.\n",
+        "requirements.txt": "litellm\nstreamlit\n",
+        ".gitignore": "*.log\nbuild/\n",
+        "main.py": "from pkg0 import mod0\n\nif __name__ == '__main__':\n    print('fixture')\n",
+        # files that the filter must drop without reading them
+        "package-lock.json": "{}\n" * 100,
+        "assets/logo.png": "\x89PNG" + "\0" * 512,
+        "debug.log": "ignored by .gitignore\n"
+    }
+    for i in range(spec["files"]):
+        package = f"pkg{i % 7}/sub{i % 5}"
+        files[f"{package}/mod{i}.py"] = _python_module(rng, i, spec["file_kb"] * 1024)
+    for i in range(7):
+        files[f"pkg{i}/__init__.py"] = f'"""Package {i}"""\n'
+
+    for rel, content in files.items():
+        path = os.path.join(repo, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(content)
+
+    subprocess.run(["git", "init", "--quiet", repo], check=True, capture_output=True)
+    _git(repo, "add", "-A")
+    _git(repo, "-c", "user.name=bench", "-c", "user.email=bench@example.com", "commit", "--quiet", "-m", "fixture")
+    return f"file://{os.path.abspath(repo)}"
+
+
+def commit_change(repo_url: str, files_changed: int = 5, seed: int = 1, files_deleted: int = 0):
+    """Modify (and optionally delete) a few files of a fixture and commit, to measure incremental re-scans"""
+    repo = repo_url[len("file://"):]
+    rng = random.Random(seed)
+    modules = sorted(
+        os.path.join(dirpath, name)
+        for dirpath, _, names in os.walk(repo) if ".git" not in dirpath
+        for name in names if name.startswith("mod") and name.endswith(".py")
+    )
+    picked = rng.sample(modules, min(files_changed + files_deleted, len(modules)))
+    for path in picked[:files_changed]:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(f"\n# changed {rng.random()}\n")
+    for path in picked[files_changed:]:
+        os.remove(path)
+    _git(repo, "add", "-A")
+    _git(repo, "-c", "user.name=bench", "-c", "user.email=bench@example.com", "commit", "--quiet", "-m", "change")
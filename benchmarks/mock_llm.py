@@ -0,0 +1,49 @@
+"""A deterministic stand-in for `generate_response` that replays a script of responses"""
+
+import json
+import threading
+from typing import Dict, List, Optional
+
+from litellm import Message
+
+from components.game import Prompt
+
+
+def tool_call(name: str, args: Optional[Dict] = None, call_id: Optional[str] = None) -> Dict:
+    """One step of a script that calls a tool"""
+    return {"tool": name, "args": args or {}, "id": call_id}
+
+
+class ScriptedLLM:
+    """
+    Returns the steps of `script` in order, one per call, then repeats the last one.
+    A step is either a string (the LLM answers without a tool) or a list of `tool_call`s (made in one response).
+    The size of every prompt is recorded, so benchmarks can report how prompts grow.
+    """
+    def __init__(self, script: List):
+        self.script = script
+        self.calls = 0
+        self.prompt_bytes: List[int] = []
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt: Prompt) -> Message:
+        with self._lock:
+            step = self.script[min(self.calls, len(self.script) - 1)]
+            self.calls += 1
+            call_number = self.calls
+            self.prompt_bytes.append(len(json.dumps(prompt.messages, default=str)) + len(json.dumps(prompt.tools)))
+
+        if isinstance(step, str):
+            return Message(role="assistant", content=step)
+        return Message(role="assistant", content="", tool_calls=[
+            {
+                "id": call["id"] or f"call_{call_number}_{i}",
+                "type": "function",
+                "function": {"name": call["tool"], "arguments": json.dumps(call["args"])}
+            } for i, call in enumerate(step)
+        ])
+
+    def reset(self):
+        with self._lock:
+            self.calls = 0
+            self.prompt_bytes = []
@@ -0,0 +1,334 @@
+"""
+Offline benchmark suite.
+
+    python -m benchmarks.run                       # full run, results saved under benchmarks/results/
+    python -m benchmarks.run --quick               # smaller fixtures and fewer repeats
+    python -m benchmarks.run --compare old.json    # also print the change of every metric against a previous run
+
+The LLM is replaced by `ScriptedLLM` and repositories are generated locally and scanned through file:// urls,
+so the numbers only measure the overhead of this project. Caches, mirrors, blobs, the event log and traces
+are written to a temporary directory, so a run never touches (or benefits from) the real ones.
+"""
+
+import argparse
+import copy
+import datetime as dt
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List
+
+# no request ever leaves the machine: the provider key is only needed to import components.model
+os.environ.setdefault("CEREBRAS_API_KEY", "offline-benchmark")
+os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+from benchmarks.fixtures import REPO_SIZES, make_repo, commit_change
+from benchmarks.mock_llm import ScriptedLLM, tool_call
+from components.blob_store import BlobStore
+from components.event_log import EventLog
+from components.frame import Agent, AgentRegistry
+from components.game import Action, ActionContext, ActionRegistry, AgentFunctionCallingActionLanguage, Environment, Goal, Memory
+from components.scan_cache import ScanCache
+from components.tokens import count_tokens
+from components import repo_scan, tracing
+from config import MAX_HISTORY, MEMORY_MAX_TOKENS, MEMORY_MAX_ITEMS
+import utils_st
+
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def measure(func: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Run func `repeat` times and return wall-clock statistics in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "min_ms": round(min(samples), 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "mean_ms": round(statistics.fmean(samples), 3),
+        "repeat": repeat
+    }
+
+
+def isolate(work_dir: str):
+    """Point every on-disk store of the process at work_dir"""
+    repo_scan.scan_cache = ScanCache(os.path.join(work_dir, "scan_cache"))
+    repo_scan.SCAN_MIRROR_DIR = os.path.join(work_dir, "mirrors")
+    utils_st.event_log = EventLog(os.path.join(work_dir, "events.sqlite3"))
+    if tracing.exporter is not None:
+        tracing.exporter.close()
+        tracing.exporter = tracing.JsonlExporter(os.path.join(work_dir, "traces.jsonl"))
+
+
+def make_registry(n_tools: int) -> ActionRegistry:
+    registry = ActionRegistry()
+    for i in range(n_tools):
+        registry.register(Action(
+            name=f"tool_{i}",
+            function=lambda action_context, **args: {"ok": True},
+            description=f"Benchmark tool number {i}. " + "It does nothing useful, but its description is realistic in length. " * 3,
+            parameters={
+                "type": "object",
+                "properties": {"path": {"type": "string"}, "limit": {"type": "number"}, "recursive": {"type": "boolean"}},
+                "required": ["path"]
+            }
+        ))
+    return registry
+
+
+def make_agent(name: str, llm: ScriptedLLM, registry: ActionRegistry, blob_store: BlobStore) -> Agent:
+    goals = [Goal("You are a benchmark agent."), Goal("Call the tools you are told to call.")]
+    return Agent(name, goals, AgentFunctionCallingActionLanguage(), registry, llm, Environment(), blob_store=blob_store)
+
+
+# ----------------------------------------------------------
+# * Benchmarks
+
+def bench_agent_loop(blob_store: BlobStore, iterations: int, repeat: int) -> Dict:
+    """Overhead of one GAME loop iteration around an instant LLM and a no-op tool"""
+    llm = ScriptedLLM([[tool_call("tool_0", {"path": "."})]] * iterations + ["done"])
+    agent = make_agent("bench_loop_agent", llm, make_registry(10), blob_store)
+
+    def run():
+        llm.reset()
+        agent.run("benchmark task", max_iterations=iterations + 1)
+
+    stats = measure(run, repeat)
+    return {
+        **stats,
+        "iterations": iterations + 1,
+        "per_iteration_us": round(stats["median_ms"] * 1000 / (iterations + 1), 1),
+        "first_prompt_bytes": llm.prompt_bytes[0],
+        "last_prompt_bytes": llm.prompt_bytes[-1]
+    }
+
+
+def bench_construct_prompt(blob_store: BlobStore, tool_counts: List[int], memory_sizes: List[int], repeat: int) -> Dict:
+    """Cost of building one prompt (compiled prefix + memory window) and of serializing the tool schemas"""
+    results = {}
+    for n_tools in tool_counts:
+        registry = make_registry(n_tools)
+        agent = make_agent("bench_prompt_agent", ScriptedLLM(["done"]), registry, blob_store)
+        language = agent.agent_language
+        actions = registry.get_actions()
+        results[f"format_actions_{n_tools}_tools"] = measure(lambda: language.format_actions(actions), repeat)
+        results[f"compile_prefix_{n_tools}_tools"] = measure(lambda: language.compile_prefix(agent.goals, actions), repeat)
+
+        for n_messages in memory_sizes:
+            memory = Memory(max_history=MAX_HISTORY, max_tokens=MEMORY_MAX_TOKENS, max_items=MEMORY_MAX_ITEMS)
+            memory.add_memory({"role": "user", "content": "benchmark task"})
+            for i in range(n_messages):
+                memory.add_memory({"role": "assistant" if i % 2 else "user", "content": f"message {i} " + "lorem ipsum " * 20})
+            results[f"construct_prompt_{n_tools}_tools_{n_messages}_messages"] = measure(
+                lambda: agent.construct_prompt(agent.goals, memory, registry), repeat
+            )
+    return results
+
+
+def bench_memory(message_counts: List[int]) -> Dict:
+    """Cost of adding messages and of reading the window, and the size of the window as memory grows"""
+    results = {}
+    for n in message_counts:
+        memory = Memory(max_history=MAX_HISTORY, max_tokens=MEMORY_MAX_TOKENS, max_items=MEMORY_MAX_ITEMS)
+        memory.add_memory({"role": "user", "content": "benchmark task"})
+        start = time.perf_counter()
+        for i in range(n // 2):
+            memory.add_memory({"role": "assistant", "content": f"step {i} " + "thinking " * 30})
+            memory.add_memory({"role": "user", "content": json.dumps({"tool_executed": True, "result": "output " * 60})})
+        add_ms = (time.perf_counter() - start) * 1000
+
+        window = memory.get_memories()
+        results[f"{n}_messages"] = {
+            "add_us_per_message": round(add_ms * 1000 / max(n, 1), 2),
+            "get_memories": measure(memory.get_memories, 20),
+            "stored_messages": len(memory.items),
+            "stored_tokens": memory.total_tokens(),
+            "window_messages": len(window),
+            "window_tokens": sum(Memory.count_tokens(item) for item in window)
+        }
+    return results
+
+
+def _worktree_stats(repo_url: str):
+    repo = repo_url[len("file://"):]
+    files, size = 0, 0
+    for dirpath, dirnames, names in os.walk(repo):
+        dirnames[:] = [d for d in dirnames if d != ".git"]
+        for name in names:
+            files += 1
+            size += os.path.getsize(os.path.join(dirpath, name))
+    return files, size
+
+
+def bench_scanner(work_dir: str, sizes: List[str]) -> Dict:
+    """Throughput of `enhanced_full_scanner_tool` on generated repositories: cold, cached and incremental scans"""
+    from agents.web_search_agent import enhanced_full_scanner_tool
+
+    results = {}
+    for size in sizes:
+        repo_url = make_repo(os.path.join(work_dir, "fixtures"), size)
+        files, size_bytes = _worktree_stats(repo_url)
+
+        start = time.perf_counter()
+        report = enhanced_full_scanner_tool(action_context=None, repo_url=repo_url)
+        cold = time.perf_counter() - start
+        if report.startswith("FAILED TO SCAN THE REPO"):
+            raise RuntimeError(report)
+
+        warm = measure(lambda: enhanced_full_scanner_tool(action_context=None, repo_url=repo_url), 3)
+
+        commit_change(repo_url, files_changed=5)
+        start = time.perf_counter()
+        enhanced_full_scanner_tool(action_context=None, repo_url=repo_url)
+        incremental = time.perf_counter() - start
+
+        results[size] = {
+            "files": files,
+            "bytes": size_bytes,
+            "cold_ms": round(cold * 1000, 3),
+            "files_per_sec": round(files / cold, 1),
+            "mb_per_sec": round(size_bytes / 1024 / 1024 / cold, 3),
+            "cached": warm,
+            "incremental_5_files_ms": round(incremental * 1000, 3),
+            "report_tokens": count_tokens(report)
+        }
+    return results
+
+
+def bench_call_agent(blob_store: BlobStore, depths: List[int], repeat: int) -> Dict:
+    """Overhead of nested `call_agent` invocations: each level calls the next one, the last one answers"""
+    from agents.manager import action_registry as manager_registry
+
+    call_agent_action = manager_registry.get_action("call_agent")
+    results = {}
+    for depth in depths:
+        agent_registry = AgentRegistry()
+        llms = []
+        for level in range(depth + 1):
+            if level < depth:
+                script = [[tool_call("call_agent", {"agent_name": f"level_{level + 1}", "task": f"task of level {level + 1}"})], f"level {level} done"]
+            else:
+                script = ["leaf answer"]
+            llm = ScriptedLLM(script)
+            registry = make_registry(3)
+            # a copy per registry: binding an agent registry rewrites the description of the action,
+            # which must not leak into other cases or into the manager agent of the process
+            registry.register(copy.copy(call_agent_action))
+            agent_registry.register_agent(f"level_{level}", make_agent(f"level_{level}", llm, registry, blob_store))
+            llms.append(llm)
+
+        context = ActionContext(agent_registry=agent_registry)
+        top = agent_registry.agents["level_0"]
+
+        def run():
+            for llm in llms:
+                llm.reset()
+            top.run("benchmark task", action_context=context)
+
+        results[f"depth_{depth}"] = measure(run, repeat)
+
+    base = results[f"depth_{depths[0]}"]["median_ms"]
+    for depth in depths[1:]:
+        results[f"depth_{depth}"]["per_level_ms"] = round((results[f"depth_{depth}"]["median_ms"] - base) / (depth - depths[0]), 3)
+    return results
+
+
+# ----------------------------------------------------------
+# * Results
+
+def _flatten(results: Dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}.{key}" if prefix else key
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare(baseline_path: str, results: Dict):
+    """Print every metric of this run next to the same metric of a previous run"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = _flatten(json.load(f)["results"])
+    current = _flatten(results)
+    print(f"{'metric':<70} {'baseline':>12} {'current':>12} {'change':>8}")
+    for name, value in current.items():
+        if name not in baseline:
+            continue
+        old = baseline[name]
+        change = f"{(value - old) / old * 100:+.1f}%" if old else "n/a"
+        print(f"{name:<70} {old:>12} {value:>12} {change:>8}")
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "-C", ROOT, "rev-parse", "HEAD"], check=True, capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ""
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmarks of the README agent")
+    parser.add_argument("--quick", action="store_true", help="small fixtures and fewer repeats")
+    parser.add_argument("--output", help="path of the JSON results (default: benchmarks/results/bench_<time>.json)")
+    parser.add_argument("--compare", help="JSON results of a previous run to compare against")
+    parser.add_argument("--only", nargs="+", choices=["agent_loop", "construct_prompt", "memory", "scanner", "call_agent"],
+                        help="run only these benchmarks")
+    args = parser.parse_args()
+
+    repeat = 3 if args.quick else 10
+    sizes = ["small"] if args.quick else list(REPO_SIZES)
+    selected = set(args.only or ["agent_loop", "construct_prompt", "memory", "scanner", "call_agent"])
+
+    work_dir = tempfile.mkdtemp(prefix="readme_agent_bench_")
+    try:
+        isolate(work_dir)
+        blob_store = BlobStore(os.path.join(work_dir, "blobs"))
+        results = {}
+        if "agent_loop" in selected:
+            results["agent_loop"] = bench_agent_loop(blob_store, iterations=20, repeat=repeat)
+        if "construct_prompt" in selected:
+            results["construct_prompt"] = bench_construct_prompt(blob_store, [10, 50], [10, 500], repeat=repeat * 10)
+        if "memory" in selected:
+            results["memory"] = bench_memory([100, 1000] if args.quick else [100, 1000, 10000])
+        if "scanner" in selected:
+            results["scanner"] = bench_scanner(work_dir, sizes)
+        if "call_agent" in selected:
+            results["call_agent"] = bench_call_agent(blob_store, [0, 1, 2, 3], repeat=repeat)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"bench_{dt.datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({
+            "created": dt.datetime.now().isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+            "results": results
+        }, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"\nResults saved to {output}")
+
+    if args.compare:
+        print()
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Content-addressed store for large tool results, so that memory only holds a preview and a handle"""
+
+import hashlib
+import os
+import re
+import threading
+from typing import Dict
+
+from components.disk_lru import LruDirectory
+from config import BLOB_STORE_DIR, BLOB_STORE_MAX_MB, BLOB_PREVIEW_CHARS, BLOB_PAGE_KB
+
+HANDLE_RE = re.compile(r"^blob:([0-9a-f]{64})$")
+
+
+class BlobStore:
+    """
+    Text blobs stored as one file each, named by the sha256 of their content, so the same result
+    stored twice (e.g. in the local and the global memory) takes the space of one.
+    The least recently used blobs are evicted once the total size exceeds `max_bytes`.
+    """
+    def __init__(self, root: str, max_bytes: int = 500 * 1024 * 1024, preview_chars: int = 2000, page_bytes: int = 24 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.preview_chars = preview_chars
+        self.page_bytes = page_bytes
+        self._files = LruDirectory(root, max_bytes, (".txt",))
+        self._lock = threading.Lock()
+
+    @property
+    def evictions(self) -> int:
+        return self._files.evictions
+
+    def _path(self, handle: str) -> str:
+        match = HANDLE_RE.match(handle.strip())
+        if not match:
+            raise ValueError(f"Invalid blob handle: '{handle}'. A handle looks like 'blob:<64 hex characters>'.")
+        return os.path.join(self.root, f"{match.group(1)}.txt")
+
+    def put(self, text: str) -> str:
+        """Store text and return its handle"""
+        data = text.encode("utf-8")
+        handle = f"blob:{hashlib.sha256(data).hexdigest()}"
+        path = self._path(handle)
+        with self._lock:
+            if os.path.exists(path):
+                # * touch the blob so that LRU eviction keeps it around
+                self._files.touch(path)
+                return handle
+            self._files.write(path, data)
+        return handle
+
+    def describe(self, handle: str, text: str) -> Dict:
+        """What memory keeps instead of the blob: its handle, size and first characters"""
+        return {
+            "blob": handle,
+            "bytes": len(text.encode("utf-8")),
+            "lines": text.count("\n") + 1,
+            "preview": text[:self.preview_chars],
+            "note": "The full result is stored as a blob. Page through it with the 'read_blob' tool."
+        }
+
+    def read(self, handle: str, start: int = 0, end: int | None = None, unit: str = "lines") -> Dict:
+        """
+        Part of a blob: lines or bytes [start, end), 0-based.
+        A page never exceeds `page_bytes`; the returned `end` tells where the next page starts.
+        """
+        if unit not in ("lines", "bytes"):
+            raise ValueError("unit must be 'lines' or 'bytes'")
+        path = self._path(handle)
+        with self._lock:
+            try:
+                with open(path, "rb") as f:
+                    data = f.read()
+                self._files.touch(path)
+            except FileNotFoundError:
+                raise ValueError(f"Blob '{handle}' does not exist or has been evicted.")
+
+        start = max(int(start or 0), 0)
+        if unit == "bytes":
+            total = len(data)
+            end = min(total if end is None else int(end), start + self.page_bytes, total)
+            content = data[start:end].decode("utf-8", errors="ignore")
+        else:
+            lines = data.decode("utf-8").split("\n")
+            total = len(lines)
+            end = total if end is None else min(int(end), total)
+            page, size = [], 0
+            for line in lines[start:end]:
+                size += len(line.encode("utf-8")) + 1
+                if page and size > self.page_bytes:
+                    break
+                page.append(line)
+            end = start + len(page)
+            content = "\n".join(page)
+
+        return {
+            "blob": handle,
+            "unit": unit,
+            "start": start,
+            "end": max(end, start),
+            "total": total,
+            "content": content
+        }
+
+    def stats(self) -> Dict[str, int]:
+        """Eviction counter and the current size of the store"""
+        with self._lock:
+            return self._files.usage()
+
+
+# * Shared by every agent of the process
+blob_store = BlobStore(
+    BLOB_STORE_DIR,
+    max_bytes = BLOB_STORE_MAX_MB * 1024 * 1024,
+    preview_chars = BLOB_PREVIEW_CHARS,
+    page_bytes = BLOB_PAGE_KB * 1024
+)
@@ -0,0 +1,272 @@
+"""Pack the scanned files of a repository into a report that fits a token budget"""
+
+import posixpath
+import re
+import tempfile
+from collections import Counter
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from components.scanner import iter_manifest
+from components.tokens import count_tokens
+
+
+SEPARATOR = "-" * 40
+
+# * Ranking rules
+MANIFEST_FILES = {
+    'pyproject.toml', 'setup.py', 'setup.cfg', 'requirements.txt', 'environment.yml', 'Pipfile',
+    'package.json', 'tsconfig.json', 'Cargo.toml', 'go.mod', 'pom.xml', 'build.gradle', 'build.gradle.kts',
+    'Gemfile', 'composer.json', 'mix.exs', 'pubspec.yaml', 'CMakeLists.txt', 'Makefile', 'Dockerfile',
+    'docker-compose.yml', 'docker-compose.yaml', 'config.py'
+}
+ENTRY_POINTS = {
+    'main.py', '__main__.py', 'app.py', 'cli.py', 'manage.py', 'server.py', 'wsgi.py', 'asgi.py',
+    'index.js', 'index.ts', 'main.js', 'main.ts', 'app.js', 'app.ts', 'server.js', 'server.ts',
+    'main.go', 'main.rs', 'lib.rs', 'Main.java', 'Program.cs', 'main.c', 'main.cpp'
+}
+LOW_PRIORITY_DIRS = {'test', 'tests', 'spec', 'specs', '__tests__', 'examples', 'example', 'benchmarks', 'fixtures'}
+
+PY_IMPORT_RE = re.compile(r"^\s*(?:from\s+(\.*[\w\.]*)\s+import|import\s+([\w\.]+))", re.M)
+JS_IMPORT_RE = re.compile(r"""(?:\bfrom\s+|\brequire\(\s*|\bimport\s*\(?\s*)['"]([^'"]+)['"]""")
+SIGNATURE_RE = re.compile(
+    r"^\s*(?:export\s+)?(?:default\s+)?(?:pub(?:\([\w:]+\))?\s+)?(?:async\s+)?"
+    r"(?:def|class|function|interface|type|struct|enum|trait|impl|fn|func|module|public|protected)\b"
+)
+
+# * Budget rules
+LISTING_SHARE = 0.1           # share of the budget that the file listing may use
+MAX_FILE_SHARE = 0.25         # share of the budget that one excerpt may use
+MIN_EXCERPT_TOKENS = 200      # below this, a file is only listed
+
+
+@dataclass
+class FileStat:
+    path: str
+    tokens: int
+    lines: int
+    digest: str
+    score: float = 0.0
+    importers: int = 0
+    duplicate_of: Optional[str] = None
+    mode: str = "omitted"     # full / excerpt / omitted / duplicate
+    budget: int = 0
+
+
+def _module_keys(path: str) -> List[str]:
+    """Names under which other files may import this one"""
+    stem, ext = posixpath.splitext(path)
+    if ext == ".py":
+        parts = stem.split("/")
+        if parts[-1] == "__init__":
+            parts = parts[:-1]
+        keys = [".".join(parts)]
+        if parts and parts[0] in ("src", "lib"):
+            keys.append(".".join(parts[1:]))
+        return [k for k in keys if k]
+    if ext in (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs"):
+        return [stem[:-len("/index")] if stem.endswith("/index") else stem]
+    return []
+
+
+def _imported_keys(path: str, content: str) -> List[str]:
+    """Module keys imported by a file, in the form produced by `_module_keys`"""
+    ext = posixpath.splitext(path)[1]
+    package = posixpath.dirname(path).replace("/", ".")
+    keys = []
+    if ext == ".py":
+        for match in PY_IMPORT_RE.finditer(content):
+            name = match.group(1) or match.group(2)
+            if name.startswith("."):
+                level = len(name) - len(name.lstrip("."))
+                base = package.split(".") if package else []
+                base = base[:len(base) - (level - 1)] if level > 1 else base
+                name = ".".join(base + [name.lstrip(".")] if name.lstrip(".") else base)
+            # `import a.b.c` may refer to the package a.b as well as the module a.b.c
+            parts = name.split(".")
+            keys += [".".join(parts[:i]) for i in range(len(parts), 0, -1)]
+    elif ext in (".js", ".jsx", ".ts", ".tsx", ".mjs", ".cjs"):
+        for match in JS_IMPORT_RE.finditer(content):
+            target = match.group(1)
+            if target.startswith("."):
+                target = posixpath.normpath(posixpath.join(posixpath.dirname(path), target))
+                keys.append(posixpath.splitext(target)[0])
+    return keys
+
+
+def importance(path: str, importers: int) -> float:
+    """Heuristic score of how much a file tells about the repository"""
+    name = posixpath.basename(path)
+    parts = path.split("/")
+    score = 0.0
+    if name.lower().startswith("readme"):
+        score += 100 if len(parts) == 1 else 30
+    if name in MANIFEST_FILES:
+        score += 80 if len(parts) == 1 else 40
+    if name in ENTRY_POINTS:
+        score += 60
+    if name == "__init__.py":
+        score += 25
+    if parts[0].lower() in ("docs", "doc") and name.endswith((".md", ".rst")):
+        score += 15
+    if any(p.lower() in LOW_PRIORITY_DIRS for p in parts[:-1]):
+        score -= 30
+    score += min(importers, 10) * 6
+    score -= 2 * (len(parts) - 1)
+    return score
+
+
+def _fit_lines(lines: List[str], budget: int, from_end: bool = False) -> List[str]:
+    """The longest run of lines from the start (or end) of `lines` that fits in budget tokens"""
+    taken, used = [], 0
+    for line in (reversed(lines) if from_end else lines):
+        cost = count_tokens(line) + 1
+        if used + cost > budget:
+            break
+        taken.append(line)
+        used += cost
+    return list(reversed(taken)) if from_end else taken
+
+
+def excerpt(content: str, budget: int) -> str:
+    """Head, signatures and tail of a file, in about `budget` tokens"""
+    lines = content.splitlines()
+    head = _fit_lines(lines, int(budget * 0.45))
+    tail = _fit_lines(lines[len(head):], int(budget * 0.15), from_end=True)
+    middle = lines[len(head):len(lines) - len(tail)]
+
+    signatures = [f"{len(head) + i + 1}: {line.rstrip()}" for i, line in enumerate(middle) if SIGNATURE_RE.match(line)]
+    signatures = _fit_lines(signatures, int(budget * 0.4) - 20)
+
+    parts = head
+    if middle:
+        parts += [f"[...{len(middle)} OF {len(lines)} LINES OMITTED. SIGNATURES OF THE OMITTED PART:]"]
+        parts += signatures or ["(none)"]
+        parts += ["[...END OF SIGNATURES...]"]
+    return "\n".join(parts + tail)
+
+
+class ScanReportWriter:
+    """
+    Spooled report buffer with a hard byte cap.
+    Small reports stay in memory, large ones roll over to a temporary file,
+    and anything beyond `max_bytes` is dropped with a notice at the end of the report.
+    """
+    def __init__(self, max_bytes: int, spool_bytes: int = 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.truncated = False
+        self._buffer = tempfile.SpooledTemporaryFile(max_size=spool_bytes, mode="w+b")
+
+    def write(self, text: str) -> bool:
+        """Append text to the report. Returns False once the byte cap has been reached."""
+        if self.truncated:
+            return False
+
+        data = (text + "\n").encode("utf-8")
+        remaining = self.max_bytes - self.size
+        if len(data) > remaining:
+            # cut on a character boundary so the report stays valid utf-8
+            data = data[:remaining].decode("utf-8", errors="ignore").encode("utf-8")
+            self.truncated = True
+
+        self._buffer.write(data)
+        self.size += len(data)
+        return not self.truncated
+
+    def getvalue(self) -> str:
+        self._buffer.seek(0)
+        report = self._buffer.read().decode("utf-8")
+        if self.truncated:
+            report += f"\n[...REPORT EXCEEDED {self.max_bytes} BYTES. REMAINING FILES WERE SKIPPED...]"
+        return report
+
+    def close(self):
+        self._buffer.close()
+
+
+def _format_block(stat: FileStat, body: str) -> str:
+    return "\n".join([f"\n--- FILE: {stat.path} ---", body, SEPARATOR])
+
+
+def _listing(stats: List[FileStat], budget: int) -> str:
+    """List every file with how it was packed; collapse to per-directory counts if the list is too long"""
+    rows = [f"{s.path} [{s.mode if s.mode != 'duplicate' else 'duplicate of ' + s.duplicate_of}]" for s in stats]
+    listing = "\n".join(rows)
+    if count_tokens(listing) <= budget:
+        return listing
+
+    counts = Counter(posixpath.dirname(s.path) or "." for s in stats)
+    rows = [f"{d}/ ({n} files)" for d, n in sorted(counts.items())]
+    return "\n".join(_fit_lines(rows, budget) + ["[...LISTING TRUNCATED...]"])
+
+
+def pack_digest(manifest_path: str, header: str, token_budget: int, max_bytes: int = 4 * 1024 * 1024) -> str:
+    """
+    Build the scan report from a manifest so that it fits `token_budget` tokens.
+
+    Files are ranked by importance (README, manifests, entry points, `__init__`, most imported modules),
+    then included whole while they fit. A file that does not fit whole gets a head / signatures / tail excerpt,
+    and once the budget runs out, the remaining files are only listed.
+    """
+    # 1. first pass: token counts, duplicates and the import graph
+    stats: Dict[str, FileStat] = {}
+    first_by_hash: Dict[str, str] = {}
+    module_owner: Dict[str, str] = {}
+    imported = Counter()
+    for path, content, digest in iter_manifest(manifest_path):
+        stat = FileStat(path, count_tokens(content), content.count("\n") + 1, digest)
+        if digest and digest in first_by_hash:
+            stat.duplicate_of, stat.mode = first_by_hash[digest], "duplicate"
+        else:
+            first_by_hash.setdefault(digest, path)
+        stats[path] = stat
+        for key in _module_keys(path):
+            module_owner.setdefault(key, path)
+        for key in set(_imported_keys(path, content)):
+            imported[(path, key)] += 1
+
+    for (importer, key) in imported:
+        owner = module_owner.get(key)
+        if owner and owner != importer:
+            stats[owner].importers += 1
+    for stat in stats.values():
+        stat.score = importance(stat.path, stat.importers)
+
+    # 2. spend the budget in order of importance
+    ranked = sorted(stats.values(), key=lambda s: (-s.score, s.path))
+    listing_budget = int(token_budget * LISTING_SHARE)
+    remaining = token_budget - count_tokens(header) - listing_budget
+    for stat in ranked:
+        if stat.mode == "duplicate":
+            continue
+        cost = stat.tokens + count_tokens(stat.path) + 12
+        if cost <= remaining:
+            stat.mode, stat.budget = "full", stat.tokens
+            remaining -= cost
+        elif remaining >= MIN_EXCERPT_TOKENS:
+            stat.mode = "excerpt"
+            stat.budget = min(remaining, max(MIN_EXCERPT_TOKENS, int(token_budget * MAX_FILE_SHARE)))
+            remaining -= stat.budget
+
+    # 3. second pass: collect the selected contents only
+    bodies = {}
+    for path, content, _ in iter_manifest(manifest_path):
+        stat = stats[path]
+        if stat.mode == "full":
+            bodies[path] = content if content.strip() else "[Empty File]"
+        elif stat.mode == "excerpt":
+            bodies[path] = excerpt(content, stat.budget)
+
+    # 4. write the report, most important files first
+    writer = ScanReportWriter(max_bytes)
+    try:
+        writer.write(header)
+        writer.write(f"=== FILES ({len(stats)}) ===")
+        writer.write(_listing(list(stats.values()), listing_budget))
+        for stat in ranked:
+            if stat.path in bodies:
+                writer.write(_format_block(stat, bodies[stat.path]))
+        return writer.getvalue()
+    finally:
+        writer.close()
@@ -0,0 +1,73 @@
+"""A directory of files bounded in total size, evicting the least recently used files first"""
+
+import os
+import tempfile
+from typing import Dict, Iterator, Tuple
+
+
+class LruDirectory:
+    """
+    The files of `root` whose names end with one of `suffixes`. Recency is the modification time:
+    `touch` a file when it is read, and `evict` removes the oldest files until the total size fits `max_bytes`.
+    Callers serialize the calls with their own lock.
+    """
+    def __init__(self, root: str, max_bytes: int, suffixes: Tuple[str, ...]):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffixes = suffixes
+        self.evictions = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def names(self) -> Iterator[str]:
+        for name in os.listdir(self.root):
+            if name.endswith(self.suffixes):
+                yield name
+
+    def touch(self, path: str):
+        """Mark a file as recently used, so that eviction keeps it around"""
+        os.utime(path, None)
+
+    def write(self, path: str, data: bytes):
+        """Write to a temporary file first so readers never see a partial file, then evict"""
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+        self.evict()
+
+    def evict(self) -> int:
+        """Remove the least recently used files until the total size fits, and return how many were removed"""
+        entries = []
+        total = 0
+        for name in self.names():
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        removed = 0
+        while total > self.max_bytes and entries:
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        self.evictions += removed
+        return removed
+
+    def usage(self) -> Dict[str, int]:
+        """Number of files, their total size and the bound"""
+        size, count = 0, 0
+        for name in self.names():
+            try:
+                size += os.path.getsize(os.path.join(self.root, name))
+            except OSError:
+                continue
+            count += 1
+        return {"evictions": self.evictions, "entries": count, "bytes": size, "max_bytes": self.max_bytes}
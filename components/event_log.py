@@ -0,0 +1,111 @@
+"""Append-only SQLite log of the global memory, indexed for filtered, paginated reads"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from config import EVENT_LOG_PATH
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    session TEXT NOT NULL,
+    agent TEXT NOT NULL,
+    role TEXT,
+    content TEXT,
+    tool_calls TEXT,
+    concise_content TEXT,
+    concise_tool_calls TEXT,
+    time REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS events_session_time ON events (session, time);
+CREATE INDEX IF NOT EXISTS events_session_agent_time ON events (session, agent, time);
+CREATE INDEX IF NOT EXISTS events_time ON events (time);
+"""
+
+COLUMNS = ["id", "session", "agent", "role", "content", "tool_calls", "concise_content", "concise_tool_calls", "time"]
+
+
+def _to_text(value: Any) -> Optional[str]:
+    if value is None or isinstance(value, str):
+        return value
+    return json.dumps(value, ensure_ascii=False, default=lambda o: o.model_dump() if hasattr(o, "model_dump") else str(o))
+
+
+class EventLog:
+    """
+    Every message of every agent, one row per event. Rows are only ever appended, so writers never
+    block readers (WAL mode), and the viewer reads one filtered page at a time through the indexes.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        with self._connection() as conn:
+            conn.executescript(SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread: sqlite3 connections must not be shared between threads"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def append(self, session: str, agent: str, role: str | None, content: Any = None, tool_calls: Any = None,
+               concise_content: Any = None, concise_tool_calls: Any = None, timestamp: float | None = None) -> int:
+        """Append one event and return its id"""
+        row = (
+            session, agent, role, _to_text(content), _to_text(tool_calls),
+            _to_text(concise_content), _to_text(concise_tool_calls), float(timestamp or time.time())
+        )
+        conn = self._connection()
+        with self._write_lock, conn:
+            cursor = conn.execute(
+                "INSERT INTO events (session, agent, role, content, tool_calls, concise_content, concise_tool_calls, time) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", row
+            )
+        return cursor.lastrowid
+
+    def _where(self, session: str | None, agent: str | None, role: str | None, search: str | None):
+        clauses, params = [], []
+        for column, value in (("session", session), ("agent", agent), ("role", role)):
+            if value:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if search:
+            clauses.append("content LIKE ?")
+            params.append(f"%{search}%")
+        return (" WHERE " + " AND ".join(clauses) if clauses else ""), params
+
+    def query(self, session: str | None = None, agent: str | None = None, role: str | None = None, search: str | None = None,
+              offset: int = 0, limit: int = 50, ascending: bool = True) -> List[Dict]:
+        """One page of events matching the filters, ordered by time"""
+        where, params = self._where(session, agent, role, search)
+        order = "ASC" if ascending else "DESC"
+        rows = self._connection().execute(
+            f"SELECT {', '.join(COLUMNS)} FROM events{where} ORDER BY time {order}, id {order} LIMIT ? OFFSET ?",
+            params + [int(limit), int(offset)]
+        ).fetchall()
+        return [dict(zip(COLUMNS, row)) for row in rows]
+
+    def count(self, session: str | None = None, agent: str | None = None, role: str | None = None, search: str | None = None) -> int:
+        where, params = self._where(session, agent, role, search)
+        return self._connection().execute(f"SELECT COUNT(*) FROM events{where}", params).fetchone()[0]
+
+    def agents(self, session: str | None = None) -> List[str]:
+        """Agents that logged at least one event (in the session)"""
+        where, params = self._where(session, None, None, None)
+        rows = self._connection().execute(f"SELECT DISTINCT agent FROM events{where} ORDER BY agent", params).fetchall()
+        return [row[0] for row in rows]
+
+
+# * Shared by every session of the process
+event_log = EventLog(EVENT_LOG_PATH)
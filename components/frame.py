@@ -1,10 +1,19 @@
-from components.game import Goal, Prompt, Action, ActionRegistry, Memory, Environment, AgentFunctionCallingActionLanguage, ActionContext
-from utils_st import add_global_memory
+from components.game import Goal, Prompt, PromptPrefix, Action, ActionRegistry, Memory, Environment, AgentFunctionCallingActionLanguage, ActionContext
+from components.tracing import span
+from components.resilience import deadline, check_deadline
+from components.jobs import report_progress
+from components.blob_store import BlobStore, blob_store as default_blob_store
+from config import BLOB_THRESHOLD_KB, AGENT_RUN_DEADLINE
+from utils_st import add_global_memory, bind_thread_context
 
+import asyncio
+import inspect
 import json
+import threading
 import time
 import streamlit as st
-from typing import List, Callable, Dict, Any, Tuple, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Callable, Any, Tuple, Awaitable, Iterator
  
 
     
@@ -17,7 +26,9 @@ class Agent:
         action_registry: ActionRegistry,
         generate_response: Callable[[Prompt], str],
         environment: Environment,
-        tags = None
+        tags = None,
+        agenerate_response: Callable[[Prompt], Awaitable[Any]] | None = None,
+        blob_store: BlobStore | None = default_blob_store
     ):
         """
         Initialize an agent with its core GAME components
@@ -25,10 +36,60 @@ class Agent:
         self.name = name
         self.goals = goals
         self.generate_response = generate_response
+        self.agenerate_response = agenerate_response
         self.agent_language = agent_language
         self.actions = action_registry
         self.environment = environment
         self.tags = tags
+        self._prefix: PromptPrefix | None = None
+        self._prefix_key = None
+        self._bound_registry = None
+        self._bind_lock = threading.Lock()
+
+        # large tool results are spilled to the blob store; the agent pages through them with 'read_blob'
+        self.blob_store = blob_store
+        if blob_store is not None and action_registry.get_action("read_blob") is None:
+            action_registry.register(self.read_blob_action(blob_store))
+
+    @staticmethod
+    def read_blob_action(blob_store: BlobStore) -> Action:
+        def read_blob(action_context: ActionContext, handle: str, start: int = 0, end: int | None = None, unit: str = "lines"):
+            return blob_store.read(handle, start, end, unit)
+
+        return Action(
+            name="read_blob",
+            function=read_blob,
+            description="Read part of a large tool result that was stored as a blob. Give its handle ('blob:...'), the unit ('lines' or 'bytes') and the range [start, end), 0-based. Long ranges are cut into pages; the returned 'end' is where the next page starts.",
+            parameters={
+                "type": "object",
+                "properties": {
+                    "handle": {"type": "string"},
+                    "start": {"type": "number"},
+                    "end": {"type": "number"},
+                    "unit": {"type": "string", "enum": ["lines", "bytes"]}
+                },
+                "required": ["handle"]
+            }
+        )
+
+    def traced_construct_prompt(self, memory: Memory) -> Prompt:
+        """`construct_prompt` with the goals and actions of this agent, timed as a span"""
+        with span("agent.construct_prompt", **{"agent.name": self.name}) as current:
+            prompt = self.construct_prompt(self.goals, memory, self.actions)
+            current.set(**{
+                "prompt.messages": len(prompt.messages),
+                "prompt.tools": len(prompt.tools),
+                "prompt.prefix_version": prompt.prefix_version
+            })
+            return prompt
+
+    def get_prompt_prefix(self, goals: List[Goal], actions: ActionRegistry) -> PromptPrefix:
+        """The compiled goals and tool schemas, rebuilt only when the goals or the registry change"""
+        key = (tuple(goals), id(actions), actions.version, tuple(self.tags or ()))
+        if self._prefix is None or self._prefix_key != key:
+            self._prefix = self.agent_language.compile_prefix(goals, actions.get_actions(self.tags))
+            self._prefix_key = key
+        return self._prefix
 
     def construct_prompt(self, goals: List[Goal], memory: Memory, actions: ActionRegistry) -> Prompt:
         """Build prompt with memory context"""
@@ -36,32 +97,31 @@ class Agent:
             actions=actions.get_actions(self.tags),
             environment=self.environment,
             goals=goals,
-            memory=memory
+            memory=memory,
+            prefix=self.get_prompt_prefix(goals, actions)
         )
 
-    def get_action(self, response):
-        invocation = self.agent_language.parse_response(response)
-        
-        # 如果 parse_response 沒抓到工具 (例如 invocation["tool"] 是 None 或 "final_answer")
-        if not invocation or not invocation.get("tool"):
-            return None, invocation
-            
-        action = self.actions.get_action(invocation["tool"])
-        return action, invocation
-    
-
-    
+    def get_actions(self, response) -> List[Tuple[Action | None, dict]]:
+        """(action, invocation) for every tool call of the response. The action is None if the LLM is talking or the tool does not exist."""
+        pairs = []
+        for invocation in self.agent_language.parse_response(response):
+            # 如果 parse_response 沒抓到工具 (例如 invocation["tool"] 是 None 或 "final_answer")
+            if not invocation.get("tool"):
+                pairs.append((None, invocation))
+            else:
+                pairs.append((self.actions.get_action(invocation["tool"]), invocation))
+        return pairs
 
     def should_terminate(self, response: str) -> bool:
-        action_def, invocation = self.get_action(response)
+        pairs = self.get_actions(response)
         
         # 情況 1：如果 LLM 沒有呼叫任何工具，代表它在直接對話，通常視為任務結束
-        if action_def is None:
+        if all(invocation["tool"] is None for _, invocation in pairs):
             # 如果你想讓 Agent 在說話時就停下來，這裡回傳 True
             return True 
         
-        # 情況 2：如果找到了工具，則根據該工具是否標記為 terminal 來決定
-        return getattr(action_def, 'terminal', False)
+        # 情況 2：如果找到了工具，則根據這些工具是否標記為 terminal 來決定
+        return any(getattr(action_def, 'terminal', False) for action_def, _ in pairs)
 
     def set_current_task(self, memory: Memory, task: str):
         """Inject the user's initial request into memory"""
@@ -71,7 +131,26 @@ class Agent:
         """update the task to global memories"""
         add_global_memory(self.name, {"role": "user", "content": content, "time": f"{time.time()}"})
 
-    def update_memory(self, memory: Memory, response: Any, result: dict):
+    def tool_result_content(self, invocation: dict, result: dict) -> str:
+        """The result as stored in memory. A large result is replaced by a preview and the handle of its blob."""
+        content = json.dumps(result)
+        if self.blob_store is None or invocation.get("tool") == "read_blob" or len(content.encode("utf-8")) <= BLOB_THRESHOLD_KB * 1024:
+            return content
+
+        payload = result.get("result") if isinstance(result, dict) and "result" in result else result
+        text = payload if isinstance(payload, str) else json.dumps(payload, indent=1, ensure_ascii=False)
+        handle = self.blob_store.put(text)
+        summary = {k: v for k, v in result.items() if k != "result"} if isinstance(result, dict) else {}
+        return json.dumps({**summary, "result": self.blob_store.describe(handle, text)})
+
+    def tool_result_message(self, invocation: dict, result: dict) -> dict:
+        """A tool result keyed by the id of the tool call that produced it (user message if the LLM was talking)"""
+        if invocation.get("id"):
+            return {"role": "tool", "tool_call_id": invocation["id"], "content": self.tool_result_content(invocation, result)}
+        return {"role": "user", "content": self.tool_result_content(invocation, result)}
+
+    def update_memory(self, memory: Memory, response: Any, messages: List[dict]):
+        """Store the response and the messages of its tool results (built once by `tool_result_message`)"""
         # 此時的 response 是 Message 物件
         # 將其轉換為 dict 存入記憶體
         assistant_mem = {
@@ -82,10 +161,11 @@ class Agent:
             assistant_mem["tool_calls"] = response.tool_calls
 
         memory.add_memory(assistant_mem)
-        memory.add_memory({"role": "user", "content": json.dumps(result)})
+        for message in messages:
+            memory.add_memory(message)
 
-    def update_memory_global(self, result: dict | Any, role: str):
-        assert role in ['user', 'assistant'], "role must be 'user' or 'assistant'"
+    def update_memory_global(self, result: dict | Any, role: str, invocation: dict | None = None, message: dict | None = None):
+        assert role in ['user', 'assistant', 'tool'], "role must be 'user', 'assistant' or 'tool'"
         if role == "assistant":
             assistant_mem = {
                 "role": role,
@@ -97,11 +177,50 @@ class Agent:
 
             add_global_memory(self.name, assistant_mem)
         else:
-            add_global_memory(self.name, {"role": role, 
-                                          "content": json.dumps(result),
-                                          "time": f"{time.time()}"})
+            if message is None:
+                message = self.tool_result_message(invocation or {}, result) if role == "tool" else \
+                          {"role": role, "content": json.dumps(result)}
+            add_global_memory(self.name, {**message, "time": f"{time.time()}"})
 
-    
+    def execute_invocations(self, pairs: List[Tuple[Action | None, dict]], action_context: ActionContext | None) -> List[Tuple[dict, dict]]:
+        """
+        Execute every tool call of one response. Several calls run in parallel on a worker pool,
+        and the results come back in the order of the calls.
+        """
+        def execute(pair):
+            action, invocation = pair
+            result = self.check_invocation(action, invocation)
+            if result is None:
+                result = self.environment.execute_action(action, action_context, invocation["args"])
+            return invocation, result
+
+        if len(pairs) == 1:
+            return [execute(pairs[0])]
+        with ThreadPoolExecutor(max_workers=len(pairs), thread_name_prefix=f"{self.name}_tools") as pool:
+            return list(pool.map(bind_thread_context(execute), pairs))
+
+    async def aexecute_invocations(self, pairs: List[Tuple[Action | None, dict]], action_context: ActionContext | None) -> List[Tuple[dict, dict]]:
+        """Async version of `execute_invocations`: every tool call of the response is awaited concurrently"""
+        async def execute(action, invocation):
+            result = self.check_invocation(action, invocation)
+            if result is None:
+                result = await self.environment.aexecute_action(action, action_context, invocation["args"])
+            return invocation, result
+
+        return list(await asyncio.gather(*(execute(action, invocation) for action, invocation in pairs)))
+
+    def record_results(self, memory: Memory, response: Any, results: List[Tuple[dict, dict]], debug: bool, ui_option: str):
+        """Update the local and global memories with the results of one iteration"""
+        if debug:
+            for invocation, result in results:
+                if invocation["tool"] is not None:
+                    self.debugging(ui_option, f">({self.name}) Action Result ({invocation['tool']}): {result}\n")
+
+        # a large result is spilled to the blob store once, and the same message goes to both memories
+        messages = [self.tool_result_message(invocation, result) for invocation, result in results]
+        self.update_memory(memory, response, messages)
+        for (invocation, result), message in zip(results, messages):
+            self.update_memory_global(result, role = message["role"], invocation = invocation, message = message)
 
     def prompt_llm_for_action(self, full_prompt: Prompt) -> str:
         """Call the provided LLM function"""
@@ -109,94 +228,212 @@ class Agent:
         return response
     
     def debugging(self, ui_option, message):
+        if report_progress(message):
+            # a background job: the UI reads the message from the events of the job
+            return
         if ui_option == "streamlit":
             st.write(message)
         else:
             print(message)
 
-    def run(self, user_input: str, memory=None, max_iterations: int = 50, action_context: ActionContext | None = None, debug = False, ui_option = "cli") -> Memory:
-        """
-        Execute the GAME loop for this agent with a maximum iteration limit.
-        """
-
+    def start_run(self, user_input: str, memory: Memory | None, action_context: ActionContext | None) -> Memory:
+        """Inject the task into memory and prepare the tools before the first iteration"""
         # set up memory
         memory = memory or Memory()
         self.set_current_task(memory, user_input)
         self.set_current_task_global(user_input)
 
-        # dynamically modify the description of 'call_agent' tool (for manager agent) if exists
-        registry, call_agent_tool = None, None
-        if action_context is not None:
-            registry = action_context.get_agent_registry()
-        call_agent_tool = self.actions.get_action("call_agent")
-        if call_agent_tool and registry:
+        # the registry is shared by the whole process, so the agent is bound to it once, not on every run
+        if action_context is not None and action_context.get_agent_registry():
+            self.bind_agent_registry(action_context.get_agent_registry())
+
+        return memory
+
+    def bind_agent_registry(self, registry: "AgentRegistry"):
+        """
+        Describe the agents of the registry in the 'call_agent' tools (for manager agent) if they exist.
+        Only a new registry changes the descriptions (and recompiles the prompt prefix).
+        """
+        with self._bind_lock:
+            if self._bound_registry is registry:
+                return
             names = list(registry.agents.keys())
-            call_agent_tool.description = f"Call another agent to finish a task. List of available agents: {names}"
+            self.actions.update_description("call_agent", f"Call another agent to finish a task. List of available agents: {names}")
+            self.actions.update_description("call_agents_in_parallel", f"Call several agents concurrently, each on its own task, and get all results together. Failed or timed-out tasks are reported without losing the other results. List of available agents: {names}")
+            self._bound_registry = registry
 
+    def check_invocation(self, action: Action | None, invocation: dict) -> dict | None:
+        """The result to record when the invocation cannot be executed, or None if the tool should run"""
+        if invocation['tool'] is None:        # --> LLM is talking, not using tools
+            return {
+                "tool_executed": False, 
+                "message": "LLM chose to respond without using a tool."
+            }
+        if action is None:                    # --> the tool does not exist
+            return {
+                "tool_executed": False, 
+                "error": f"Tool '{invocation['tool']}' does not exist. Please check your available tools."
+            }
+        return None
 
-        for _ in range(max_iterations):
-            # 1. Construct a prompt that includes the Goals, Actions, and the current Memory
-            prompt = self.construct_prompt(self.goals, memory, self.actions)
-            if debug:
-                self.debugging(ui_option, f">({self.name}) Agent thinking...\n")
-                
-
-            # 2. Generate a response from the agent and update the result to global
-            response = self.prompt_llm_for_action(prompt)
-            self.update_memory_global(response, role = "assistant")
-            if debug:
-                self.debugging(ui_option, f">({self.name}) Agent Decision: {response}\n")
-
-            # 3. Determine which action the agent wants to execute
-            action, invocation = self.get_action(response)
-
-            # 4. Execute the action in the environment
-            if invocation['tool'] is None:        # --> LLM is talking, not using tools
-                result = {
-                    "tool_executed": False, 
-                    "message": "LLM chose to respond without using a tool."
-                }
-            else:                                 # --> LLM is calling a tool
-                if action is None:
-                    # * the tool does not exist
-                    result = {
-                        "tool_executed": False, 
-                        "error": f"Tool '{invocation['tool']}' does not exist. Please check your available tools."
-                    }
-                else:
-                    # * the tool exists, execute it
-                    result = self.environment.execute_action(action, action_context, invocation["args"])
+    def stream_llm_for_action(self, full_prompt: Prompt) -> Iterator[dict]:
+        """
+        Call the provided LLM function in streaming mode: token / tool call deltas, then the complete message.
+        LLM functions without a `stream` parameter only yield the complete message.
+        """
+        if "stream" in inspect.signature(self.generate_response).parameters:
+            yield from self.generate_response(full_prompt, stream=True)
+        else:
+            yield {"type": "message", "message": self.generate_response(full_prompt)}
+
+    def run_events(self, user_input: str, memory=None, max_iterations: int = 50, action_context: ActionContext | None = None, debug = False, ui_option = "cli", stream: bool = True,
+                   deadline_seconds: float | None = AGENT_RUN_DEADLINE) -> Iterator[dict]:
+        """
+        Execute the GAME loop for this agent and yield what happens as events, tagged with the agent name:
+        - "token" / "tool_call_delta": deltas of the LLM response as they arrive (stream=True only)
+        - "message": the complete LLM response of one iteration
+        - "tool_result": the result of one tool call
+        - "done": the updated memory, always the last event
+        The run raises DeadlineExceeded once `deadline_seconds` have passed (a sub-agent also stops at the deadline of its caller).
+        """
+        with span("agent.run", **{"agent.name": self.name, "agent.input": user_input[:1000]}) as run_span, deadline(deadline_seconds):
+            memory = self.start_run(user_input, memory, action_context)
+
+            for iteration in range(max_iterations):
+                check_deadline(f"agent '{self.name}'")
+                run_span.set(**{"agent.iterations": iteration + 1})
+                with span("agent.iteration", **{"agent.name": self.name, "agent.iteration": iteration}):
+                    # 1. Construct a prompt that includes the Goals, Actions, and the current Memory
+                    prompt = self.traced_construct_prompt(memory)
+                    if debug:
+                        self.debugging(ui_option, f">({self.name}) Agent thinking...\n")
+
+                    # 2. Generate a response from the agent and update the result to global
+                    if stream:
+                        response = None
+                        for event in self.stream_llm_for_action(prompt):
+                            if event["type"] == "message":
+                                response = event["message"]
+                            else:
+                                yield {**event, "agent": self.name}
+                    else:
+                        response = self.prompt_llm_for_action(prompt)
+                    yield {"type": "message", "agent": self.name, "message": response}
+                    self.update_memory_global(response, role = "assistant")
+                    if debug:
+                        self.debugging(ui_option, f">({self.name}) Agent Decision: {response}\n")
+
+                    # 3. Determine which actions the agent wants to execute
+                    pairs = self.get_actions(response)
+
+                    # 4. Execute the actions in the environment, concurrently if there are several
+                    results = self.execute_invocations(pairs, action_context)
+                    for invocation, result in results:
+                        if invocation["tool"] is not None:
+                            yield {"type": "tool_result", "agent": self.name, "tool": invocation["tool"], "result": result}
+
+                    # 5. Update the agent's memory with information about what happened
+                    self.record_results(memory, response, results, debug, ui_option)
+
+                # 6. Check if the agent has decided to terminate
+                if self.should_terminate(response):
+                    break
+
+        yield {"type": "done", "agent": self.name, "memory": memory}
+
+    def run(self, user_input: str, memory=None, max_iterations: int = 50, action_context: ActionContext | None = None, debug = False, ui_option = "cli",
+            deadline_seconds: float | None = AGENT_RUN_DEADLINE) -> Memory:
+        """
+        Execute the GAME loop for this agent with a maximum iteration limit.
+        """
+        for event in self.run_events(user_input, memory, max_iterations, action_context, debug, ui_option, stream = False, deadline_seconds = deadline_seconds):
+            if event["type"] == "done":
+                memory = event["memory"]
+        return memory
+
+    async def aprompt_llm_for_action(self, full_prompt: Prompt) -> Any:
+        """Call the async LLM function, or run the sync one in a worker thread if there is none"""
+        if self.agenerate_response is not None:
+            return await self.agenerate_response(full_prompt)
+        return await asyncio.to_thread(self.generate_response, full_prompt)
+
+    async def arun(self, user_input: str, memory=None, max_iterations: int = 50, action_context: ActionContext | None = None, debug = False, ui_option = "cli",
+                   deadline_seconds: float | None = AGENT_RUN_DEADLINE) -> Memory:
+        """
+        Async version of `run`. The LLM call is awaited and sync tools run in a worker thread,
+        so one event loop can drive many agent sessions concurrently.
+        """
+        with span("agent.run", **{"agent.name": self.name, "agent.input": user_input[:1000]}) as run_span, deadline(deadline_seconds):
+            memory = self.start_run(user_input, memory, action_context)
+
+            for iteration in range(max_iterations):
+                check_deadline(f"agent '{self.name}'")
+                run_span.set(**{"agent.iterations": iteration + 1})
+                with span("agent.iteration", **{"agent.name": self.name, "agent.iteration": iteration}):
+                    # 1. Construct a prompt that includes the Goals, Actions, and the current Memory
+                    prompt = self.traced_construct_prompt(memory)
                     if debug:
-                        self.debugging(ui_option, f">({self.name}) Action Result: {result}\n")
+                        self.debugging(ui_option, f">({self.name}) Agent thinking...\n")
+
+                    # 2. Generate a response from the agent and update the result to global
+                    response = await self.aprompt_llm_for_action(prompt)
+                    self.update_memory_global(response, role = "assistant")
+                    if debug:
+                        self.debugging(ui_option, f">({self.name}) Agent Decision: {response}\n")
+
+                    # 3. Determine which actions the agent wants to execute
+                    pairs = self.get_actions(response)
+
+                    # 4. Execute the actions in the environment, concurrently if there are several
+                    results = await self.aexecute_invocations(pairs, action_context)
 
-            # 5. Update the agent's memory with information about what happened
-            self.update_memory(memory, response, result)
-            self.update_memory_global(result, role = "user")
+                    # 5. Update the agent's memory with information about what happened
+                    self.record_results(memory, response, results, debug, ui_option)
 
-            # 6. Check if the agent has decided to terminate
-            if self.should_terminate(response):
-                break
+                # 6. Check if the agent has decided to terminate
+                if self.should_terminate(response):
+                    break
 
         return memory
     
 
+def load_object(path: str) -> Any:
+    """The object at an import path 'package.module:attribute'"""
+    module, _, attribute = path.partition(":")
+    # through __import__ (not importlib.import_module), so that the import timer sees it
+    return getattr(__import__(module, fromlist=[attribute]), attribute)
+
+
 class AgentRegistry:
     def __init__(self):
         self.agents = {}
+        self.load_seconds = {}
+        self._lock = threading.Lock()
         
-    def register_agent(self, name: str, agent_object: Agent):
-        """Register an agent's run function."""
+    def register_agent(self, name: str, agent_object: Agent | str):
+        """Register an agent, or its import path ('package.module:attribute') to import it on first use."""
         self.agents[name] = agent_object
+
+    def is_loaded(self, name: str) -> bool:
+        return not isinstance(self.agents.get(name), str)
+
+    def load_agent(self, name: str) -> Agent | None:
+        """The agent object, imported now if it was registered by path"""
+        if self.is_loaded(name):
+            return self.agents.get(name)
+        with self._lock:
+            # two tools may call the same agent at once: import it only once
+            if not self.is_loaded(name):
+                start = time.perf_counter()
+                self.agents[name] = load_object(self.agents[name])
+                self.load_seconds[name] = time.perf_counter() - start
+            return self.agents[name]
         
     def get_agent(self, name: str) -> Callable:
         """Get an agent's run function by name."""
-        return self.agents.get(name).run
+        agent = self.load_agent(name)
+        return agent.run if agent else None
     
     def get_agent_tool_registry(self, name: str) -> List:
         """Get all tools available to the agent"""
-        return list(self.agents.get(name).actions.actions.keys())
-
-
-
-
-
+        return list(self.load_agent(name).actions.actions.keys())
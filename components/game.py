@@ -1,12 +1,20 @@
 """Implements the GAME structure of an AI Agent"""
 
-from dataclasses import dataclass
+from collections import deque
+from dataclasses import dataclass, field
+import asyncio
+import hashlib
 import json
 import inspect
+import threading
 import time 
 import traceback
+import uuid
 from typing import List, Callable, Dict, Any, Tuple, get_type_hints, Optional
 
+from components.tokens import count_tokens, truncate_tokens
+from components.tracing import span
+
 
 # * Goal class
 @dataclass(frozen=True)
@@ -18,6 +26,18 @@ class Goal:
 class Prompt:
     messages: List[Dict]
     tools: List[Dict]
+    prefix_version: str | None = None
+
+# * Compiled prompt prefix
+@dataclass(frozen=True)
+class PromptPrefix:
+    """
+    The part of the prompt that does not change between iterations: the goals system message and the tool schemas.
+    It is compiled once and reused as-is, so the provider sees a byte-identical prefix and can cache it.
+    """
+    messages: Tuple[Dict, ...]
+    tools: Tuple[Dict, ...]
+    version: str
 
 # * Action class
 class Action:
@@ -39,11 +59,18 @@ class Action:
         """Execute the action's function"""
         return self.function(action_context = action_context, **args)
 
+    async def aexecute(self, action_context, **args) -> Any:
+        """Await the action's function if it is a coroutine, otherwise run it in a worker thread"""
+        if inspect.iscoroutinefunction(self.function):
+            return await self.function(action_context = action_context, **args)
+        return await asyncio.to_thread(self.function, action_context = action_context, **args)
+
 # * Action Registry
 class ActionRegistry:
     def __init__(self):
         self.actions = {}
         self.actions_by_tag = {}
+        self.version = 0          # bumped whenever a tool is added or changed
 
     def _get_json_type(self, python_type) -> str:
        """將 Python 型別映射至 JSON Schema 型別"""
@@ -91,6 +118,16 @@ class ActionRegistry:
 
     def register(self, action: Action):
         self.actions[action.name] = action
+        self.version += 1
+
+    def update_description(self, name: str, description: str) -> bool:
+        """Change the description of a tool. The version only changes if the description does."""
+        action = self.actions.get(name)
+        if action is None or action.description == description:
+            return False
+        action.description = description
+        self.version += 1
+        return True
 
     def get_action(self, name: str) -> Action | None:
         return self.actions.get(name, None)
@@ -152,12 +189,21 @@ class ActionContext:
                  llm_provider: Optional[Callable] = None,
                  properties: Optional[Dict[str, Any]] = None,
                  debug: bool = False,
-                 ui_option: str = "cli"):
+                 ui_option: str = "cli",
+                 session: Optional["Session"] = None):
         self._agent_registry = agent_registry
         self._llm = llm_provider
         self._properties = properties or {}
         self.debug = debug
         self.ui_option = ui_option
+        self.session = session
+
+    def for_session(self, session: "Session") -> "ActionContext":
+        """
+        The context of one session's runs. The registry, LLM and properties are shared with this context
+        (created once per process); only the session differs.
+        """
+        return ActionContext(self._agent_registry, self._llm, self._properties, self.debug, self.ui_option, session = session)
         
     def get_agent_registry(self) -> Any:
         """獲取已註冊的 Agent 清單"""
@@ -169,31 +215,202 @@ class ActionContext:
             return self._llm
         return self._properties.get(key, default)
     
+# * Per-user state, kept apart from the agents, registry and context shared by the process
+@dataclass
+class Session:
+    memory: "Memory"
+    session_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    readme: str | None = None       # the latest README saved by the agents
+    job_id: str | None = None       # the latest background run of the session
+
 class Memory:
-    def __init__(self, max_history=20):
-        self.items = []
+    """
+    Conversation memory with a bounded backing store and a token-budget window.
+
+    - `items` keeps at most `max_items` messages; the oldest ones are dropped first.
+    - The first user message (the task) is pinned and always leads the window.
+    - `get_memories` returns the most recent messages that fit in `max_tokens` (and `max_history` messages),
+      and never separates an assistant `tool_calls` message from its tool results.
+    - With a `summarizer`, once the stored messages exceed `compact_tokens`, the oldest ones are summarized
+      in a background thread and replaced by one user message starting with `SUMMARY_PREFIX`,
+      keeping the newest `keep_tokens` as they are.
+    """
+    TRUNCATED_NOTICE = "\n[...TRUNCATED TO FIT THE MEMORY WINDOW...]"
+    SUMMARY_PREFIX = "[SUMMARY OF THE EARLIER CONVERSATION]\n"
+
+    def __init__(self, max_history=20, max_tokens: int | None = 64000, max_items: int = 1000,
+                 summarizer: Callable[[List[Dict]], str] | None = None,
+                 compact_tokens: int = 48000, keep_tokens: int = 16000):
+        self.items = deque(maxlen=max_items)
         self.max_history = max_history
+        self.max_tokens = max_tokens
+        self.pinned: Dict | None = None
+        self._tokens = deque(maxlen=max_items)     # token count of each item, aligned with `items`
+        self._lock = threading.RLock()
+
+        self.summarizer = summarizer
+        self.compact_tokens = compact_tokens
+        self.keep_tokens = keep_tokens
+        self.compactions: List[Dict] = []          # tokens before / after of every compaction
+        self._compacting: threading.Thread | None = None
 
     def add_memory(self, item: dict):
-        self.items.append(item)
+        with self._lock:
+            if self.pinned is None and item.get("role") == "user":
+                self.pinned = item
+            self.items.append(item)
+            self._tokens.append(self.count_tokens(item))
+        if self.summarizer is not None:
+            self.maybe_compact()
+
+    @staticmethod
+    def count_tokens(item: dict) -> int:
+        tokens = count_tokens(item.get("content") if isinstance(item.get("content"), str) else json.dumps(item.get("content"), default=str))
+        if item.get("tool_calls"):
+            tokens += count_tokens(json.dumps(item["tool_calls"], default=lambda o: o.model_dump() if hasattr(o, "model_dump") else str(o)))
+        return tokens + 4    # role and message framing
+
+    def total_tokens(self) -> int:
+        with self._lock:
+            return sum(self._tokens)
+
+    @staticmethod
+    def _groups(items: List[Dict]) -> List[Tuple[int, int]]:
+        """(start, end) index ranges of items that must stay together: an assistant tool call and its results"""
+        groups = []
+        for i, item in enumerate(items):
+            if item.get("role") == "tool" and groups:
+                groups[-1] = (groups[-1][0], i + 1)
+            else:
+                groups.append((i, i + 1))
+        return groups
+
+    def _fit(self, item: dict, budget: int) -> dict:
+        """A copy of item whose content is cut to fit in budget tokens (the stored item is left untouched)"""
+        content = item.get("content")
+        if not isinstance(content, str):
+            content = json.dumps(content, default=str)
+        keep = max(budget - count_tokens(self.TRUNCATED_NOTICE) - 4, 0)
+        return {**item, "content": truncate_tokens(content, keep) + self.TRUNCATED_NOTICE}
+
+    def maybe_compact(self) -> threading.Thread | None:
+        """Start a background compaction if the stored messages exceed `compact_tokens` and none is running"""
+        with self._lock:
+            if self._compacting is not None or sum(self._tokens) <= self.compact_tokens:
+                return None
+            items, tokens = list(self.items), list(self._tokens)
+
+            # the oldest whole groups, leaving at least `keep_tokens` of the newest messages untouched
+            older, recent = [], sum(tokens)
+            for start, end in self._groups(items):
+                if recent - sum(tokens[start:end]) < self.keep_tokens:
+                    break
+                recent -= sum(tokens[start:end])
+                older += [item for item in items[start:end] if item is not self.pinned]
+            if len(older) < 2:
+                return None
+            self._compacting = threading.Thread(target=self._compact, args=(older, sum(tokens)), name="memory_compaction", daemon=True)
+            self._compacting.start()
+            return self._compacting
+
+    def _compact(self, older: List[Dict], before: int):
+        started = time.time()
+        try:
+            summary = self.summarizer(older)
+        except Exception as e:
+            with self._lock:
+                self.compactions.append({"error": str(e), "messages": len(older), "tokens_before": before, "tokens_after": before})
+                self._compacting = None
+            return
+
+        # a user message: several providers reject a system message that is not the first one
+        summary_item = {"role": "user", "content": self.SUMMARY_PREFIX + summary}
+        with self._lock:
+            # the older messages are still at the front unless the oldest ones were dropped meanwhile
+            removed = {id(item) for item in older}
+            kept, inserted, removed_tokens = [], False, 0
+            for item, tokens in zip(self.items, self._tokens):
+                if id(item) in removed:
+                    if not inserted:
+                        kept.append((summary_item, self.count_tokens(summary_item)))
+                        inserted = True
+                    removed_tokens += tokens
+                    continue
+                kept.append((item, tokens))
+            self.items = deque((item for item, _ in kept), maxlen=self.items.maxlen)
+            self._tokens = deque((tokens for _, tokens in kept), maxlen=self._tokens.maxlen)
+            self.compactions.append({
+                "messages": len(older),
+                "tokens_before": before,
+                "tokens_after": before - removed_tokens + (self.count_tokens(summary_item) if inserted else 0),
+                "seconds": round(time.time() - started, 2)
+            })
+            self._compacting = None
 
     def get_memories(self, limit: int| None = None) -> List[Dict]:
         # 只取最近的 N 則紀錄，避免 Token 爆炸
         limit = limit or self.max_history
-        return self.items[-limit:]
+        budget = self.max_tokens if self.max_tokens is not None else float("inf")
+        with self._lock:
+            items = list(self.items)
+            tokens = list(self._tokens)
+
+        pinned_index = next((i for i, item in enumerate(items) if item is self.pinned), None)
+        if self.pinned is not None:
+            budget -= self.count_tokens(self.pinned) if pinned_index is None else tokens[pinned_index]
+            limit -= 1
+
+        selected = []
+        for start, end in reversed(self._groups(items)):
+            if items[start] is self.pinned:
+                continue
+            # a tool result whose assistant tool call was evicted is rejected by the API
+            if items[start].get("role") == "tool":
+                break
+            size = sum(tokens[start:end])
+            if selected and (size > budget or len(selected) + (end - start) > limit):
+                break
+            group = items[start:end]
+            if size > budget:
+                # the most recent exchange alone does not fit: cut its largest contents instead of losing it
+                share = max(int(budget) // (end - start), 0)
+                group = [item if tokens[start + i] <= share else self._fit(item, share) for i, item in enumerate(group)]
+                size = budget
+            selected[:0] = group
+            budget -= size
+
+        if self.pinned is not None and not any(item is self.pinned for item in selected):
+            selected.insert(0, self.pinned)
+        return selected
     
 class Environment:
     def execute_action(self, action: Action, action_context: ActionContext, args: dict) -> dict:
         """Execute an action and return the result."""
-        try:
-            result = action.execute(action_context = action_context, **args)
-            return self.format_result(result)
-        except Exception as e:
-            return {
-                "tool_executed": False,
-                "error": str(e),
-                "traceback": traceback.format_exc()
-            }
+        with span("tool.execute", **{"tool.name": action.name, "tool.args": json.dumps(args, default=str)[:1000]}) as current:
+            try:
+                result = action.execute(action_context = action_context, **args)
+                return self.format_result(result)
+            except Exception as e:
+                current.fail(f"{type(e).__name__}: {e}")
+                return {
+                    "tool_executed": False,
+                    "error": str(e),
+                    "traceback": traceback.format_exc()
+                }
+
+    async def aexecute_action(self, action: Action, action_context: ActionContext, args: dict) -> dict:
+        """Async version of `execute_action`: sync tools are offloaded to a worker thread."""
+        with span("tool.execute", **{"tool.name": action.name, "tool.args": json.dumps(args, default=str)[:1000]}) as current:
+            try:
+                result = await action.aexecute(action_context = action_context, **args)
+                return self.format_result(result)
+            except Exception as e:
+                current.fail(f"{type(e).__name__}: {e}")
+                return {
+                    "tool_executed": False,
+                    "error": str(e),
+                    "traceback": traceback.format_exc()
+                }
 
     def format_result(self, result: Any) -> dict:
         """Format the result with metadata."""
@@ -230,41 +447,54 @@ class AgentFunctionCallingActionLanguage:
             } for action in actions
         ]
 
+    def compile_prefix(self, goals: List[Goal], actions: List[Action]) -> PromptPrefix:
+        """Build the goals and tool schemas once. The version is a hash of their exact serialization."""
+        messages = tuple(self.format_goals(goals))
+        tools = tuple(self.format_actions(actions))
+        raw = json.dumps([messages, tools], sort_keys=True, ensure_ascii=False)
+        return PromptPrefix(messages=messages, tools=tools, version=hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16])
+
     def construct_prompt(self, actions: List[Action], environment: Any, 
-                         goals: List[Goal], memory: Memory) -> Prompt:
-        prompt_msgs = []
-        prompt_msgs += self.format_goals(goals)
+                         goals: List[Goal], memory: Memory, prefix: PromptPrefix | None = None) -> Prompt:
+        prefix = prefix or self.compile_prefix(goals, actions)
+        prompt_msgs = list(prefix.messages)
         prompt_msgs += self.format_memory(memory)
-        tools = self.format_actions(actions)
-        return Prompt(messages=prompt_msgs, tools=tools)
+        return Prompt(messages=prompt_msgs, tools=list(prefix.tools), prefix_version=prefix.version)
+
+    def parse_arguments(self, arguments: str) -> dict:
+        try:
+            raw_args = json.loads(arguments)
+        except (json.JSONDecodeError, TypeError):
+            raw_args = {}
+
+        # --- 核心修復：處理 Cerebras 的包裹行為 ---
+        # 如果 raw_args 長得像 {"args": {...}} 或 {"arguments": {...}}
+        if isinstance(raw_args, dict) and len(raw_args) == 1:
+            potential_key = next(iter(raw_args))
+            if potential_key in ["args", "arguments", "parameters"]:
+                # 確保裡面真的是另一個 dict 或是空的
+                if isinstance(raw_args[potential_key], dict):
+                    raw_args = raw_args[potential_key]
+        return raw_args if isinstance(raw_args, dict) else {}
 
-    def parse_response(self, response: Any) -> dict:
+    def parse_response(self, response: Any) -> List[dict]:
+        """
+        One invocation per tool call of the response, each keyed by its tool call id.
+        A response without tool calls is a single invocation whose tool is None.
+        """
         # 假設 response 是 Message 物件
         if hasattr(response, 'tool_calls') and response.tool_calls:
-            tool_call = response.tool_calls[0].function
-            tool_name = tool_call.name
-            
-            try:
-                raw_args = json.loads(tool_call.arguments)
-            except json.JSONDecodeError:
-                raw_args = {}
-
-            # --- 核心修復：處理 Cerebras 的包裹行為 ---
-            # 如果 raw_args 長得像 {"args": {...}} 或 {"arguments": {...}}
-            if isinstance(raw_args, dict) and len(raw_args) == 1:
-                potential_key = next(iter(raw_args))
-                if potential_key in ["args", "arguments", "parameters"]:
-                    # 確保裡面真的是另一個 dict 或是空的
-                    if isinstance(raw_args[potential_key], dict):
-                        raw_args = raw_args[potential_key]
-            
-            return {
-                "tool": tool_name,
-                "args": raw_args
-            }
+            return [
+                {
+                    "id": getattr(tool_call, "id", None),
+                    "tool": tool_call.function.name,
+                    "args": self.parse_arguments(tool_call.function.arguments)
+                } for tool_call in response.tool_calls
+            ]
 
         # 處理 Final Answer
-        return {
+        return [{
+            "id": None,
             "tool": None, 
             "args": {"content": getattr(response, 'content', str(response))}
-        }
\ No newline at end of file
+        }]
@@ -0,0 +1,148 @@
+"""Local bare mirrors of remote repositories, so that re-scans only fetch and read what changed"""
+
+import hashlib
+import os
+import subprocess
+import tarfile
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from components.resilience import timeout_for
+
+try:
+    import fcntl
+except ImportError:     # Windows: mirrors are only locked between the threads of one process
+    fcntl = None
+
+
+class MirrorLock:
+    """
+    Serializes the work on one mirror: a thread lock within the process, and an exclusive `flock`
+    on `<mirror>.lock` across processes (e.g. the workers of batch mode sharing SCAN_MIRROR_DIR)
+    """
+    def __init__(self, path: str):
+        self.path = path + ".lock"
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, "a")
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            except BaseException:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self._file is not None:
+                # closing the file releases the flock
+                self._file.close()
+                self._file = None
+        finally:
+            self._thread_lock.release()
+
+
+# one lock per mirror, so concurrent sessions scanning the same repo never race on git's own lock files
+_mirror_locks: Dict[str, MirrorLock] = {}
+_mirror_locks_guard = threading.Lock()
+
+SCANNED_REF = "refs/scanned/last"
+
+
+class GitMirror:
+    """
+    A shallow bare repository that follows the remote HEAD of `repo_url`.
+    The last scanned commit is kept under `refs/scanned/last` so its tree stays available for diffs.
+    Every git command is killed after `timeout` seconds (or at the deadline of the run, if sooner):
+    a hung fetch would otherwise hold the mirror lock, and every worker waiting for it, forever.
+    """
+    def __init__(self, root: str, repo_url: str, timeout: float = 300):
+        self.repo_url = repo_url
+        self.timeout = timeout
+        key = hashlib.sha256(repo_url.strip().rstrip("/").encode("utf-8")).hexdigest()[:24]
+        self.path = os.path.join(root, f"{key}.git")
+        with _mirror_locks_guard:
+            self.lock = _mirror_locks.setdefault(self.path, MirrorLock(self.path))
+
+    def _run(self, args: List[str], **kwargs) -> subprocess.CompletedProcess:
+        return subprocess.run(args, check=True, capture_output=True, timeout=timeout_for(self.timeout), **kwargs)
+
+    def _git(self, *args, **kwargs) -> subprocess.CompletedProcess:
+        return self._run(["git", "--git-dir", self.path, *args], **kwargs)
+
+    def remote_head(self) -> Optional[str]:
+        """Commit sha of the remote HEAD, asked without fetching anything. None if the remote has no HEAD."""
+        output = self._run(["git", "ls-remote", self.repo_url, "HEAD"], text=True).stdout.split()
+        return output[0] if output else None
+
+    def sync(self) -> str:
+        """Create the mirror if needed, fetch the remote HEAD and return its commit sha"""
+        if not os.path.isdir(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._run(["git", "init", "--quiet", "--bare", self.path])
+
+        # only objects missing from the mirror are transferred
+        self._git("fetch", "--quiet", "--depth", "1", "--no-tags", self.repo_url, "HEAD")
+        return self._git("rev-parse", "FETCH_HEAD", text=True).stdout.strip()
+
+    def has_commit(self, commit_sha: str) -> bool:
+        try:
+            self._git("cat-file", "-e", f"{commit_sha}^{{tree}}")
+            return True
+        except subprocess.CalledProcessError:
+            return False
+
+    def mark_scanned(self, commit_sha: str):
+        """Pin the scanned commit so that the next diff can start from it"""
+        self._git("update-ref", SCANNED_REF, commit_sha)
+
+    def changed_files(self, old_sha: str, new_sha: str) -> Optional[Tuple[List[str], List[str]]]:
+        """
+        Files changed between two commits, as (added or modified paths, deleted paths).
+        Returns None if the old commit is no longer available in the mirror.
+        """
+        if not self.has_commit(old_sha):
+            return None
+
+        output = self._git("diff", "--name-status", "-z", "--no-renames", old_sha, new_sha).stdout
+        fields = output.decode("utf-8", errors="surrogateescape").split("\0")
+        modified, deleted = [], []
+        for status, path in zip(fields[0::2], fields[1::2]):
+            if status.startswith("D"):
+                deleted.append(path)
+            else:
+                modified.append(path)
+        return modified, deleted
+
+    def list_files(self, commit_sha: str, names: Tuple[str, ...]) -> List[str]:
+        """Paths of every file in the tree of a commit whose base name is one of `names`"""
+        output = self._git("ls-tree", "-r", "-z", "--name-only", commit_sha).stdout
+        paths = output.decode("utf-8", errors="surrogateescape").split("\0")
+        return [path for path in paths if path and os.path.basename(path) in names]
+
+    def export(self, commit_sha: str, dest: str, paths: Optional[List[str]] = None, batch_size: int = 500):
+        """Write the tree of a commit (or only `paths` of it) into dest"""
+        batches = [None] if paths is None else [paths[i:i + batch_size] for i in range(0, len(paths), batch_size)]
+        for batch in batches:
+            args = ["git", "--git-dir", self.path, "archive", "--format=tar", commit_sha]
+            if batch:
+                args += ["--", *[f":(literal){path}" for path in batch]]
+            process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            timer = threading.Timer(timeout_for(self.timeout), process.kill)
+            timer.start()
+            try:
+                with tarfile.open(fileobj=process.stdout, mode="r|") as archive:
+                    archive.extractall(dest, filter="data")
+                _, stderr = process.communicate()
+            finally:
+                timer.cancel()
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, args, stderr=stderr)
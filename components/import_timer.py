@@ -0,0 +1,97 @@
+"""Time every module import of the process, to watch the cold start and the cost of each Streamlit rerun"""
+
+import builtins
+import importlib.util
+import sys
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+FLAG = "--import-times"
+
+
+class ImportTimer:
+    """
+    Wraps `__import__` and records, for every module loaded for the first time, the seconds spent
+    importing it: inclusive (its own imports included) and self (without them).
+    `report` prints what was imported since the previous report, so each rerun shows only its own cost.
+    """
+    def __init__(self):
+        self.records: Dict[str, List[float]] = {}     # module -> [inclusive, self] seconds
+        self.reported = 0
+        self._original = None
+        self._local = threading.local()
+
+    def install(self):
+        if self._original is not None:
+            return
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        try:
+            absolute = importlib.util.resolve_name("." * level + name, (globals or {}).get("__package__")) if level else name
+        except (ImportError, ValueError):
+            absolute = name
+        if absolute in sys.modules:
+            return self._original(name, globals, locals, fromlist, level)
+
+        # a stack of child import time per thread, to subtract the nested imports from the self time
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            inclusive = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += inclusive
+            if absolute not in self.records:
+                self.records[absolute] = [inclusive, inclusive - children]
+
+    def breakdown(self, records: List[Tuple[str, List[float]]]) -> Dict[str, float]:
+        """Self time by top-level package"""
+        packages = defaultdict(float)
+        for module, (_, own) in records:
+            packages[module.split(".")[0]] += own
+        return dict(sorted(packages.items(), key=lambda item: -item[1]))
+
+    def report(self, title: str = "imports", top: int = 10) -> str:
+        """The imports since the previous report: total, self time per package and the slowest modules"""
+        records = list(self.records.items())[self.reported:]
+        self.reported += len(records)
+        if not records:
+            return f"[{title}] no new imports"
+
+        total = sum(own for _, (_, own) in records)
+        lines = [f"[{title}] {len(records)} modules, {total * 1000:.0f} ms"]
+        for package, seconds in list(self.breakdown(records).items())[:top]:
+            lines.append(f"  {package:<32} {seconds * 1000:8.1f} ms")
+        lines.append("  slowest (inclusive):")
+        for module, (inclusive, _) in sorted(records, key=lambda item: -item[1][0])[:top]:
+            lines.append(f"  {module:<32} {inclusive * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+
+_timer: ImportTimer | None = None
+
+
+def from_argv(argv: List[str] | None = None) -> ImportTimer | None:
+    """
+    The process-wide timer, installed the first time it is asked for, if the command line has `--import-times`.
+    Otherwise None. Streamlit re-executes the script on every rerun, so the timer must not be created twice.
+    """
+    global _timer
+    if _timer is None and FLAG in (sys.argv if argv is None else argv):
+        _timer = ImportTimer()
+        _timer.install()
+    return _timer
@@ -0,0 +1,230 @@
+"""Background agent runs: jobs with ids, an event queue, cancellation and an admission limit"""
+
+import contextvars
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from components.resilience import cancellation
+from config import JOB_MAX_WORKERS, JOB_MAX_QUEUED, JOB_RETENTION_SECONDS, JOB_MAX_EVENTS
+
+
+class JobRejected(RuntimeError):
+    """The runner is full: every worker is busy and the queue is at its limit"""
+
+
+# the job whose events the current thread produces. Worker threads of the job inherit it with their contextvars
+_current_job: contextvars.ContextVar[Optional["Job"]] = contextvars.ContextVar("current_job", default=None)
+
+
+def current_job() -> Optional["Job"]:
+    return _current_job.get()
+
+
+def report_progress(message: str) -> bool:
+    """Add a progress message to the events of the current job. False outside a job (the caller prints it instead)"""
+    job = _current_job.get()
+    if job is None:
+        return False
+    job.emit({"type": "progress", "message": message})
+    return True
+
+
+class Job:
+    """
+    One agent run in the background. Its events are kept in order, so any number of readers can follow it
+    from their own cursor. Only the last `max_events` are kept; a cursor counts every event since the start.
+    Token deltas are not kept one by one: they are merged into the text each agent has streamed since
+    its last complete message (`live_text`), so a long answer costs one string, not one event per token.
+    Status: queued → running → done / failed / cancelled.
+    """
+    MERGED_EVENTS = ("token", "tool_call_delta")
+
+    def __init__(self, run: Callable[[], Iterator[dict]], session_id: str | None = None, description: str = "",
+                 max_events: int = 1000):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.session_id = session_id
+        self.description = description
+        self.status = "queued"
+        self.error: Optional[str] = None
+        self.created = time.time()
+        self.started: Optional[float] = None
+        self.finished: Optional[float] = None
+        self._run = run
+        self._events: deque = deque(maxlen=max_events)
+        self._dropped = 0                          # events evicted from the front of `_events`
+        self._live: Dict[str, str] = {}            # agent -> text streamed since its last message
+        self._cancelled = threading.Event()
+        self._cond = threading.Condition()
+
+    @property
+    def active(self) -> bool:
+        return self.status in ("queued", "running")
+
+    def _append(self, event: dict):
+        """Must be called with the lock held"""
+        if len(self._events) == self._events.maxlen:
+            self._dropped += 1
+        self._events.append(event)
+
+    def emit(self, event: dict):
+        with self._cond:
+            agent = event.get("agent")
+            if event.get("type") in self.MERGED_EVENTS:
+                if event["type"] == "token":
+                    self._live[agent] = self._live.get(agent, "") + event["delta"]
+            else:
+                if event.get("type") == "message":
+                    self._live.pop(agent, None)
+                self._append({**event, "time": time.time()})
+            self._cond.notify_all()
+
+    @property
+    def _end(self) -> int:
+        return self._dropped + len(self._events)
+
+    def _since(self, cursor: int) -> List[dict]:
+        return list(self._events)[max(cursor - self._dropped, 0):]
+
+    def events(self, cursor: int = 0) -> Tuple[List[dict], int]:
+        """
+        The events from `cursor` on (those still kept), and the cursor to read the next ones from.
+        Readers that poll should keep the cursor, so every poll only reads the new events.
+        """
+        with self._cond:
+            return self._since(cursor), self._end
+
+    def wait_events(self, cursor: int = 0, timeout: float | None = None) -> Tuple[List[dict], int]:
+        """Like `events`, but wait up to `timeout` seconds for a new event while the job is active"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._end > cursor or not self.active, timeout)
+            return self._since(cursor), self._end
+
+    def live_text(self, agent: str) -> str:
+        """The text `agent` has streamed since its last complete message"""
+        with self._cond:
+            return self._live.get(agent, "")
+
+    def cancel(self):
+        """
+        Stop the job: a queued job never starts, a running one is stopped at its next event
+        (its generator is closed, so open spans and caches are cleaned up). A long tool call of the job
+        (a sub-agent, a scan, an LLM call or its retries) stops at its next `check_deadline` with Cancelled.
+        """
+        self._cancelled.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def _finish(self, status: str, error: str | None = None):
+        with self._cond:
+            self.status = status
+            self.error = error
+            self.finished = time.time()
+            self._live.clear()
+            self._append({"type": "job_end", "status": status, "error": error, "time": self.finished})
+            self._cond.notify_all()
+
+    def _execute(self):
+        if self.cancelled:
+            self._finish("cancelled")
+            return
+        self.status = "running"
+        self.started = time.time()
+        token = _current_job.set(self)
+        try:
+            with cancellation(self._cancelled):
+                events = self._run()
+                for event in events:
+                    self.emit(event)
+                    if self.cancelled:
+                        events.close()
+                        break
+            self._finish("cancelled" if self.cancelled else "done")
+        except Exception as e:
+            if self.cancelled:
+                self._finish("cancelled")
+            else:
+                self._finish("failed", f"{type(e).__name__}: {e}")
+        finally:
+            _current_job.reset(token)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "description": self.description,
+            "status": self.status,
+            "error": self.error,
+            "events": self._end,
+            "queued_s": round((self.started or time.time()) - self.created, 3),
+            "run_s": round((self.finished or time.time()) - self.started, 3) if self.started else None
+        }
+
+
+class JobRunner:
+    """
+    Runs jobs on `max_workers` threads. At most `max_queued` more jobs wait for a worker;
+    beyond that `submit` raises JobRejected, so a burst cannot pile up unbounded work.
+    Finished jobs are kept for `retention` seconds so their events can still be read.
+    """
+    def __init__(self, max_workers: int = 4, max_queued: int = 16, retention: float = 3600, max_events: int = 1000):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.retention = retention
+        self.max_events = max_events
+        self.jobs: Dict[str, Job] = {}
+        self.rejected = 0
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, run: Callable[[], Iterator[dict]], session_id: str | None = None, description: str = "") -> Job:
+        """
+        Start `run()` (a function returning an iterator of events, e.g. `Agent.run_events`) in the background.
+        It runs in a copy of the caller's contextvars.
+        """
+        with self._lock:
+            self._prune()
+            if sum(job.active for job in self.jobs.values()) >= self.max_workers + self.max_queued:
+                self.rejected += 1
+                raise JobRejected(f"Too many jobs in progress ({self.max_workers} running, {self.max_queued} queued). Please retry later.")
+            job = Job(run, session_id, description, self.max_events)
+            self.jobs[job.job_id] = job
+        self._pool.submit(contextvars.copy_context().run, job._execute)
+        return job
+
+    def get(self, job_id: str | None) -> Optional[Job]:
+        with self._lock:
+            return self.jobs.get(job_id) if job_id else None
+
+    def cancel(self, job_id: str) -> bool:
+        job = self.get(job_id)
+        if job is None or not job.active:
+            return False
+        job.cancel()
+        return True
+
+    def _prune(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self.jobs.items() if job.finished and now - job.finished > self.retention]:
+            del self.jobs[job_id]
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            jobs = list(self.jobs.values())
+        return {
+            "running": sum(job.status == "running" for job in jobs),
+            "queued": sum(job.status == "queued" for job in jobs),
+            "finished": sum(not job.active for job in jobs),
+            "rejected": self.rejected
+        }
+
+
+# * Shared by every session of the process
+job_runner = JobRunner(JOB_MAX_WORKERS, JOB_MAX_QUEUED, JOB_RETENTION_SECONDS, JOB_MAX_EVENTS)
@@ -0,0 +1,110 @@
+"""On-disk, content-addressed cache of LLM responses with single-flight deduplication"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from components.disk_lru import LruDirectory
+
+
+def _jsonable(obj: Any) -> Any:
+    """Fallback for objects that json cannot serialize (litellm tool calls stored in memory)"""
+    if hasattr(obj, "model_dump"):
+        return obj.model_dump()
+    if hasattr(obj, "__dict__"):
+        return vars(obj)
+    return str(obj)
+
+
+class ResponseCache:
+    """
+    LLM responses keyed by a canonical hash of the messages, the tool schemas and the model parameters,
+    stored as one file per entry. Entries expire after `ttl` seconds, and the least recently used ones
+    are evicted once the total size exceeds `max_bytes`.
+
+    Identical requests in flight at the same time are coalesced: the first caller claims the key and
+    calls the provider, the others wait for it and read its response from the cache.
+    """
+    def __init__(self, root: str, max_bytes: int = 100 * 1024 * 1024, ttl: float = 24 * 3600):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._files = LruDirectory(root, max_bytes, (".json",))
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, threading.Event] = {}
+
+    @property
+    def evictions(self) -> int:
+        return self._files.evictions
+
+    def key(self, model: str, messages: List[dict], tools: Optional[List[dict]], params: Dict[str, Any]) -> str:
+        """Canonical hash of one request: the same prompt always gives the same key"""
+        raw = json.dumps(
+            {"model": model, "messages": messages, "tools": tools or [], "params": params},
+            sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_jsonable
+        )
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def get(self, key: str) -> Optional[dict]:
+        """Return the cached message as a dict, or None on a miss or an expired entry"""
+        path = self._path(key)
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                if time.time() - entry["created"] > self.ttl:
+                    os.remove(path)
+                    raise ValueError("expired")
+                # * touch the entry so that LRU eviction keeps it around
+                self._files.touch(path)
+            except (OSError, ValueError, KeyError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["message"]
+
+    def put(self, key: str, message: dict):
+        """Store a message, then evict the oldest entries if the cache is too large"""
+        entry = {"created": time.time(), "message": message}
+        with self._lock:
+            self._files.write(self._path(key), json.dumps(entry, default=_jsonable).encode("utf-8"))
+
+    def claim(self, key: str) -> Tuple[bool, threading.Event]:
+        """
+        (True, event) if the caller is the first to request key and must call `release` when done,
+        (False, event) if the same request is already in flight: wait on the event, then look up the cache again.
+        """
+        with self._lock:
+            event = self._in_flight.get(key)
+            if event is not None:
+                self.coalesced += 1
+                return False, event
+            event = self._in_flight[key] = threading.Event()
+            return True, event
+
+    def release(self, key: str):
+        """Wake up the callers waiting on key. Called whether the request succeeded or not."""
+        with self._lock:
+            event = self._in_flight.pop(key, None)
+        if event is not None:
+            event.set()
+
+    def stats(self) -> Dict[str, int]:
+        """Hit / miss / coalesced / eviction counters and the current size of the cache"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._in_flight),
+                **self._files.usage()
+            }
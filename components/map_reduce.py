@@ -0,0 +1,203 @@
+"""Map-reduce README generation for repositories too large for one context window"""
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional
+
+from components.digest import excerpt
+from components.game import Prompt
+from components.scanner import iter_manifest
+from components.tokens import count_tokens
+
+
+MAP_PROMPT = (
+    "You are summarizing one part of a software repository so that a README can be written later. "
+    "Describe what this part does, its main modules, classes and functions, entry points, configuration, "
+    "dependencies and how it is used. Be factual, concise and do not make up information."
+)
+REDUCE_PROMPT = (
+    "You are combining summaries of the parts of a software repository. "
+    "Merge them into one summary that keeps every fact useful for a README. Do not make up information."
+)
+README_PROMPT = (
+    "You are a professional technical writer. Using the summaries of every part of the repository below, "
+    "write a complete README.md in markdown: overview, features, architecture, installation, usage and configuration. "
+    "Return only the markdown content of the README. Do not make up information."
+)
+
+
+@dataclass
+class Chunk:
+    name: str
+    paths: List[str] = field(default_factory=list)
+    tokens: int = 0
+
+
+def _group_of(path: str, depth: int) -> str:
+    """Directory a file is grouped under: its first `depth` directories, or '.' for top-level files"""
+    parts = path.split("/")[:-1]
+    return "/".join(parts[:depth]) or "."
+
+
+def plan_chunks(manifest_path: str, chunk_tokens: int) -> List[Chunk]:
+    """
+    Split the files of a manifest into per-directory chunks of at most about `chunk_tokens` tokens.
+    Top-level directories (packages) are kept together when they fit, and split one level deeper otherwise.
+    """
+    sizes: Dict[str, int] = {}
+    for path, content, _ in iter_manifest(manifest_path):
+        sizes[path] = min(count_tokens(content), chunk_tokens) + count_tokens(path) + 8
+
+    per_package: Dict[str, int] = {}
+    for path, size in sizes.items():
+        group = _group_of(path, 1)
+        per_package[group] = per_package.get(group, 0) + size
+
+    chunks: List[Chunk] = []
+    parts: Dict[str, int] = {}
+    current_group = None
+    for path, size in sizes.items():
+        group = _group_of(path, 1)
+        if per_package[group] > chunk_tokens:
+            group = _group_of(path, 2)
+
+        # the manifest is in walk order, so files of one directory are contiguous
+        if group != current_group or chunks[-1].tokens + size > chunk_tokens:
+            parts[group] = parts.get(group, 0) + 1
+            chunks.append(Chunk(name=group if parts[group] == 1 else f"{group} (part {parts[group]})"))
+            current_group = group
+        chunks[-1].paths.append(path)
+        chunks[-1].tokens += size
+    return chunks
+
+
+def _iter_chunk_texts(manifest_path: str, chunks: List[Chunk], chunk_tokens: int) -> Iterator[tuple]:
+    """Yield (chunk, text) in manifest order, holding the contents of one chunk at a time"""
+    owner = {path: i for i, chunk in enumerate(chunks) for path in chunk.paths}
+    current, parts = None, []
+    for path, content, _ in iter_manifest(manifest_path):
+        index = owner[path]
+        if current is not None and index != current:
+            yield chunks[current], "\n".join(parts)
+            parts = []
+        current = index
+        body = content if count_tokens(content) <= chunk_tokens else excerpt(content, chunk_tokens)
+        parts.append(f"--- FILE: {path} ---\n{body}")
+    if current is not None:
+        yield chunks[current], "\n".join(parts)
+
+
+def _ask(generate_response: Callable, system: str, user: str) -> str:
+    response = generate_response(Prompt(messages=[
+        {"role": "system", "content": system},
+        {"role": "user", "content": user}
+    ], tools=[]))
+    return getattr(response, "content", None) or ""
+
+
+class MapReduceReadme:
+    """
+    Summarize each chunk of a repository concurrently (map), merge the summaries until they fit
+    in one context (reduce), then write the README from the merged summaries.
+    """
+    def __init__(self, generate_response: Callable, concurrency: int = 8, chunk_tokens: int = 12000,
+                 reduce_tokens: int = 24000, progress: Optional[Callable[[str], None]] = None):
+        self.generate_response = generate_response
+        self.concurrency = concurrency
+        self.chunk_tokens = chunk_tokens
+        self.reduce_tokens = reduce_tokens
+        self.progress = progress or (lambda message: None)
+
+    def _map(self, manifest_path: str, chunks: List[Chunk]) -> List[str]:
+        summaries: Dict[int, str] = {}
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+        index = {chunk.name: i for i, chunk in enumerate(chunks)}
+
+        def summarize(chunk: Chunk, text: str) -> str:
+            try:
+                return _ask(self.generate_response, MAP_PROMPT, f"Part of the repository: {chunk.name}\n\n{text}")
+            finally:
+                slots.release()
+
+        failures: List[str] = []
+
+        def collect(future):
+            chunk = futures.pop(future)
+            try:
+                summary = future.result()
+            except Exception as e:
+                # one failed part must not throw away the others: the README is written without it
+                failures.append(f"{chunk.name}: {type(e).__name__}: {e}")
+                summary = f"(summary unavailable: {type(e).__name__}: {e})"
+            summaries[index[chunk.name]] = f"## {chunk.name}\n{summary}"
+            self.progress(f"[map] {len(summaries)}/{len(chunks)} parts summarized ({chunk.name})")
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="readme_map") as pool:
+            futures = {}
+            for chunk, text in _iter_chunk_texts(manifest_path, chunks, self.chunk_tokens):
+                # at most 2 x concurrency chunk texts are held in memory at once
+                slots.acquire()
+                for future in [f for f in futures if f.done()]:
+                    collect(future)
+                # a copy of the caller's context: the run deadline, the parent span and the current job
+                futures[pool.submit(contextvars.copy_context().run, summarize, chunk, text)] = chunk
+
+            for future in as_completed(list(futures)):
+                collect(future)
+
+        if chunks and len(failures) == len(chunks):
+            raise RuntimeError(f"Every part of the repository failed to summarize, e.g. {failures[0]}")
+        if failures:
+            self.progress(f"[map] {len(failures)}/{len(chunks)} parts failed: {'; '.join(failures[:3])}")
+        return [summaries[i] for i in range(len(chunks))]
+
+    def _reduce(self, summaries: List[str]) -> List[str]:
+        """Merge groups of summaries concurrently until all of them fit in `reduce_tokens`"""
+        level = 1
+        while len(summaries) > 1 and count_tokens("\n\n".join(summaries)) > self.reduce_tokens:
+            groups, current, size = [], [], 0
+            for summary in summaries:
+                tokens = count_tokens(summary)
+                if current and size + tokens > self.reduce_tokens // 2:
+                    groups.append(current)
+                    current, size = [], 0
+                current.append(summary)
+                size += tokens
+            groups.append(current)
+            if len(groups) == len(summaries):
+                # every summary is already large on its own: merge them pairwise to make progress
+                groups = [summaries[i:i + 2] for i in range(0, len(summaries), 2)]
+
+            merged = [None] * len(groups)
+            failures: List[str] = []
+            with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="readme_reduce") as pool:
+                futures = {pool.submit(contextvars.copy_context().run, _ask, self.generate_response, REDUCE_PROMPT, "\n\n".join(group)): i
+                           for i, group in enumerate(groups)}
+                for done, future in enumerate(as_completed(futures), start=1):
+                    i = futures[future]
+                    try:
+                        merged[i] = future.result()
+                    except Exception as e:
+                        # keep an excerpt of the unmerged summaries rather than losing the whole group
+                        failures.append(f"{type(e).__name__}: {e}")
+                        merged[i] = excerpt("\n\n".join(groups[i]), self.reduce_tokens // 2)
+                    self.progress(f"[reduce {level}] {done}/{len(groups)} groups merged")
+            if len(failures) == len(groups):
+                raise RuntimeError(f"Every group of summaries failed to merge, e.g. {failures[0]}")
+            summaries = merged
+            level += 1
+        return summaries
+
+    def run(self, manifest_path: str, repo_url: str, instructions: str = "") -> str:
+        chunks = plan_chunks(manifest_path, self.chunk_tokens)
+        self.progress(f"[plan] {len(chunks)} parts to summarize with concurrency {self.concurrency}")
+
+        summaries = self._reduce(self._map(manifest_path, chunks))
+
+        self.progress("[write] writing the README from the merged summaries")
+        request = f"Repository: {repo_url}\n"
+        if instructions:
+            request += f"Additional instructions: {instructions}\n"
+        return _ask(self.generate_response, README_PROMPT, request + "\n" + "\n\n".join(summaries))
@@ -1,24 +1,359 @@
-from litellm import completion
-from typing import List, Dict
+from typing import List, Dict, Iterator
+from functools import lru_cache
+import threading
 from components.game import Prompt
+from components.llm_cache import ResponseCache
+from components.tokens import truncate_tokens, CHARS_PER_TOKEN
+from components.tracing import span, current_span
+from components.router import Backend, ModelRouter
+from components.rate_limit import RateLimiter
+from components import resilience
+from components.resilience import timeout_for
+from config import MODEL_BACKENDS, ROUTER_HEDGE, ROUTER_HEDGE_MIN_SAMPLES, ROUTER_MAX_ERROR_RATE, ROUTER_HEALTH_MIN_SAMPLES, ROUTER_PROBE_SECONDS, ROUTER_STATS_MAX_AGE, LLM_CACHE_ENABLED, LLM_CACHE_DIR, LLM_CACHE_MAX_MB, LLM_CACHE_TTL_HOURS, COMPACTION_MODEL, COMPACTION_INPUT_TOKENS, LLM_RATE_LIMITS, LLM_DEFAULT_RATE_LIMIT, LLM_OUTPUT_TOKENS_ESTIMATE, LLM_REQUEST_TIMEOUT
+import json
+import asyncio
 import os
 from dotenv import load_dotenv
 load_dotenv()
 
 os.environ["CEREBRAS_API_KEY"] = os.getenv("CEREBRAS_API_KEY")
 
+# * litellm takes seconds to import, so it is only imported by the first LLM call (not when the app starts)
+@lru_cache(maxsize=1)
+def _litellm():
+    import litellm
+    return litellm
 
-def generate_response(prompt: Prompt):
+
+def completion(**kwargs):
+    return _litellm().completion(**kwargs)
+
+
+async def acompletion(**kwargs):
+    return await _litellm().acompletion(**kwargs)
+
+
+def stream_chunk_builder(chunks, messages=None):
+    return _litellm().stream_chunk_builder(chunks, messages=messages)
+
+
+def Message(**kwargs):
+    return _litellm().Message(**kwargs)
+
+
+MODEL = MODEL_BACKENDS[0]
+MAX_TOKENS = 50000
+
+# * Opt-in response cache, shared by every agent of the process
+response_cache = ResponseCache(
+    LLM_CACHE_DIR,
+    max_bytes = LLM_CACHE_MAX_MB * 1024 * 1024,
+    ttl = LLM_CACHE_TTL_HOURS * 3600
+) if LLM_CACHE_ENABLED else None
+
+
+def _cache_key(prompt: Prompt) -> str:
+    return response_cache.key(",".join(MODEL_BACKENDS), prompt.messages, prompt.tools, {"max_tokens": MAX_TOKENS})
+
+
+def _record_usage(response):
+    """Add the token usage of a provider response to the current span"""
+    usage = getattr(response, "usage", None)
+    current = current_span()
+    if usage is not None and current is not None:
+        current.set(**{
+            "gen_ai.usage.input_tokens": getattr(usage, "prompt_tokens", None),
+            "gen_ai.usage.output_tokens": getattr(usage, "completion_tokens", None)
+        })
+
+
+# * Process-wide rate limiters, one per model
+limiters: Dict[str, RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def limiter_for(model: str) -> RateLimiter:
+    with _limiters_lock:
+        if model not in limiters:
+            limiters[model] = RateLimiter(model, **LLM_RATE_LIMITS.get(model, LLM_DEFAULT_RATE_LIMIT))
+        return limiters[model]
+
+
+def _estimate_tokens(messages: List[Dict], tools: List[Dict] | None, max_tokens: int) -> int:
+    """Rough token count of a request, reserved before the call; the real usage is settled afterwards"""
+    size = len(json.dumps(messages, default=str)) + len(json.dumps(tools or [], default=str))
+    return size // CHARS_PER_TOKEN + min(max_tokens, LLM_OUTPUT_TOKENS_ESTIMATE)
+
+
+def _settle(permit, response):
+    """Charge the real token usage of a response to the budget of its model"""
+    usage = getattr(response, "usage", None)
+    permit.settle(getattr(usage, "total_tokens", None))
+
+
+def _record_wait(permit):
+    """Report the time the call waited in the queue of its model on the current span"""
+    current = current_span()
+    if current is not None:
+        current.set(**{"llm.queue_wait_s": round(permit.waited, 4)})
+
+
+def _llm_span(prompt: Prompt, stream: bool):
+    return span("llm.generate", **{
+        "gen_ai.request.model": ",".join(MODEL_BACKENDS),
+        "llm.stream": stream,
+        "prompt.messages": len(prompt.messages),
+        "prompt.prefix_version": prompt.prefix_version
+    })
+
+
+class LiteLLMBackend(Backend):
+    """One model of any provider supported by LiteLLM"""
+    def __init__(self, model: str, max_tokens: int = MAX_TOKENS):
+        self.name = model
+        self.model = model
+        self.max_tokens = max_tokens
+        self.limiter = limiter_for(model)
+
+    def _tokens(self, prompt: Prompt) -> int:
+        return _estimate_tokens(prompt.messages, prompt.tools, self.max_tokens)
+
+    def _complete(self, prompt: Prompt):
+        """One attempt: wait for a rate limit slot, then call the provider"""
+        with self.limiter.acquire(self._tokens(prompt)) as permit:
+            _record_wait(permit)
+            response = completion(
+                model=self.model,
+                messages=prompt.messages,
+                max_tokens=self.max_tokens,
+                tools=prompt.tools if prompt.tools else None, # 確保沒有工具時傳 None
+                timeout=timeout_for(LLM_REQUEST_TIMEOUT)
+            )
+            _settle(permit, response)
+        return response
+
+    def complete(self, prompt: Prompt):
+        # transient errors are retried with backoff, each attempt in its own rate limit slot
+        response = resilience.call(self.name, self._complete, prompt)
+        _record_usage(response)
+
+        # 直接回傳 Message 物件，這是 LiteLLM 內部的標準格式
+        # 它包含了 .content 和 .tool_calls
+        return response.choices[0].message
+
+    def stream(self, prompt: Prompt) -> Iterator[dict]:
+        # the in-flight slot is held until the stream is fully read
+        with self.limiter.acquire(self._tokens(prompt)) as permit:
+            _record_wait(permit)
+            # only opening the stream is retried: once tokens are yielded, the call cannot be replayed
+            response = resilience.call(
+                self.name,
+                completion,
+                model=self.model,
+                messages=prompt.messages,
+                max_tokens=self.max_tokens,
+                tools=prompt.tools if prompt.tools else None,
+                stream=True,
+                timeout=timeout_for(LLM_REQUEST_TIMEOUT)
+            )
+
+            chunks = []
+            for chunk in response:
+                chunks.append(chunk)
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    yield {"type": "token", "delta": delta.content}
+                for call in (delta.tool_calls or []):
+                    yield {
+                        "type": "tool_call_delta",
+                        "index": call.index,
+                        "id": call.id,
+                        "name": call.function.name if call.function else None,
+                        "arguments": (call.function.arguments if call.function else None) or ""
+                    }
+
+            # rebuild the complete message from the chunks, tool call arguments included
+            response = stream_chunk_builder(chunks, messages=prompt.messages)
+            _settle(permit, response)
+        _record_usage(response)
+        yield {"type": "message", "message": response.choices[0].message}
+
+    async def _acomplete(self, prompt: Prompt):
+        async with self.limiter.aacquire(self._tokens(prompt)) as permit:
+            _record_wait(permit)
+            response = await acompletion(
+                model=self.model,
+                messages=prompt.messages,
+                max_tokens=self.max_tokens,
+                tools=prompt.tools if prompt.tools else None,
+                timeout=timeout_for(LLM_REQUEST_TIMEOUT)
+            )
+            _settle(permit, response)
+        return response
+
+    async def acomplete(self, prompt: Prompt):
+        response = await resilience.acall(self.name, self._acomplete, prompt)
+        _record_usage(response)
+        return response.choices[0].message
+
+
+# * Every LLM call of the agents goes through the router: failover and hedging over MODEL_BACKENDS
+router = ModelRouter(
+    [LiteLLMBackend(model) for model in MODEL_BACKENDS],
+    hedge = ROUTER_HEDGE,
+    hedge_min_samples = ROUTER_HEDGE_MIN_SAMPLES,
+    max_error_rate = ROUTER_MAX_ERROR_RATE,
+    health_min_samples = ROUTER_HEALTH_MIN_SAMPLES,
+    probe_seconds = ROUTER_PROBE_SECONDS,
+    stats_max_age = ROUTER_STATS_MAX_AGE
+)
+
+
+def _complete(prompt: Prompt):
+    return router.complete(prompt)
+
+
+def generate_response(prompt: Prompt, stream: bool = False):
+    """
+    Call LLM and return message that contents both tool usage and chat content.
+    With stream=True, return an iterator of events instead (see `stream_response`)
+    """
+    if stream:
+        return stream_response(prompt)
+    with _llm_span(prompt, stream = False) as current:
+        if response_cache is None:
+            return _complete(prompt)
+
+        key = _cache_key(prompt)
+        while True:
+            first, done = response_cache.claim(key)
+            if not first:
+                # the same prompt is in flight: wait for it, then read its response from the cache
+                done.wait()
+                continue
+            try:
+                cached = response_cache.get(key)
+                current.set(**{"llm.cache_hit": cached is not None})
+                if cached is not None:
+                    return Message(**cached)
+                message = _complete(prompt)
+                response_cache.put(key, message.model_dump())
+                return message
+            finally:
+                response_cache.release(key)
+
+
+def _stream(prompt: Prompt) -> Iterator[dict]:
+    return router.stream(prompt)
+
+
+def stream_response(prompt: Prompt) -> Iterator[dict]:
     """
-    Call LLM and return message that contents both tool usage and chat content
+    Stream the LLM response as events:
+    - {"type": "token", "delta": str}: a piece of the chat content
+    - {"type": "tool_call_delta", "index": int, "id": str | None, "name": str | None, "arguments": str}: a piece of a tool call
+    - {"type": "message", "message": Message}: the complete message, same as the one returned without streaming
+    A cached response only yields the complete message.
     """
-    response = completion(
-        model="cerebras/gpt-oss-120b",
-        messages=prompt.messages,
-        max_tokens=50000,
-        tools=prompt.tools if prompt.tools else None # 確保沒有工具時傳 None
-    )
-    
-    # 直接回傳 Message 物件，這是 LiteLLM 內部的標準格式
-    # 它包含了 .content 和 .tool_calls
-    return response.choices[0].message
\ No newline at end of file
+    with _llm_span(prompt, stream = True) as current:
+        if response_cache is None:
+            yield from _stream(prompt)
+            return
+
+        key = _cache_key(prompt)
+        while True:
+            first, done = response_cache.claim(key)
+            if not first:
+                done.wait()
+                continue
+            try:
+                cached = response_cache.get(key)
+                current.set(**{"llm.cache_hit": cached is not None})
+                if cached is not None:
+                    yield {"type": "message", "message": Message(**cached)}
+                    return
+                for event in _stream(prompt):
+                    if event["type"] == "message":
+                        response_cache.put(key, event["message"].model_dump())
+                    yield event
+                return
+            finally:
+                # also runs when the consumer stops iterating early, so waiting callers are never stuck
+                response_cache.release(key)
+
+
+async def _acomplete(prompt: Prompt):
+    return await router.acomplete(prompt)
+
+
+async def agenerate_response(prompt: Prompt):
+    """
+    Async version of `generate_response`, so that one event loop can wait on many LLM calls at once
+    """
+    with _llm_span(prompt, stream = False) as current:
+        if response_cache is None:
+            return await _acomplete(prompt)
+
+        key = _cache_key(prompt)
+        while True:
+            first, done = response_cache.claim(key)
+            if not first:
+                await asyncio.to_thread(done.wait)
+                continue
+            try:
+                cached = response_cache.get(key)
+                current.set(**{"llm.cache_hit": cached is not None})
+                if cached is not None:
+                    return Message(**cached)
+                message = await _acomplete(prompt)
+                response_cache.put(key, message.model_dump())
+                return message
+            finally:
+                response_cache.release(key)
+
+
+COMPACTION_PROMPT = (
+    "You compress the earlier part of a conversation between a user, an AI agent and its tools. "
+    "Write a concise summary that keeps the user's requests, decisions, repository urls, file names, "
+    "facts found by the tools and anything still pending. Do not make up information."
+)
+
+
+def summarize_messages(messages: List[Dict]) -> str:
+    """
+    Summarize a span of memory with the cheap compaction model (the summarizer of `Memory`).
+    Every message gets an equal share of the input budget, so one large tool result cannot crowd out the rest.
+    """
+    share = max(COMPACTION_INPUT_TOKENS // max(len(messages), 1), 50)
+    lines = []
+    for message in messages:
+        content = message.get("content")
+        if not isinstance(content, str):
+            content = json.dumps(content, default=str)
+        if message.get("tool_calls"):
+            calls = [f"{call.function.name}({call.function.arguments})" for call in message["tool_calls"]]
+            content += f" [calls: {', '.join(calls)}]"
+        lines.append(f"{message.get('role')}: {truncate_tokens(content, share)}")
+
+    request = [
+        {"role": "system", "content": COMPACTION_PROMPT},
+        {"role": "user", "content": "\n".join(lines)}
+    ]
+    with span("llm.compaction", **{"gen_ai.request.model": COMPACTION_MODEL, "compaction.messages": len(messages)}):
+        def attempt():
+            with limiter_for(COMPACTION_MODEL).acquire(_estimate_tokens(request, None, 1024)) as permit:
+                _record_wait(permit)
+                response = completion(
+                    model=COMPACTION_MODEL,
+                    messages=request,
+                    max_tokens=1024,
+                    timeout=timeout_for(LLM_REQUEST_TIMEOUT)
+                )
+                _settle(permit, response)
+            return response
+
+        response = resilience.call(COMPACTION_MODEL, attempt)
+        _record_usage(response)
+        return response.choices[0].message.content or ""
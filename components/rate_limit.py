@@ -0,0 +1,191 @@
+"""Per-model request / token budgets and in-flight caps for LLM calls, with a fair FIFO queue"""
+
+import asyncio
+import itertools
+import math
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, Dict, Optional
+
+
+class TokenBucket:
+    """`rate_per_minute` units per minute, refilled continuously, holding at most one minute of budget"""
+    def __init__(self, rate_per_minute: float):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(rate_per_minute)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available (0 if it is available now)"""
+        # a request larger than the whole bucket waits for a full bucket instead of forever
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+
+class Permit:
+    """Handed to the caller while it holds a slot, so it can settle the tokens it actually used"""
+    def __init__(self, limiter: "RateLimiter", tokens: int, waited: float):
+        self.limiter = limiter
+        self.tokens = tokens
+        self.waited = waited
+
+    def settle(self, actual_tokens: Optional[int]):
+        """Charge the difference between the estimated and the actual token usage"""
+        if actual_tokens is None or self.limiter.tpm is None:
+            return
+        self.limiter._adjust(actual_tokens - self.tokens)
+        self.tokens = actual_tokens
+
+
+class RateLimiter:
+    """
+    Budgets of one model: `rpm` requests and `tpm` tokens per minute, and at most `max_in_flight` calls at once
+    (None disables a limit). Callers that would exceed a budget are queued, not rejected, and served in
+    arrival order: a caller only proceeds once everyone queued before it has, so a burst cannot starve anyone.
+
+    The tokens of a call are not known before it returns, so callers reserve an estimate and settle
+    the actual usage afterwards; an underestimate is paid back by the callers that come next.
+    """
+    def __init__(self, name: str, rpm: Optional[float] = None, tpm: Optional[float] = None,
+                 max_in_flight: Optional[int] = None, window: int = 200):
+        self.name = name
+        self.rpm = rpm
+        self.tpm = tpm
+        self.max_in_flight = max_in_flight
+        self.requests = TokenBucket(rpm) if rpm else None
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.in_flight = 0
+        self.calls = 0
+        self.queued_calls = 0
+        self.waits = deque(maxlen=window)        # queue wait of the last calls, in seconds
+        self._queue = deque()
+        self._tickets = itertools.count()
+        self._cond = threading.Condition()
+
+    # * Admission
+    def _ready(self, ticket: int, tokens: int) -> float:
+        """
+        0 if the caller holding `ticket` may start now, otherwise the seconds to wait before checking again.
+        Must be called with the lock held.
+        """
+        if self._queue[0] != ticket:
+            return math.inf
+        if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+            return math.inf
+        now = time.monotonic()
+        wait = 0.0
+        for bucket, amount in ((self.requests, 1), (self.tokens, tokens)):
+            if bucket is not None:
+                bucket.refill(now)
+                wait = max(wait, bucket.wait_time(amount))
+        return wait
+
+    def _admit(self, tokens: int, waited: float) -> Permit:
+        """Take the budget of one call. Must be called with the lock held"""
+        self._queue.popleft()
+        if self.requests is not None:
+            self.requests.level -= 1
+        if self.tokens is not None:
+            self.tokens.level -= min(tokens, self.tokens.capacity)
+        self.in_flight += 1
+        self.calls += 1
+        self.queued_calls += waited > 0.001
+        self.waits.append(waited)
+        # the next caller in line may be admitted as well
+        self._cond.notify_all()
+        return Permit(self, tokens, waited)
+
+    def _release(self):
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def _leave(self, ticket: int):
+        """A caller gave up while queued (e.g. a cancelled task)"""
+        with self._cond:
+            self._queue.remove(ticket)
+            self._cond.notify_all()
+
+    def _adjust(self, tokens: int):
+        with self._cond:
+            if self.tokens is not None:
+                self.tokens.refill(time.monotonic())
+                # may go below zero: the next callers wait until the overdraft is refilled
+                self.tokens.level = min(self.tokens.capacity, self.tokens.level - tokens)
+            self._cond.notify_all()
+
+    @contextmanager
+    def acquire(self, tokens: int = 0):
+        """Block until the call fits in every budget, and hold an in-flight slot for the enclosed block"""
+        start = time.perf_counter()
+        with self._cond:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+            try:
+                while True:
+                    wait = self._ready(ticket, tokens)
+                    if wait == 0:
+                        permit = self._admit(tokens, time.perf_counter() - start)
+                        break
+                    self._cond.wait(None if wait == math.inf else wait)
+            except BaseException:
+                self._queue.remove(ticket)
+                self._cond.notify_all()
+                raise
+        try:
+            yield permit
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aacquire(self, tokens: int = 0, poll: float = 0.05):
+        """Async version of `acquire`: the same queue, waited on without blocking the event loop"""
+        start = time.perf_counter()
+        with self._cond:
+            ticket = next(self._tickets)
+            self._queue.append(ticket)
+        try:
+            while True:
+                with self._cond:
+                    wait = self._ready(ticket, tokens)
+                    if wait == 0:
+                        permit = self._admit(tokens, time.perf_counter() - start)
+                        break
+                # the releasing thread cannot wake a coroutine, so check again after a short sleep
+                await asyncio.sleep(poll if wait == math.inf else min(wait, poll))
+        except BaseException:
+            self._leave(ticket)
+            raise
+        try:
+            yield permit
+        finally:
+            self._release()
+
+    # * Metrics
+    def snapshot(self) -> Dict[str, Any]:
+        with self._cond:
+            waits = sorted(self.waits)
+            now = time.monotonic()
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.refill(now)
+            return {
+                "calls": self.calls,
+                "queued_calls": self.queued_calls,
+                "queued_now": len(self._queue),
+                "in_flight": self.in_flight,
+                "wait_p50_s": round(waits[len(waits) // 2], 3) if waits else None,
+                "wait_p95_s": round(waits[min(math.ceil(0.95 * len(waits)) - 1, len(waits) - 1)], 3) if waits else None,
+                "wait_max_s": round(waits[-1], 3) if waits else None,
+                "requests_left": round(self.requests.level, 1) if self.requests else None,
+                "tokens_left": round(self.tokens.level) if self.tokens else None
+            }
@@ -0,0 +1,182 @@
+"""Decide which files of a repository are worth sending to the LLM"""
+
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+
+# * Files that are never useful to describe a repository
+# only directories that never hold the project's own source: 'build', 'dist', 'vendor' or 'third_party'
+# can be real packages, so they are left to .gitignore and linguist-vendored / linguist-generated
+EXCLUDE_DIRS = {
+    '.git', '__pycache__', '.pytest_cache', 'venv', '.venv', 'node_modules', '.vscode', '.idea',
+    '.mypy_cache', '.ruff_cache', '.tox', '.nox', '.next', '.nuxt', '.gradle', '.terraform',
+    'bower_components', 'site-packages', '.eggs'
+}
+EXCLUDE_EXTS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.ico', '.bmp', '.webp', '.svg', '.psd',  # 圖片
+    '.mp4', '.mp3', '.wav', '.mov', '.avi', '.ogg',                            # 影音
+    '.zip', '.tar', '.gz', '.7z', '.rar', '.bz2', '.xz', '.jar', '.whl',       # 壓縮檔
+    '.exe', '.bin', '.dll', '.so', '.dylib', '.pyc', '.o', '.a', '.class',     # 二進位
+    '.DS_Store', '.env', '.pkl', '.model', '.lock',                            # 系統/模型/金鑰/lockfile
+    '.onnx', '.tflite', '.pb', '.pt', '.h5', '.safetensors', '.ckpt',          # 機器學習模型
+    '.pdf', '.docx', '.xlsx', '.csv', '.parquet', '.db', '.sqlite',
+    '.woff', '.woff2', '.ttf', '.eot', '.otf',                                 # 字型
+    '.map'                                                                     # source maps
+}
+EXCLUDE_FILES = {
+    'package-lock.json', 'yarn.lock', 'pnpm-lock.yaml', 'npm-shrinkwrap.json', 'poetry.lock',
+    'Pipfile.lock', 'Cargo.lock', 'composer.lock', 'Gemfile.lock', 'go.sum', 'uv.lock', 'pdm.lock',
+    'flake.lock', 'packages.lock.json', 'mix.lock', 'pubspec.lock'
+}
+EXCLUDE_SUFFIXES = ('.min.js', '.min.css', '.bundle.js', '.chunk.js', '.pb.go', '_pb2.py', '.generated.ts')
+
+LFS_POINTER_PREFIX = b"version https://git-lfs.github.com/spec/"
+SNIFF_BYTES = 8000
+
+
+def _glob_to_regex(pattern: str) -> str:
+    """Translate one gitignore-style glob into a regular expression body"""
+    out, i = "", 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out += "(?:.*/)?"
+            i += 3
+        elif pattern.startswith("**", i):
+            out += ".*"
+            i += 2
+        elif pattern[i] == "*":
+            out += "[^/]*"
+            i += 1
+        elif pattern[i] == "?":
+            out += "[^/]"
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            if body.startswith("!"):
+                body = "^" + body[1:]
+            out += "[" + body.replace("\\", "\\\\") + "]"
+            i = end + 1
+        elif pattern[i] == "\\" and i + 1 < len(pattern):
+            out += re.escape(pattern[i + 1])
+            i += 2
+        else:
+            out += re.escape(pattern[i])
+            i += 1
+    return out
+
+
+class GitPattern:
+    """One pattern of a .gitignore or .gitattributes file, scoped to the directory that holds the file"""
+    def __init__(self, base: str, pattern: str):
+        self.base = base
+        self.negate = pattern.startswith("!")
+        pattern = pattern[1:] if self.negate else pattern
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+
+        # patterns without an inner slash match a name at any depth
+        anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+        prefix = "" if anchored else "(?:.*/)?"
+        self.regex = re.compile(f"^{prefix}{_glob_to_regex(pattern)}$")
+
+    def matches(self, rel_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+        if self.base:
+            if not rel_path.startswith(self.base + "/"):
+                return False
+            rel_path = rel_path[len(self.base) + 1:]
+        return bool(self.regex.match(rel_path))
+
+
+class RepoFilter:
+    """
+    Filtering stage of the repository scanner.
+
+    Cheap checks run while walking, before a file is opened: excluded names and extensions,
+    `.gitignore`, `linguist-generated` / `linguist-vendored` in `.gitattributes`, and a size threshold.
+    Content checks (binary sniffing, LFS pointers) run on the first bytes of the files that made it through.
+    """
+    def __init__(self, root: str, max_file_bytes: int = 512 * 1024):
+        self.root = root
+        self.max_file_bytes = max_file_bytes
+        self.ignore_rules: List[GitPattern] = []
+        self.attribute_rules: List[Tuple[GitPattern, Dict[str, bool]]] = []
+
+    def load_directory(self, rel_dir: str):
+        """Load the .gitignore and .gitattributes of a directory, called as the walk enters it"""
+        base = "" if rel_dir in ("", ".") else rel_dir.replace(os.sep, "/")
+        directory = os.path.join(self.root, rel_dir)
+
+        for line in self._read_lines(os.path.join(directory, ".gitignore")):
+            self.ignore_rules.append(GitPattern(base, line))
+
+        for line in self._read_lines(os.path.join(directory, ".gitattributes")):
+            pattern, *attributes = line.split()
+            flags = {}
+            for attribute in attributes:
+                name, _, value = attribute.lstrip("-!").partition("=")
+                if name in ("linguist-generated", "linguist-vendored", "binary"):
+                    flags[name] = not attribute.startswith(("-", "!")) and value.lower() not in ("false", "0")
+            if flags and not pattern.startswith("!"):
+                self.attribute_rules.append((GitPattern(base, pattern), flags))
+
+    def _read_lines(self, path: str) -> List[str]:
+        try:
+            with open(path, "r", encoding="utf-8", errors="ignore") as f:
+                lines = [line.rstrip("\n").rstrip() for line in f]
+        except OSError:
+            return []
+        return [line for line in lines if line and not line.startswith("#")]
+
+    def is_ignored(self, rel_path: str, is_dir: bool) -> bool:
+        ignored = False
+        for rule in self.ignore_rules:
+            if rule.matches(rel_path, is_dir):
+                ignored = not rule.negate
+        return ignored
+
+    def attributes(self, rel_path: str) -> Dict[str, bool]:
+        flags = {}
+        for rule, rule_flags in self.attribute_rules:
+            if rule.matches(rel_path, False):
+                flags.update(rule_flags)
+        return flags
+
+    def skip_directory(self, rel_dir: str) -> bool:
+        name = os.path.basename(rel_dir)
+        return name in EXCLUDE_DIRS or self.is_ignored(rel_dir.replace(os.sep, "/"), True)
+
+    def skip_file(self, rel_path: str, file_path: str) -> Optional[str]:
+        """Reason to skip a file without opening it, or None if it should be read"""
+        name = os.path.basename(rel_path)
+        ext = os.path.splitext(name)[1].lower()
+        if ext in EXCLUDE_EXTS or name in EXCLUDE_EXTS or name in EXCLUDE_FILES or name.endswith(EXCLUDE_SUFFIXES):
+            return "excluded"
+
+        rel_path = rel_path.replace(os.sep, "/")
+        if self.is_ignored(rel_path, False):
+            return "gitignore"
+
+        flags = self.attributes(rel_path)
+        if flags.get("linguist-generated") or flags.get("linguist-vendored") or flags.get("binary"):
+            return "gitattributes"
+
+        try:
+            if os.path.getsize(file_path) > self.max_file_bytes:
+                return "too large"
+        except OSError:
+            return "unreadable"
+        return None
+
+
+def sniff_content(head: bytes) -> Optional[str]:
+    """Reason to skip a file based on its leading bytes, or None if it looks like text"""
+    if head.startswith(LFS_POINTER_PREFIX):
+        return "lfs pointer"
+    if b"\0" in head[:SNIFF_BYTES]:
+        return "binary"
+    return None
@@ -0,0 +1,130 @@
+"""Entry points of the repository scanner: mirror sync, incremental manifest update, and cached reports"""
+
+import os
+import shutil
+import tempfile
+from typing import Optional, Tuple
+
+from components.digest import pack_digest
+from components.git_mirror import GitMirror
+from components.scan_cache import ScanCache
+from components.scanner import scan_tree, read_manifest_header
+from components.tracing import span
+from config import SCAN_CACHE_DIR, SCAN_CACHE_MAX_MB, SCAN_MIRROR_DIR, SCAN_GIT_TIMEOUT, SCAN_MAX_WORKERS, SCAN_MAX_REPORT_MB, SCAN_MAX_FILE_KB, SCAN_TOKEN_BUDGET
+
+
+# files whose change invalidates the filtering of the whole tree
+FILTER_FILES = (".gitignore", ".gitattributes")
+
+# scan reports keyed by repo url + HEAD commit, shared by every session in this process
+scan_cache = ScanCache(SCAN_CACHE_DIR, max_bytes = SCAN_CACHE_MAX_MB * 1024 * 1024)
+
+
+def _update_manifest(repo_url: str, mirror: GitMirror, commit_sha: str) -> str:
+    """
+    Bring the manifest of repo_url up to date with commit_sha and return its path.
+    The caller must hold `mirror.lock`.
+    """
+    manifest_path = scan_cache.manifest_path(repo_url)
+    previous = read_manifest_header(manifest_path)
+    if previous and previous.get("commit") == commit_sha:
+        return manifest_path
+
+    # 1. find the files changed since the last scanned commit, if that scan is still around
+    changes = None
+    if previous:
+        changes = mirror.changed_files(previous["commit"], commit_sha)
+    # a changed ignore / attributes file can change the verdict on unchanged files: scan everything
+    if changes is not None and any(os.path.basename(p) in FILTER_FILES for p in changes[0] + changes[1]):
+        changes = None
+
+    # 2. export either the changed files or the whole tree, then stream them into the manifest
+    tmp_dir = tempfile.mkdtemp(prefix="full_repo_scan_")
+    try:
+        manifest_header = {"repo_url": repo_url, "commit": commit_sha}
+        if changes is not None:
+            # the filter files are exported too, so the changed files are judged by the same rules
+            modified, deleted = changes
+            modified = sorted(set(modified) | set(mirror.list_files(commit_sha, FILTER_FILES)))
+            with span("repo.export", **{"repo.url": repo_url, "repo.incremental": True, "repo.changed_files": len(modified) + len(deleted)}):
+                mirror.export(commit_sha, tmp_dir, paths = modified)
+            with span("repo.scan_tree", **{"repo.url": repo_url, "repo.incremental": True}) as current:
+                files = scan_tree(tmp_dir, manifest_path, manifest_header,
+                                  previous_manifest = manifest_path,
+                                  changed_paths = set(modified) | set(deleted),
+                                  max_workers = SCAN_MAX_WORKERS,
+                                  max_file_bytes = SCAN_MAX_FILE_KB * 1024)
+                current.set(**{"repo.files": files})
+        else:
+            with span("repo.export", **{"repo.url": repo_url, "repo.incremental": False}):
+                mirror.export(commit_sha, tmp_dir)
+            with span("repo.scan_tree", **{"repo.url": repo_url, "repo.incremental": False}) as current:
+                files = scan_tree(tmp_dir, manifest_path, manifest_header,
+                                  max_workers = SCAN_MAX_WORKERS,
+                                  max_file_bytes = SCAN_MAX_FILE_KB * 1024)
+                current.set(**{"repo.files": files})
+    finally:
+        # Clean the temporary directory
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    mirror.mark_scanned(commit_sha)
+    return manifest_path
+
+
+def _remote_head(repo_url: str, mirror: GitMirror) -> Optional[str]:
+    """Ask the remote for its HEAD commit, without fetching anything"""
+    with span("repo.ls_remote", **{"repo.url": repo_url}):
+        return mirror.remote_head()
+
+
+def _sync(repo_url: str, mirror: GitMirror, head: Optional[str]) -> str:
+    """
+    The commit to scan: `head` if the manifest is already at that commit (nothing to fetch),
+    otherwise the remote HEAD fetched into the mirror. The caller must hold `mirror.lock`.
+    """
+    manifest_header = read_manifest_header(scan_cache.manifest_path(repo_url))
+    if head is not None and manifest_header and manifest_header.get("commit") == head:
+        return head
+    with span("repo.sync", **{"repo.url": repo_url}):
+        return mirror.sync()
+
+
+def scan_repository(repo_url: str) -> Tuple[str, str]:
+    """Return (HEAD commit sha, path of an up-to-date manifest of per-file contents), fetching only what changed"""
+    mirror = GitMirror(SCAN_MIRROR_DIR, repo_url, timeout = SCAN_GIT_TIMEOUT)
+    head = _remote_head(repo_url, mirror)
+    with mirror.lock:
+        commit_sha = _sync(repo_url, mirror, head)
+        return commit_sha, _update_manifest(repo_url, mirror, commit_sha)
+
+
+def scan_report(repo_url: str) -> str:
+    """The token-budgeted scan report of the remote HEAD, served from the cache when the commit was seen before"""
+    mirror = GitMirror(SCAN_MIRROR_DIR, repo_url, timeout = SCAN_GIT_TIMEOUT)
+    # 1. a report of the remote HEAD is served without touching the mirror
+    head = _remote_head(repo_url, mirror)
+    if head is not None:
+        cached_report = scan_cache.get(repo_url, f"{head}:{SCAN_TOKEN_BUDGET}")
+        if cached_report is not None:
+            return cached_report
+
+    with mirror.lock:
+        # 2. fetch the remote HEAD into the mirror, unless the manifest is already at that commit
+        commit_sha = _sync(repo_url, mirror, head)
+        cache_key = f"{commit_sha}:{SCAN_TOKEN_BUDGET}"
+        if commit_sha != head:
+            # the remote moved since ls-remote, or it was not asked
+            cached_report = scan_cache.get(repo_url, cache_key)
+            if cached_report is not None:
+                return cached_report
+
+        # 3. scan the changed files (or the whole tree), then pack the report
+        manifest_path = _update_manifest(repo_url, mirror, commit_sha)
+        with span("repo.pack_digest", **{"repo.url": repo_url, "repo.token_budget": SCAN_TOKEN_BUDGET}):
+            report = pack_digest(manifest_path,
+                                 header = f"=== REPOSITORY FULL SCAN: {repo_url} (commit {commit_sha[:12]}) ===\n",
+                                 token_budget = SCAN_TOKEN_BUDGET,
+                                 max_bytes = SCAN_MAX_REPORT_MB * 1024 * 1024)
+
+        scan_cache.put(repo_url, cache_key, report)
+        return report
@@ -0,0 +1,305 @@
+"""Retries with jittered exponential backoff, per-endpoint circuit breakers and run deadlines for network calls"""
+
+import asyncio
+import contextvars
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+from components.tracing import current_span
+from config import RETRY_ATTEMPTS, RETRY_BASE_DELAY, RETRY_MAX_DELAY, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS
+
+
+class CircuitOpenError(RuntimeError):
+    """The endpoint failed repeatedly and is not called until its breaker lets a trial call through"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """The deadline of the current agent run has passed"""
+
+
+class Cancelled(DeadlineExceeded):
+    """
+    The current run was cancelled (e.g. its job). A DeadlineExceeded, so whatever stops at
+    the deadline (agent iterations, LLM calls, retries, scans) stops on cancellation too
+    """
+
+
+# * Errors worth retrying: rate limits, timeouts, dropped connections and server errors
+RETRYABLE_STATUS = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+RETRYABLE_NAMES = {
+    "RateLimitError", "APIConnectionError", "Timeout", "APITimeoutError", "ServiceUnavailableError",
+    "InternalServerError", "BadGatewayError", "ConnectionError", "ConnectTimeout", "ReadTimeout",
+    "ChunkedEncodingError", "TimeoutError", "ConnectionResetError"
+}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Whether exc is a transient failure. Checked by status code and class name, so the provider and
+    HTTP libraries do not have to be imported here.
+    """
+    if isinstance(exc, (CircuitOpenError, DeadlineExceeded)):
+        return False
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status in RETRYABLE_STATUS
+    return any(cls.__name__ in RETRYABLE_NAMES for cls in type(exc).__mro__)
+
+
+class HTTPStatusError(RuntimeError):
+    """A response with a retryable status code, raised so that it goes through the retry loop"""
+    def __init__(self, response):
+        super().__init__(f"HTTP {response.status_code} from {response.url}")
+        self.response = response
+        self.status_code = response.status_code
+
+
+# * Deadlines
+# the monotonic time at which the current agent run must stop. Sub-agents and worker threads inherit it
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("deadline", default=None)
+
+
+@contextmanager
+def deadline(seconds: Optional[float]):
+    """Run the enclosed block with a deadline `seconds` from now, or the enclosing one if that is sooner"""
+    parent = _deadline.get()
+    if seconds is None:
+        yield parent
+        return
+    value = time.monotonic() + seconds
+    if parent is not None:
+        value = min(value, parent)
+    token = _deadline.set(value)
+    try:
+        yield value
+    finally:
+        try:
+            _deadline.reset(token)
+        except ValueError:
+            # a generator resumed in another context: restore the parent there instead
+            _deadline.set(parent)
+
+
+# the cancel flag of the current run. Sub-agents and worker threads inherit it like the deadline
+_cancel: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar("cancel", default=None)
+
+
+@contextmanager
+def cancellation(event: threading.Event):
+    """Run the enclosed block so that `check_deadline` raises Cancelled once event is set"""
+    parent = _cancel.get()
+    token = _cancel.set(event)
+    try:
+        yield event
+    finally:
+        try:
+            _cancel.reset(token)
+        except ValueError:
+            _cancel.set(parent)
+
+
+def cancelled() -> bool:
+    event = _cancel.get()
+    return event is not None and event.is_set()
+
+
+def time_left() -> Optional[float]:
+    """Seconds until the deadline of the current run, or None without a deadline"""
+    value = _deadline.get()
+    return None if value is None else value - time.monotonic()
+
+
+def check_deadline(what: str = "the agent run"):
+    if cancelled():
+        raise Cancelled(f"Run cancelled during {what}.")
+    left = time_left()
+    if left is not None and left <= 0:
+        raise DeadlineExceeded(f"Deadline of {what} exceeded.")
+
+
+def timeout_for(default: float) -> float:
+    """A per-request timeout that does not outlive the deadline"""
+    left = time_left()
+    return default if left is None else max(min(default, left), 0.001)
+
+
+# * Circuit breakers
+class CircuitBreaker:
+    """
+    Closed: calls go through. After `failure_threshold` consecutive calls failed with transient errors
+    (each one counted once, after its retries are used up) the breaker opens,
+    and calls fail immediately with CircuitOpenError for `reset_seconds`. Then one trial call is let
+    through (half-open): its success closes the breaker, its failure opens it again.
+    """
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.rejections = 0
+        self._trial = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Raise CircuitOpenError if the call must not be made"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = "half_open"
+                self._trial = False
+            if self.state == "half_open" and not self._trial:
+                self._trial = True
+                return
+            self.rejections += 1
+            retry_in = max(self.reset_seconds - (time.monotonic() - self.opened_at), 0)
+            raise CircuitOpenError(f"'{self.name}' is failing; not called again for {retry_in:.0f} seconds.")
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self._trial = False
+
+    def release(self):
+        """The trial call ended without telling whether the endpoint is up (e.g. a client error)"""
+        with self._lock:
+            self._trial = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures, "rejections": self.rejections}
+
+
+breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def breaker_for(endpoint: str) -> CircuitBreaker:
+    with _breakers_lock:
+        if endpoint not in breakers:
+            breakers[endpoint] = CircuitBreaker(endpoint, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_SECONDS)
+        return breakers[endpoint]
+
+
+# * Retries
+class RetryPolicy:
+    """Up to `attempts` calls, sleeping a random time in [0, min(max_delay, base_delay * 2^n)] between them (full jitter)"""
+    def __init__(self, attempts: int = RETRY_ATTEMPTS, base_delay: float = RETRY_BASE_DELAY,
+                 max_delay: float = RETRY_MAX_DELAY, retryable: Callable[[BaseException], bool] = is_retryable):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable = retryable
+
+    def delay(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+
+default_policy = RetryPolicy()
+
+
+def _before_attempt(endpoint: str, breaker: CircuitBreaker):
+    check_deadline(f"the call to '{endpoint}'")
+    breaker.allow()
+
+
+def _backoff(seconds: float):
+    """Sleep between two attempts, waking up early if the run is cancelled"""
+    event = _cancel.get()
+    if event is None:
+        time.sleep(seconds)
+    else:
+        event.wait(seconds)
+
+
+def _after_failure(endpoint: str, breaker: CircuitBreaker, policy: RetryPolicy, exc: Exception, attempt: int) -> Optional[float]:
+    """Record a failed attempt and return the backoff before the next one, or None to give up"""
+    if not policy.retryable(exc):
+        # the endpoint answered: a bad request says nothing about its health
+        breaker.release()
+        return None
+    sleep = policy.delay(attempt) if attempt + 1 < policy.attempts else None
+    left = time_left()
+    if sleep is not None and left is not None and sleep >= left:
+        sleep = None
+    if sleep is None or breaker.state == "half_open":
+        # the breaker counts calls, not attempts: a short burst of 429s retried by a few calls
+        # must not open it for everyone. A failed trial call reopens it without retrying.
+        breaker.record_failure()
+        return None
+    current = current_span()
+    if current is not None:
+        current.set(**{"retry.attempts": attempt + 2, "retry.endpoint": endpoint})
+    return sleep
+
+
+def call(endpoint: str, func: Callable, *args, policy: RetryPolicy | None = None, **kwargs) -> Any:
+    """
+    Call func through the circuit breaker of `endpoint`, retrying transient errors with backoff
+    until the attempts or the deadline of the current run are used up
+    """
+    policy = policy or default_policy
+    breaker = breaker_for(endpoint)
+    attempt = 0
+    while True:
+        _before_attempt(endpoint, breaker)
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            sleep = _after_failure(endpoint, breaker, policy, e, attempt)
+            if sleep is None:
+                raise
+            _backoff(sleep)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+async def acall(endpoint: str, func: Callable, *args, policy: RetryPolicy | None = None, **kwargs) -> Any:
+    """Async version of `call`: func is a coroutine function"""
+    policy = policy or default_policy
+    breaker = breaker_for(endpoint)
+    attempt = 0
+    while True:
+        _before_attempt(endpoint, breaker)
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            sleep = _after_failure(endpoint, breaker, policy, e, attempt)
+            if sleep is None:
+                raise
+            await asyncio.sleep(sleep)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+def http_get(endpoint: str, url: str, timeout: float = 10, **kwargs):
+    """`requests.get` through `call`: connection errors and 429 / 5xx responses are retried"""
+    import requests
+
+    def get():
+        response = requests.get(url, timeout=timeout_for(timeout), **kwargs)
+        if response.status_code in RETRYABLE_STATUS:
+            raise HTTPStatusError(response)
+        return response
+
+    return call(endpoint, get)
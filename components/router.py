@@ -0,0 +1,325 @@
+"""Route LLM calls over an ordered list of model backends, with failover and hedged requests"""
+
+import asyncio
+import contextvars
+import math
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from components.game import Prompt
+from components.tracing import span
+
+
+class Backend:
+    """One model endpoint. `complete` returns the message, `stream` yields token / tool_call_delta / message events."""
+    name: str = "backend"
+
+    def complete(self, prompt: Prompt) -> Any:
+        raise NotImplementedError
+
+    def stream(self, prompt: Prompt) -> Iterator[dict]:
+        yield {"type": "message", "message": self.complete(prompt)}
+
+    async def acomplete(self, prompt: Prompt) -> Any:
+        return await asyncio.to_thread(self.complete, prompt)
+
+
+class StubBackend(Backend):
+    """
+    A local backend for tests and benchmarks: answers with `respond(prompt)` (or a fixed text) after `latency`
+    seconds, and fails with probability `error_rate`. The random generator is seeded, so runs are repeatable.
+    """
+    def __init__(self, name: str, respond: Callable[[Prompt], Any] | str = "stub answer",
+                 latency: float | Callable[[], float] = 0.0, error_rate: float = 0.0, seed: int = 0):
+        self.name = name
+        self.respond = respond
+        self.latency = latency
+        self.error_rate = error_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def complete(self, prompt: Prompt) -> Any:
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.error_rate
+            delay = self.latency() if callable(self.latency) else self.latency
+        time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{self.name}: simulated provider error")
+        if callable(self.respond):
+            return self.respond(prompt)
+        from litellm import Message
+        return Message(role="assistant", content=self.respond)
+
+
+class BackendStats:
+    """
+    Rolling latency and error rate of the last `window` calls of one backend.
+    Calls older than `max_age` seconds are forgotten, so an outage does not count against a backend forever.
+    """
+    def __init__(self, window: int = 50, max_age: float | None = 300.0):
+        self.samples = deque(maxlen=window)      # (monotonic time, seconds, succeeded)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float, ok: bool):
+        with self._lock:
+            self.samples.append((time.monotonic(), seconds, ok))
+
+    def _recent(self) -> List[tuple]:
+        """The samples that have not expired. Must be called with the lock held"""
+        if self.max_age is not None:
+            oldest = time.monotonic() - self.max_age
+            while self.samples and self.samples[0][0] < oldest:
+                self.samples.popleft()
+        return list(self.samples)
+
+    def count(self) -> int:
+        with self._lock:
+            return len(self._recent())
+
+    def error_rate(self, min_samples: int = 1) -> float:
+        """Share of failed calls, or 0 with fewer than `min_samples` calls (too few to judge the backend)"""
+        with self._lock:
+            samples = self._recent()
+        if not samples or len(samples) < min_samples:
+            return 0.0
+        return sum(1 for _, _, ok in samples if not ok) / len(samples)
+
+    def forget_failures(self):
+        """The backend has recovered: its earlier failures no longer count"""
+        with self._lock:
+            self.samples = deque((sample for sample in self.samples if sample[2]), maxlen=self.samples.maxlen)
+
+    def p95(self) -> Optional[float]:
+        """95th percentile latency of the successful calls, or None without samples"""
+        with self._lock:
+            latencies = sorted(seconds for _, seconds, ok in self._recent() if ok)
+        if not latencies:
+            return None
+        return latencies[min(math.ceil(0.95 * len(latencies)) - 1, len(latencies) - 1)]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p95 = self.p95()
+        return {
+            "calls": self.count(),
+            "error_rate": round(self.error_rate(), 3),
+            "p95_s": round(p95, 3) if p95 is not None else None
+        }
+
+
+class ModelRouter:
+    """
+    Sends each call to the first healthy backend of an ordered list.
+
+    - Failover: if a backend raises, the call moves on to the next one.
+    - Health: a backend whose rolling error rate exceeds `max_error_rate` (over at least `health_min_samples`
+      recent calls) is tried after the healthy ones. Every `probe_seconds`, one call tries it in its configured
+      place again (a probe); if the probe succeeds, its earlier failures are forgotten and it is healthy again.
+    - Hedging: if the first backend has not answered within its p95 latency (times `hedge_factor`),
+      the same request is also sent to the next backend, and the first answer wins.
+      Streaming calls are not hedged; they fail over as long as nothing has been yielded yet.
+    """
+    def __init__(self, backends: List[Backend], hedge: bool = True, hedge_factor: float = 1.0,
+                 hedge_min_samples: int = 10, max_error_rate: float = 0.5, window: int = 50,
+                 health_min_samples: int = 5, probe_seconds: float = 30.0, stats_max_age: float | None = 300.0):
+        if not backends:
+            raise ValueError("ModelRouter needs at least one backend")
+        self.backends = backends
+        self.hedge = hedge
+        self.hedge_factor = hedge_factor
+        self.hedge_min_samples = hedge_min_samples
+        self.max_error_rate = max_error_rate
+        self.health_min_samples = health_min_samples
+        self.probe_seconds = probe_seconds
+        self.stats = {backend.name: BackendStats(window, stats_max_age) for backend in backends}
+        self.hedges = 0
+        self.hedge_wins = 0
+        self.failovers = 0
+        self.probes = 0
+        self._probing: Dict[str, float] = {}     # backend -> time of its last probe
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=32, thread_name_prefix="model_router")
+
+    def healthy(self, backend: Backend) -> bool:
+        return self.stats[backend.name].error_rate(self.health_min_samples) <= self.max_error_rate
+
+    def order(self) -> List[Backend]:
+        """The backends in configured order, unhealthy ones last"""
+        healthy = [b for b in self.backends if self.healthy(b)]
+        return healthy + [b for b in self.backends if b not in healthy]
+
+    def _plan(self) -> List[Backend]:
+        """
+        The backends for one call: `order`, except that an unhealthy backend not probed for
+        `probe_seconds` keeps its configured place, so this call probes it
+        """
+        now = time.monotonic()
+        with self._lock:
+            probes = []
+            for backend in self.backends:
+                if not self.healthy(backend) and now - self._probing.setdefault(backend.name, now) >= self.probe_seconds:
+                    self._probing[backend.name] = now
+                    probes.append(backend)
+            self.probes += len(probes)
+        healthy = [b for b in self.backends if b in probes or self.healthy(b)]
+        return healthy + [b for b in self.backends if b not in healthy]
+
+    def _record(self, backend: Backend, seconds: float, ok: bool):
+        stats = self.stats[backend.name]
+        recovered = ok and not self.healthy(backend)
+        stats.record(seconds, ok)
+        if recovered:
+            # a success of an unhealthy backend (a probe, or the last resort): it is up again
+            stats.forget_failures()
+        if self.healthy(backend):
+            with self._lock:
+                self._probing.pop(backend.name, None)
+
+    def hedge_deadline(self, backend: Backend) -> Optional[float]:
+        """Seconds to wait for backend before hedging, or None if there are not enough samples yet"""
+        stats = self.stats[backend.name]
+        if not self.hedge or stats.count() < self.hedge_min_samples:
+            return None
+        p95 = stats.p95()
+        return p95 * self.hedge_factor if p95 is not None else None
+
+    def _call(self, backend: Backend, prompt: Prompt, hedged: bool = False) -> Any:
+        start = time.perf_counter()
+        with span("llm.backend", **{"llm.backend": backend.name, "llm.hedged": hedged}):
+            try:
+                result = backend.complete(prompt)
+            except Exception:
+                self._record(backend, time.perf_counter() - start, False)
+                raise
+        self._record(backend, time.perf_counter() - start, True)
+        return result
+
+    def _submit(self, backend: Backend, prompt: Prompt, hedged: bool = False):
+        # each call runs in a copy of the caller's context, so its span is a child of the caller's span
+        return self._pool.submit(contextvars.copy_context().run, self._call, backend, prompt, hedged)
+
+    def complete(self, prompt: Prompt) -> Any:
+        backends = self._plan()
+        errors = []
+        i = 0
+        while i < len(backends):
+            primary = backends[i]
+            deadline = self.hedge_deadline(primary) if i + 1 < len(backends) else None
+            if deadline is None:
+                # nothing to hedge with: call in this thread
+                try:
+                    return self._call(primary, prompt)
+                except Exception as e:
+                    errors.append(f"{primary.name}: {type(e).__name__}: {e}")
+                    self.failovers += 1
+                    i += 1
+                    continue
+
+            futures = {self._submit(primary, prompt): primary}
+            done, _ = wait(futures, timeout=deadline, return_when=FIRST_COMPLETED)
+            if not done:
+                # the primary is slower than its p95: race it against the next backend
+                hedge = backends[i + 1]
+                futures[self._submit(hedge, prompt, hedged=True)] = hedge
+                self.hedges += 1
+                i += 1
+
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        errors.append(f"{futures[future].name}: {type(e).__name__}: {e}")
+                        continue
+                    if futures[future] is not primary:
+                        self.hedge_wins += 1
+                    # the losing request finishes in the background and still updates the stats
+                    return result
+            self.failovers += 1
+            i += 1
+        raise RuntimeError("Every model backend failed: " + "; ".join(errors))
+
+    def stream(self, prompt: Prompt) -> Iterator[dict]:
+        errors = []
+        for backend in self._plan():
+            start = time.perf_counter()
+            started = False
+            try:
+                with span("llm.backend", **{"llm.backend": backend.name, "llm.hedged": False}):
+                    for event in backend.stream(prompt):
+                        started = True
+                        yield event
+            except Exception as e:
+                self._record(backend, time.perf_counter() - start, False)
+                if started:
+                    # part of the answer was already shown: another backend cannot continue it
+                    raise
+                errors.append(f"{backend.name}: {type(e).__name__}: {e}")
+                self.failovers += 1
+                continue
+            self._record(backend, time.perf_counter() - start, True)
+            return
+        raise RuntimeError("Every model backend failed: " + "; ".join(errors))
+
+    async def _acall(self, backend: Backend, prompt: Prompt, hedged: bool = False) -> Any:
+        start = time.perf_counter()
+        with span("llm.backend", **{"llm.backend": backend.name, "llm.hedged": hedged}):
+            try:
+                result = await backend.acomplete(prompt)
+            except Exception:
+                self._record(backend, time.perf_counter() - start, False)
+                raise
+        self._record(backend, time.perf_counter() - start, True)
+        return result
+
+    async def acomplete(self, prompt: Prompt) -> Any:
+        """Async version of `complete`"""
+        backends = self._plan()
+        errors = []
+        i = 0
+        while i < len(backends):
+            primary = backends[i]
+            tasks = {asyncio.ensure_future(self._acall(primary, prompt)): primary}
+            deadline = self.hedge_deadline(primary) if i + 1 < len(backends) else None
+            done, _ = await asyncio.wait(tasks, timeout=deadline, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                hedge = backends[i + 1]
+                tasks[asyncio.ensure_future(self._acall(hedge, prompt, hedged=True))] = hedge
+                self.hedges += 1
+                i += 1
+
+            pending = set(tasks)
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is not None:
+                        errors.append(f"{tasks[task].name}: {type(task.exception()).__name__}: {task.exception()}")
+                        continue
+                    if tasks[task] is not primary:
+                        self.hedge_wins += 1
+                    for loser in pending:
+                        # the losing request finishes in the background; its error is already in the stats
+                        loser.add_done_callback(lambda t: t.cancelled() or t.exception())
+                    return task.result()
+            self.failovers += 1
+            i += 1
+        raise RuntimeError("Every model backend failed: " + "; ".join(errors))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Rolling stats of every backend and the router counters"""
+        return {
+            "backends": {name: stats.snapshot() for name, stats in self.stats.items()},
+            "order": [backend.name for backend in self.order()],
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "failovers": self.failovers,
+            "probes": self.probes
+        }
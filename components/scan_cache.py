@@ -0,0 +1,72 @@
+"""On-disk, size-bounded cache of repository scan reports"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, Optional
+
+from components.disk_lru import LruDirectory
+
+
+class ScanCache:
+    """
+    Scan reports keyed by (repo url, commit sha), stored as one file per entry,
+    plus one manifest of per-file blocks per repo url, used to patch the next scan incrementally.
+    The least recently used files are evicted once the total size exceeds `max_bytes`.
+    """
+    def __init__(self, root: str, max_bytes: int = 200 * 1024 * 1024):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._files = LruDirectory(root, max_bytes, (".json", ".jsonl"))
+        self._lock = threading.Lock()
+
+    @property
+    def evictions(self) -> int:
+        return self._files.evictions
+
+    def _key(self, repo_url: str, commit_sha: str) -> str:
+        raw = f"{repo_url.strip().rstrip('/')}@{commit_sha}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def manifest_path(self, repo_url: str) -> str:
+        """Path of the per-file manifest of the most recent scan of repo_url"""
+        return os.path.join(self.root, f"{self._key(repo_url, 'manifest')}.jsonl")
+
+    def get(self, repo_url: str, commit_sha: str) -> Optional[str]:
+        """Return the cached report, or None on a miss"""
+        path = self._path(self._key(repo_url, commit_sha))
+        with self._lock:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+                # * touch the entry so that LRU eviction keeps it around
+                self._files.touch(path)
+            except (OSError, ValueError):
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry["report"]
+
+    def put(self, repo_url: str, commit_sha: str, report: str):
+        """Store a report, then evict the oldest entries if the cache is too large"""
+        path = self._path(self._key(repo_url, commit_sha))
+        entry = {
+            "repo_url": repo_url,
+            "commit": commit_sha,
+            "created": time.time(),
+            "report": report
+        }
+        with self._lock:
+            self._files.write(path, json.dumps(entry).encode("utf-8"))
+
+    def stats(self) -> Dict[str, int]:
+        """Hit / miss / eviction counters and the current size of the cache"""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, **self._files.usage()}
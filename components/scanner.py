@@ -0,0 +1,143 @@
+"""Walk a checked-out repository and stream the content of its files into a manifest"""
+
+import hashlib
+import heapq
+import json
+import os
+import tempfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, Optional, Set, Tuple
+
+from components.repo_filter import RepoFilter, sniff_content, SNIFF_BYTES
+from components.resilience import check_deadline
+
+
+# bumped whenever the manifest layout changes, so that stale manifests trigger a full scan
+MANIFEST_VERSION = 2
+
+
+def iter_repo_files(root: str, repo_filter: RepoFilter) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (relative path, absolute path) of every file under root that passes the cheap checks of repo_filter.
+    Directories and files are visited in sorted order so that reports are deterministic.
+    """
+    for current, dirs, files in os.walk(root):
+        rel_dir = os.path.relpath(current, root)
+        repo_filter.load_directory(rel_dir)
+        dirs[:] = sorted(d for d in dirs
+                         if not repo_filter.skip_directory(os.path.normpath(os.path.join(rel_dir, d))))
+
+        for f in sorted(files):
+            file_path = os.path.join(current, f)
+            rel_path = os.path.relpath(file_path, root)
+            if repo_filter.skip_file(rel_path, file_path):
+                continue
+            yield rel_path, file_path
+
+
+def read_file_content(rel_path: str, file_path: str) -> Optional[Tuple[str, str]]:
+    """
+    Read one whole file (the filter already bounds its size).
+    Returns (text, content hash), or None if the leading bytes show a binary file or an LFS pointer.
+    """
+    try:
+        with open(file_path, 'rb') as content_file:
+            raw = content_file.read()
+    except Exception as e:
+        return f"[UNABLE TO READ FILE: {str(e)}]", ""
+
+    if sniff_content(raw[:SNIFF_BYTES]):
+        return None
+    return raw.decode('utf-8', errors='ignore'), hashlib.sha1(raw).hexdigest()
+
+
+def path_sort_key(rel_path: str) -> list:
+    """
+    Sort key that reproduces the order of `iter_repo_files`: within a directory, files come before subdirectories.
+    """
+    parts = rel_path.replace(os.sep, "/").split("/")
+    return [(1, d) for d in parts[:-1]] + [(0, parts[-1])]
+
+
+def read_entries(root: str, repo_filter: RepoFilter, max_workers: int = 8) -> Iterator[Tuple[str, str, str]]:
+    """
+    Read every file under root on a bounded thread pool and yield (relative path, text, content hash) in path order.
+    At most `max_workers * 4` reads are in flight, so memory use does not grow with the size of the repository.
+    """
+    window = max_workers * 4
+    pending = deque()
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="repo_scan") as pool:
+        try:
+            for rel_path, file_path in iter_repo_files(root, repo_filter):
+                pending.append((rel_path, pool.submit(read_file_content, rel_path, file_path)))
+                while len(pending) >= window or (pending and pending[0][1].done()):
+                    rel, future = pending.popleft()
+                    if future.result() is not None:
+                        yield (rel, *future.result())
+
+            while pending:
+                rel, future = pending.popleft()
+                if future.result() is not None:
+                    yield (rel, *future.result())
+        finally:
+            # the consumer stopped early: drop the reads that were not started yet
+            for _, future in pending:
+                future.cancel()
+
+
+def iter_manifest(manifest_path: str) -> Iterator[Tuple[str, str, str]]:
+    """Yield (relative path, text, content hash) from a manifest written by `scan_tree`"""
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        next(f, None)                          # header line
+        for line in f:
+            entry = json.loads(line)
+            yield entry["path"], entry["content"], entry["hash"]
+
+
+def read_manifest_header(manifest_path: str) -> Optional[dict]:
+    """Header of a manifest, or None if it is missing or was written in another layout"""
+    try:
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+    except (OSError, ValueError):
+        return None
+    return header if header.get("version") == MANIFEST_VERSION else None
+
+
+def _merge_entries(previous: Iterator[Tuple[str, str, str]], changed: Set[str],
+                   fresh: Iterator[Tuple[str, str, str]]) -> Iterator[Tuple[str, str, str]]:
+    """Merge-join the unchanged entries of the previous scan with the freshly read ones, keeping path order"""
+    previous = (entry for entry in previous if entry[0] not in changed)
+    return heapq.merge(previous, fresh, key=lambda entry: path_sort_key(entry[0]))
+
+
+def scan_tree(root: str, manifest_path: str, manifest_header: dict,
+              previous_manifest: Optional[str] = None, changed_paths: Optional[Set[str]] = None,
+              max_workers: int = 8, max_file_bytes: int = 512 * 1024) -> int:
+    """
+    Stream the content of every file under root, in path order, into a manifest. Returns the number of files.
+
+    If `previous_manifest` is given, root only holds the files in `changed_paths`: the entries of every other
+    file are taken from the previous manifest, so only the changed files are read again.
+    """
+    entries = read_entries(root, RepoFilter(root, max_file_bytes), max_workers)
+    if previous_manifest is not None:
+        entries = _merge_entries(iter_manifest(previous_manifest), changed_paths or set(), entries)
+
+    # unique across the threads and the processes (e.g. batch workers) sharing the cache directory
+    fd, tmp_manifest = tempfile.mkstemp(dir=os.path.dirname(manifest_path), prefix=os.path.basename(manifest_path) + ".", suffix=".tmp")
+    count = 0
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as manifest:
+            manifest.write(json.dumps({**manifest_header, "version": MANIFEST_VERSION}) + "\n")
+            for rel_path, content, digest in entries:
+                # a scan of a large repository stops at the deadline or the cancellation of its run
+                check_deadline("the repository scan")
+                manifest.write(json.dumps({"path": rel_path, "content": content, "hash": digest}) + "\n")
+                count += 1
+        os.replace(tmp_manifest, manifest_path)
+        return count
+    finally:
+        if os.path.exists(tmp_manifest):
+            os.remove(tmp_manifest)
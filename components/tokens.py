@@ -0,0 +1,53 @@
+"""Local token counting, shared by the scanner, the memory and the model wrappers"""
+
+import importlib.util
+import os
+from functools import lru_cache
+
+# average characters per token, used when no tokenizer is available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=1)
+def get_encoding():
+    """
+    The o200k tokenizer (the gpt-oss family) or None if it cannot be loaded.
+    LiteLLM ships the encoding files, so they are used instead of downloading them when possible.
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+
+    if "TIKTOKEN_CACHE_DIR" not in os.environ:
+        spec = importlib.util.find_spec("litellm")
+        if spec and spec.submodule_search_locations:
+            bundled = os.path.join(spec.submodule_search_locations[0], "litellm_core_utils", "tokenizers")
+            if os.path.isdir(bundled):
+                os.environ["TIKTOKEN_CACHE_DIR"] = bundled
+
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text"""
+    if not text:
+        return 0
+    encoding = get_encoding()
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """The first `max_tokens` tokens of text"""
+    if max_tokens <= 0:
+        return ""
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    tokens = encoding.encode(text, disallowed_special=())
+    return text if len(tokens) <= max_tokens else encoding.decode(tokens[:max_tokens])
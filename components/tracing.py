@@ -0,0 +1,153 @@
+"""Structured spans of the agent loop, exported as OTLP-shaped JSON lines"""
+
+import contextvars
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from config import TRACING_ENABLED, TRACE_PATH, TRACE_MAX_MB
+
+
+SERVICE_NAME = "readme_agent"
+
+# the span of the current thread / task. Worker threads inherit it through `bind_thread_context`
+# and asyncio tasks through their copied context, which links nested spans to their parent.
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _otlp_value(value: Any) -> Dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": value if isinstance(value, str) else json.dumps(value, default=str)}
+
+
+class Span:
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_span_id = parent.span_id if parent else ""
+        self.attributes = dict(attributes)
+        self.events: List[Dict] = []
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error: Optional[str] = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, message: str):
+        """Mark the span as failed without an exception (e.g. a tool that returned an error)"""
+        self.error = message
+
+    def record_exception(self, exc: BaseException):
+        self.error = f"{type(exc).__name__}: {exc}"
+        self.events.append({
+            "timeUnixNano": str(time.time_ns()),
+            "name": "exception",
+            "attributes": [
+                {"key": "exception.type", "value": _otlp_value(type(exc).__name__)},
+                {"key": "exception.message", "value": _otlp_value(str(exc))}
+            ]
+        })
+
+    def to_otlp(self) -> Dict:
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_span_id,
+            "name": self.name,
+            "kind": "SPAN_KIND_INTERNAL",
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in self.attributes.items() if v is not None],
+            "events": self.events,
+            "status": {"code": "STATUS_CODE_ERROR", "message": self.error} if self.error else {"code": "STATUS_CODE_OK"}
+        }
+
+
+class JsonlExporter:
+    """
+    Append every finished span to a file, one OTLP/JSON `ExportTraceServiceRequest` per line
+    (the format of the OpenTelemetry collector file exporter), so the file can be replayed into any OTLP backend.
+    The file is kept open. Once it exceeds `max_bytes` it is renamed to `<path>.1` (replacing the previous one)
+    and a new file is started, so at most about twice `max_bytes` are kept on disk.
+    """
+    def __init__(self, path: str, max_bytes: int | None = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+    def _open(self):
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def export(self, span: Span):
+        line = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{"scope": {"name": "components.tracing"}, "spans": [span.to_otlp()]}]
+            }]
+        })
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(line + "\n")
+            self._file.flush()
+            if self.max_bytes is not None and self._file.tell() >= self.max_bytes:
+                self._file.close()
+                os.replace(self.path, self.path + ".1")
+                self._open()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+exporter: Optional[JsonlExporter] = JsonlExporter(TRACE_PATH, int(TRACE_MAX_MB * 1024 * 1024)) if TRACING_ENABLED else None
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Time the enclosed block as a child of the current span. Exceptions are recorded on the span and re-raised.
+    Yields the span so attributes can be added once they are known.
+    """
+    if exporter is None:
+        # nothing is recorded, but callers can still set attributes
+        yield Span(name, None, attributes)
+        return
+
+    parent = _current_span.get()
+    current = Span(name, parent, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        # a generator closed early is not an error of the span
+        if not isinstance(e, GeneratorExit):
+            current.record_exception(e)
+        raise
+    finally:
+        current.end_ns = time.time_ns()
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # a generator resumed in another context: restore the parent there instead
+            _current_span.set(parent)
+        exporter.export(current)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
@@ -1,3 +1,89 @@
+import os
+import tempfile
+
+# * Models
+# LLM backends in order of preference (LiteLLM model names). Calls fail over to the next one,
+# e.g. ["cerebras/gpt-oss-120b", "groq/openai/gpt-oss-120b"] with GROQ_API_KEY set in .env
+MODEL_BACKENDS = ["cerebras/gpt-oss-120b"]
+ROUTER_HEDGE = True           # also send a slow call to the next backend once it exceeds the p95 latency
+ROUTER_HEDGE_MIN_SAMPLES = 10 # calls of a backend needed before its p95 is trusted for hedging
+ROUTER_MAX_ERROR_RATE = 0.5   # backends above this rolling error rate are tried last
+ROUTER_HEALTH_MIN_SAMPLES = 5 # recent calls of a backend needed before its error rate can demote it
+ROUTER_PROBE_SECONDS = 30     # a demoted backend is tried first again by one call this often; a success restores it
+ROUTER_STATS_MAX_AGE = 300    # seconds after which a call no longer counts in the latency and error rate
+
+# * LLM rate limits (per model, shared by every session of the process)
+# Calls over a budget wait in a FIFO queue instead of failing with a provider 429. None disables a limit.
+LLM_RATE_LIMITS = {
+    "cerebras/gpt-oss-120b": {"rpm": 30, "tpm": 60000, "max_in_flight": 8},
+    "cerebras/llama3.1-8b": {"rpm": 30, "tpm": 60000, "max_in_flight": 8},
+}
+LLM_DEFAULT_RATE_LIMIT = {"rpm": 30, "tpm": 60000, "max_in_flight": 8}   # models missing above
+LLM_OUTPUT_TOKENS_ESTIMATE = 1024   # output tokens reserved per call, settled with the real usage afterwards
+
+# * Retries, circuit breakers and deadlines (LLM calls and network tools)
+RETRY_ATTEMPTS = 4            # calls of one request, the first included; only transient errors are retried
+RETRY_BASE_DELAY = 0.5        # seconds; the backoff doubles after every attempt, with full jitter
+RETRY_MAX_DELAY = 8           # seconds; upper bound of one backoff
+BREAKER_FAILURE_THRESHOLD = 5 # consecutive calls that failed after all their retries, opening the breaker of an endpoint
+BREAKER_RESET_SECONDS = 30    # an open breaker fails fast for this long, then lets one trial call through
+LLM_REQUEST_TIMEOUT = 600     # seconds per LLM request, shortened to what is left of the run deadline
+AGENT_RUN_DEADLINE = 1800     # seconds one top-level Agent.run may take, sub-agents included (None: no deadline)
+
 # * Configuration
 MAX_HISTORY = 30
-DEBUG = True                  # Either True or False
\ No newline at end of file
+MEMORY_MAX_TOKENS = 64000     # token budget of the memory window sent to the LLM
+MEMORY_MAX_ITEMS = 1000       # messages kept in memory; the oldest are dropped first
+DEBUG = True                  # Either True or False
+
+# * Memory compaction
+COMPACTION_MODEL = "cerebras/llama3.1-8b"   # cheap model that summarizes the oldest messages
+MEMORY_COMPACT_TOKENS = 48000               # stored messages above this are compacted in the background
+MEMORY_KEEP_TOKENS = 16000                  # the newest messages are never compacted
+COMPACTION_INPUT_TOKENS = 6000              # transcript sent to the compaction model
+
+# * Repository scan cache
+SCAN_CACHE_DIR = os.path.join(tempfile.gettempdir(), "readme_agent_scan_cache")
+SCAN_CACHE_MAX_MB = 200       # total size of cached scan reports before LRU eviction
+SCAN_MIRROR_DIR = os.path.join(tempfile.gettempdir(), "readme_agent_mirrors")
+SCAN_GIT_TIMEOUT = 300        # seconds one git command (e.g. the fetch of a large repo) may run before it is killed
+
+# * Repository scanner
+SCAN_MAX_WORKERS = 8          # threads reading files concurrently
+SCAN_MAX_REPORT_MB = 4        # hard cap on the size of one scan report
+SCAN_MAX_FILE_KB = 512        # files larger than this are skipped without being opened
+SCAN_TOKEN_BUDGET = 30000     # tokens of file content packed into one scan report
+
+# * Map-reduce README generation (large repositories)
+MAP_REDUCE_CONCURRENCY = 8        # parts summarized in parallel
+MAP_REDUCE_CHUNK_TOKENS = 12000   # tokens of files per summarized part
+MAP_REDUCE_REDUCE_TOKENS = 24000  # summaries are merged until they fit in this many tokens
+
+# * Blob store for large tool results
+BLOB_STORE_DIR = os.path.join(tempfile.gettempdir(), "readme_agent_blobs")
+BLOB_STORE_MAX_MB = 500       # total size of stored blobs before LRU eviction
+BLOB_THRESHOLD_KB = 24        # tool results larger than this are kept in memory as a preview + handle
+                              # (a full scan report, about 140 KB of JSON, is spilled and paged through)
+BLOB_PREVIEW_CHARS = 2000     # characters of a blob kept in memory
+BLOB_PAGE_KB = 16             # maximum size of one page returned by the 'read_blob' tool
+
+# * Global memory event log
+EVENT_LOG_PATH = os.path.join(tempfile.gettempdir(), "readme_agent_events.sqlite3")
+
+# * Tracing (opt-in)
+TRACING_ENABLED = False       # write spans of every agent iteration, LLM call and tool call (tool arguments included)
+TRACE_PATH = os.path.join(tempfile.gettempdir(), "readme_agent_traces.jsonl")
+TRACE_MAX_MB = 50             # the trace file is rotated to TRACE_PATH.1 beyond this size
+
+# * Background jobs (agent runs of the Streamlit app)
+JOB_MAX_WORKERS = 4           # agent runs executed at the same time
+JOB_MAX_QUEUED = 16           # runs waiting for a worker; new runs are refused beyond this
+JOB_RETENTION_SECONDS = 3600  # finished runs are kept this long so their events can still be read
+JOB_POLL_SECONDS = 0.5        # the UI refreshes a running job this often
+JOB_MAX_EVENTS = 1000         # events kept per job (streamed tokens are merged, not counted one by one)
+
+# * LLM response cache (opt-in)
+LLM_CACHE_ENABLED = False     # reuse the response of an identical prompt instead of calling the provider again
+LLM_CACHE_DIR = os.path.join(tempfile.gettempdir(), "readme_agent_llm_cache")
+LLM_CACHE_MAX_MB = 100        # total size of cached responses before LRU eviction
+LLM_CACHE_TTL_HOURS = 24      # cached responses older than this are ignored
@@ -1,12 +1,16 @@
+# Time the imports with 'python main.py --import-times'
+from components.import_timer import from_argv
+import_timer = from_argv()
+
 # Import manager agent from agents folder
 from agents.manager import manager_agent
 
-# TODO Import sub-agents from agents folder
-from agents.writer_agent import writer_agent
+# Sub-agents are registered by import path and only imported when they are first called
 
 # Import necessary components
-from components.game import ActionContext, Goal, Action, ActionRegistry, Memory
+from components.game import ActionContext, Goal, Action, ActionRegistry, Memory, Session
 from components.frame import AgentRegistry, Agent
+from components.model import summarize_messages
 
 # Configuration
 # variables with all capital letters are constants in the config file 
@@ -16,7 +20,7 @@ from config import *
 
 # TODO 1. Construct Agent Registry and register all sub-agents
 registry = AgentRegistry()
-# registry.register_agent("agent_template", file_management_agent.run)
+# registry.register_agent("file_management_agent", "agents.agent_template:file_management_agent")
 
 
 # 2. Construct ActionContext instance
@@ -35,9 +39,14 @@ action_context = ActionContext(agent_registry = registry,
 # - Also remember to modify the UI_OPTION variable in config.py accordingly
 
 def main():
+    if import_timer is not None:
+        print(import_timer.report("startup"))
 
-    shared_memory = Memory(max_history = MAX_HISTORY) 
+    session = Session(memory = Memory(max_history = MAX_HISTORY, max_tokens = MEMORY_MAX_TOKENS, max_items = MEMORY_MAX_ITEMS,
+                                      summarizer = summarize_messages, compact_tokens = MEMORY_COMPACT_TOKENS, keep_tokens = MEMORY_KEEP_TOKENS))
+    shared_memory = session.memory
 
+    printed_compactions = 0
     while True:
         user_query = input("User: ")
         if user_query.lower() in ["exit", "quit"]:
@@ -46,7 +55,7 @@ def main():
         # use the global shared memory and update it every iteration
         shared_memory = manager_agent.run(user_query, 
                                   memory = shared_memory, 
-                                  action_context = action_context, 
+                                  action_context = action_context.for_session(session), 
                                   debug = DEBUG,
                                   ui_option = action_context.ui_option)
         
@@ -55,6 +64,12 @@ def main():
         # -2: assistant
         last_msg = shared_memory.get_memories()[-2] 
         print(f"Agent: {last_msg['content']}")
+        for compaction in shared_memory.compactions[printed_compactions:]:
+            print(f"[memory] compaction: {compaction}")
+        printed_compactions = len(shared_memory.compactions)
+        if import_timer is not None:
+            # agents and litellm are imported by the first turn that uses them
+            print(import_timer.report("turn"))
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,17 +1,22 @@
+# Time the imports of every run with 'streamlit run main_st.py -- --import-times'
+import sys, time
+from components.import_timer import from_argv
+import_timer = from_argv()
+script_started = time.perf_counter()
+
 # Import manager agent from agents folder
 from agents.manager import manager_agent
 
-# TODO Import sub-agents from agents folder
-from agents.writer_agent import writer_agent
-from agents.web_search_agent import web_search_agent
-from agents.db_manager_agent import google_sheet_agent
+# Sub-agents are registered by import path below and only imported when they are first called
 
 # Import necessary components
-from components.game import ActionContext, Goal, Action, ActionRegistry, Memory
+from components.game import ActionContext, Goal, Action, ActionRegistry, Memory, Session
 from components.frame import AgentRegistry, Agent
+from components.model import summarize_messages
+from components.jobs import job_runner, JobRejected
 
 # Import utilities
-from utils_st import stream_data, render_sidebar, handle_running_session, set_session_running
+from utils_st import add_global_memory, render_sidebar, get_session_id, session_id_var
 
 
 # Configuration
@@ -19,7 +24,8 @@ from utils_st import stream_data, render_sidebar, handle_running_session, set_se
 from config import *
 
 import streamlit as st
-import time, json
+import json
+from collections import deque
 from dotenv import dotenv_values
 
 
@@ -36,27 +42,34 @@ st.set_page_config(page_title = "README Writer Agent",
 
 
 
-if "global_memory" not in st.session_state:
-    st.session_state["global_memory"] = []
 if "running" not in st.session_state:
     st.session_state['running'] = False
 
-# TODO 1. Construct Agent Registry and register all sub-agents
-registry = AgentRegistry()
-# registry.register_agent(writer_agent.name, writer_agent.run)
-registry.register_agent(web_search_agent.name, web_search_agent)
-# registry.register_agent(google_sheet_agent.name, google_sheet_agent)
-
-# 2. Construct ActionContext instance
-# Note: This is where the Registry is actually passed in
-action_context = ActionContext(agent_registry = registry, 
-                               debug = DEBUG,
-                               ui_option = "streamlit",
-                               properties = {
-                                   "GOOGLE_SEARCH_API_KEY": st.secrets["GOOGLE_SEARCH_API_KEY"],
-                                   "GOOGLE_SEARCH_ENGINE_ID": st.secrets["GOOGLE_SEARCH_ENGINE_ID"],
-                                   "GS_CREDENTIALS": json.loads(st.secrets["GS_CREDENTIALS"])
-                               })
+# 1. Construct the Agent Registry and the ActionContext once per server process.
+# Streamlit re-executes this script on every interaction; cached resources are shared by every rerun and every user,
+# so they must not hold per-user state (that lives in the session object below).
+@st.cache_resource
+def get_runtime():
+    # TODO register all sub-agents
+    registry = AgentRegistry()
+    # registry.register_agent("writer_agent", "agents.writer_agent:writer_agent")
+    registry.register_agent("web_search_agent", "agents.web_search_agent:web_search_agent")
+    # registry.register_agent("google_sheet_agent", "agents.db_manager_agent:google_sheet_agent")
+    manager_agent.bind_agent_registry(registry)
+
+    # 2. Construct ActionContext instance
+    # Note: This is where the Registry is actually passed in
+    action_context = ActionContext(agent_registry = registry, 
+                                   debug = DEBUG,
+                                   ui_option = "streamlit",
+                                   properties = {
+                                       "GOOGLE_SEARCH_API_KEY": st.secrets["GOOGLE_SEARCH_API_KEY"],
+                                       "GOOGLE_SEARCH_ENGINE_ID": st.secrets["GOOGLE_SEARCH_ENGINE_ID"],
+                                       "GS_CREDENTIALS": json.loads(st.secrets["GS_CREDENTIALS"])
+                                   })
+    return registry, action_context
+
+registry, action_context = get_runtime()
 
 
 # 3. Main function for chat session
@@ -64,26 +77,72 @@ def main():
 
     st.title("README Writer Agent")
 
-    render_sidebar(registry)
+    # 1. Initialization of the session: its shared memory and its README
+    if "session" not in st.session_state:
+        st.session_state.session = Session(
+            memory = Memory(max_history=MAX_HISTORY, max_tokens=MEMORY_MAX_TOKENS, max_items=MEMORY_MAX_ITEMS,
+                            summarizer=summarize_messages, compact_tokens=MEMORY_COMPACT_TOKENS, keep_tokens=MEMORY_KEEP_TOKENS),
+            session_id = get_session_id()
+        )
+    session = st.session_state.session
 
-        
-
-    # 1. Initialization session state for shared memory
-    if "shared_memory" not in st.session_state:
-        st.session_state.shared_memory = Memory(max_history=MAX_HISTORY)
+    render_sidebar(registry, session)
     
     
     # 2. Introduction message 
-    if st.session_state.shared_memory.get_memories() == []:
+    if session.memory.get_memories() == []:
         intro_message = "Hello! Paste a **remote github repository url** to analyze. Please make sure that the repository is **public accessible.**"
         with st.chat_message("assistant"):
             st.success(intro_message)
 
-    # 3. History messages display: st.chat_message
-    for msg in st.session_state.shared_memory.get_memories():
+    # 3. User input: the agent runs as a background job, so it survives reruns and does not hold the script
+    job = job_runner.get(session.job_id)
+    st.session_state['running'] = job is not None and job.active
+    if user_query := st.chat_input("Assign a job...", disabled = st.session_state['running']):
+        try:
+            job = job_runner.submit(lambda: run_manager(session, user_query), session_id = session.session_id, description = user_query)
+            session.job_id = job.job_id
+            st.session_state['running'] = True
+        except JobRejected as e:
+            st.error(str(e))
+
+    # 4. History messages and the running job, polled while the job is active
+    st.fragment(run_every = JOB_POLL_SECONDS if st.session_state['running'] else None)(render_chat)(session)
+
+
+def run_manager(session: Session, user_query: str):
+    """The events of one manager run (the body of a background job)"""
+    # the job runs outside the script thread: tell the global memory log which session it belongs to
+    session_id_var.set(session.session_id)
+    readme = session.readme
+    yield from manager_agent.run_events(
+        user_query, 
+        memory=session.memory, 
+        action_context=action_context.for_session(session), 
+        debug=DEBUG,
+        ui_option=action_context.ui_option
+    )
+    # a README saved during the run is also kept in the conversation
+    if session.readme is not None and session.readme != readme:
+        session.memory.add_memory({
+            "role": "assistant", "content": session.readme
+        })
+        add_global_memory(manager_agent.name, {
+            "role": "assistant", "content": session.readme, "time": f"{time.time()}"
+        })
+
+
+def render_chat(session: Session):
+    # History messages display: st.chat_message
+    for msg in session.memory.get_memories():
         if msg["role"] == "user":
             if isinstance(msg["content"], str) and '"tool_executed":' in msg['content']:
                 continue
+            if isinstance(msg["content"], str) and msg["content"].startswith(Memory.SUMMARY_PREFIX):
+                # a compaction summary written by the model, not by the user
+                with st.expander("Summary of the earlier conversation"):
+                    st.markdown(msg["content"].removeprefix(Memory.SUMMARY_PREFIX))
+                continue
             with st.chat_message("user"):
                 st.markdown(msg["content"])
         elif msg["role"] == "assistant":
@@ -91,51 +150,43 @@ def main():
                 with st.chat_message("assistant"):
                     st.markdown(msg["content"])
 
-    # 4. User input
-    if user_query := st.chat_input("Assign a job...", on_submit = set_session_running):
-        
-        with st.chat_message("user"):
-            st.markdown(user_query)
-
-        # 4. Call the agent. Update the shared_memory whenever there's a new response
-        with st.chat_message("assistant"):
-
-            @handle_running_session
-            def agent_running():
-                with st.spinner("Agent Thinking..."):
-                    context_manager = st.expander("Expand to see the thinking process") if DEBUG else st.container()
-                    with context_manager:
-                        # Update shared memory
-                        st.session_state.shared_memory = manager_agent.run(
-                            user_query, 
-                            memory=st.session_state.shared_memory, 
-                            action_context=action_context, 
-                            debug=DEBUG,
-                            ui_option=action_context.ui_option
-                        )
-                    
-                    
-                # Get last assistant message
-                last_msg = "Error. Failed to get response."
-                for item in reversed(st.session_state.shared_memory.get_memories()):
-                    if (item.get("role") == "assistant") and (item.get("content")):
-                        last_msg = item.get("content")
-                        break
-                st.write_stream(stream_data(last_msg))
-                if "README" in st.session_state:
-                    st.markdown(st.session_state['README'])
-                    st.session_state.shared_memory.add_memory({
-                        "role": "assistant", "content": st.session_state['README']
-                    })
-                    st.session_state.global_memory.append({
-                        "agent_session": manager_agent.name,
-                        "role": "assistant", "content": st.session_state['README']
-                    })
-
-            agent_running()
-            st.rerun()
+    job = job_runner.get(session.job_id)
+    if job is None:
+        return
+    if not job.active:
+        if job.status == "failed":
+            st.error(f"The last run failed: {job.error}")
+        if st.session_state['running']:
+            # the job just finished: rerun the whole app to refresh the sidebar and enable the input
+            st.rerun(scope = "app")
+        return
+
+    # Render the progress and the tokens of the manager streamed since its last complete message.
+    # The cursor is kept between polls, so each poll only reads the events that are new since the previous one
+    view = st.session_state.get("job_view")
+    if view is None or view["job_id"] != job.job_id:
+        view = st.session_state["job_view"] = {"job_id": job.job_id, "cursor": 0, "progress": deque(maxlen = JOB_MAX_EVENTS)}
+    events, view["cursor"] = job.events(view["cursor"])
+    view["progress"].extend(event["message"] for event in events if event["type"] == "progress")
+    with st.chat_message("assistant"):
+        if DEBUG:
+            with st.expander("Expand to see the thinking process"):
+                for message in view["progress"]:
+                    st.write(message)
+        live = job.live_text(manager_agent.name)
+        if live:
+            st.markdown(live)
+        else:
+            st.caption(f"Agent thinking... ({'waiting for a worker' if job.status == 'queued' else 'running'})")
+        if st.button("Cancel", icon = ":material/stop_circle:", key = f"cancel_{job.job_id}"):
+            job.cancel()
 
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    try:
+        main()
+    finally:
+        # also runs when st.rerun() stops the script
+        if import_timer is not None:
+            print(import_timer.report(f"run: {(time.perf_counter() - script_started) * 1000:.0f} ms script"), file = sys.stderr)
\ No newline at end of file
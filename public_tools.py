@@ -47,11 +47,13 @@ def web_search_tool(action_context, url, *args, **kwargs):
     """
     Scrape webpage source HTML 
     """
-    import requests
+    from urllib.parse import urlparse
     from bs4 import BeautifulSoup
+    from components.resilience import http_get
 
     try:
-        response = requests.get(url, timeout=10)
+        # one circuit breaker per host: a site that is down does not slow down the others
+        response = http_get(f"web:{urlparse(url).netloc}", url, timeout=10)
         soup = BeautifulSoup(response.text, "html.parser")
         
         for junk in soup(["script", "style", "nav", "footer", "header"]):
@@ -0,0 +1,53 @@
+import json
+
+from batch import append_checkpoint, load_checkpoint, pending_urls, read_urls, readme_path
+
+
+def test_read_urls_drops_comments_blank_lines_and_duplicates(tmp_path):
+    path = tmp_path / "repos.txt"
+    path.write_text(
+        "# repositories to document\n"
+        "https://github.com/owner/one\n"
+        "\n"
+        "https://github.com/owner/two   # the second one\n"
+        "   https://github.com/owner/one  \n"
+        "https://github.com/owner/three\n"
+    )
+    assert read_urls(str(path)) == [
+        "https://github.com/owner/one",
+        "https://github.com/owner/two",
+        "https://github.com/owner/three"
+    ]
+
+
+def test_readme_path_is_a_flat_file_name_per_repository():
+    assert readme_path("out", "https://github.com/owner/repo") == "out/github.com_owner_repo.md"
+    assert readme_path("out", "https://github.com/owner/repo.git") == "out/github.com_owner_repo.md"
+    assert readme_path("out", "https://gitlab.com/group/sub group/repo/") == "out/gitlab.com_group_sub_group_repo.md"
+    assert readme_path("out", "file:///tmp/fixture") == "out/tmp_fixture.md"
+
+
+def test_load_checkpoint_ignores_a_line_cut_by_a_crash(tmp_path):
+    path = str(tmp_path / "checkpoint.jsonl")
+    append_checkpoint(path, {"url": "a", "status": "failed", "error": "boom"})
+    append_checkpoint(path, {"url": "a", "status": "done", "path": "a.md"})
+    append_checkpoint(path, {"url": "b", "status": "done", "path": "b.md"})
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"url": "c", "status": "done", "path": "c.md"})[:20])
+
+    assert load_checkpoint(path) == {
+        "a": {"url": "a", "status": "done", "path": "a.md"},
+        "b": {"url": "b", "status": "done", "path": "b.md"}
+    }
+    assert load_checkpoint(str(tmp_path / "missing.jsonl")) == {}
+
+
+def test_resume_skips_done_repositories_and_retries_the_others(tmp_path):
+    written = tmp_path / "done.md"
+    written.write_text("# README")
+    previous = {
+        "done": {"url": "done", "status": "done", "path": str(written)},
+        "deleted": {"url": "deleted", "status": "done", "path": str(tmp_path / "deleted.md")},
+        "failed": {"url": "failed", "status": "failed", "error": "boom"}
+    }
+    assert pending_urls(["done", "deleted", "failed", "new"], previous) == ["deleted", "failed", "new"]
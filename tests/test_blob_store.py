@@ -0,0 +1,70 @@
+import json
+
+import pytest
+
+from components.blob_store import BlobStore
+from components.frame import Agent
+from components.game import ActionRegistry, AgentFunctionCallingActionLanguage, Environment
+from config import BLOB_THRESHOLD_KB
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path), page_bytes=4 * 1024)
+
+
+@pytest.fixture
+def agent(store):
+    return Agent("test", [], AgentFunctionCallingActionLanguage(), ActionRegistry(),
+                 lambda prompt: None, Environment(), blob_store=store)
+
+
+def scan_report(size_kb):
+    """A report shaped like the one of the scanner: one block per file"""
+    lines, size, i = [], 0, 0
+    while size < size_kb * 1024:
+        line = f"--- src/module_{i}.py ---\n" + "def f():\n    return 1\n" * 20
+        lines.append(line)
+        size += len(line)
+        i += 1
+    return "\n".join(lines)
+
+
+def test_a_small_result_stays_in_memory(agent):
+    result = {"tool_executed": True, "result": "short"}
+    assert json.loads(agent.tool_result_content({"tool": "scan_repository"}, result)) == result
+
+
+def test_a_scan_report_is_spilled_and_paged_back(agent, store):
+    report = scan_report(BLOB_THRESHOLD_KB * 2)
+    content = agent.tool_result_content({"tool": "scan_repository"}, {"tool_executed": True, "result": report})
+
+    assert len(content.encode("utf-8")) < BLOB_THRESHOLD_KB * 1024
+    stored = json.loads(content)
+    assert stored["tool_executed"] is True
+    description = stored["result"]
+    assert description["preview"] == report[:store.preview_chars]
+    assert description["lines"] == report.count("\n") + 1
+
+    # reading page after page gives back the whole report, each page within the page size
+    pages, start = [], 0
+    while True:
+        page = store.read(description["blob"], start=start)
+        assert len(page["content"].encode("utf-8")) <= store.page_bytes
+        pages.append(page["content"])
+        if page["end"] >= page["total"]:
+            break
+        start = page["end"]
+    assert len(pages) > 1
+    assert "\n".join(pages) == report
+
+
+def test_read_blob_results_are_never_spilled_again(agent, store):
+    page = {"tool_executed": True, "result": {"content": "x" * (BLOB_THRESHOLD_KB * 1024 + 1)}}
+    assert json.loads(agent.tool_result_content({"tool": "read_blob"}, page)) == page
+
+
+def test_pages_by_bytes_stop_at_the_page_size(store):
+    handle = store.put("y" * (store.page_bytes * 3))
+    page = store.read(handle, start=10, unit="bytes")
+    assert (page["start"], page["end"], page["total"]) == (10, 10 + store.page_bytes, store.page_bytes * 3)
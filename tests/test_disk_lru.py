@@ -0,0 +1,51 @@
+import os
+import time
+
+from components.blob_store import BlobStore
+from components.disk_lru import LruDirectory
+from components.llm_cache import ResponseCache
+from components.scan_cache import ScanCache
+
+
+def test_evicts_the_least_recently_used_files_first(tmp_path):
+    files = LruDirectory(str(tmp_path), max_bytes=250, suffixes=(".txt",))
+    for i, name in enumerate(["a.txt", "b.txt"]):
+        path = os.path.join(files.root, name)
+        with open(path, "wb") as f:
+            f.write(b"x" * 100)
+        os.utime(path, (time.time() - 100 + i, time.time() - 100 + i))
+
+    files.touch(os.path.join(files.root, "a.txt"))
+    files.write(os.path.join(files.root, "c.txt"), b"x" * 100)
+
+    assert sorted(files.names()) == ["a.txt", "c.txt"]
+    assert files.evictions == 1
+    assert files.usage() == {"evictions": 1, "entries": 2, "bytes": 200, "max_bytes": 250}
+
+
+def test_other_suffixes_are_neither_counted_nor_evicted(tmp_path):
+    (tmp_path / "keep.lock").write_bytes(b"x" * 1000)
+    files = LruDirectory(str(tmp_path), max_bytes=50, suffixes=(".json",))
+    files.write(os.path.join(files.root, "entry.json"), b"x" * 10)
+
+    assert files.evict() == 0
+    assert (tmp_path / "keep.lock").exists()
+    assert files.usage()["bytes"] == 10
+
+
+def test_every_store_reports_its_evictions(tmp_path):
+    blobs = BlobStore(str(tmp_path / "blobs"), max_bytes=150)
+    blobs.put("a" * 100)
+    blobs.put("b" * 100)
+
+    responses = ResponseCache(str(tmp_path / "llm"), max_bytes=250)
+    responses.put("one", {"content": "a" * 100})
+    responses.put("two", {"content": "b" * 100})
+
+    scans = ScanCache(str(tmp_path / "scans"), max_bytes=400)
+    scans.put("https://example.com/repo", "1" * 40, "a" * 100)
+    scans.put("https://example.com/repo", "2" * 40, "b" * 100)
+
+    for store in (blobs, responses, scans):
+        assert store.evictions == 1
+        assert store.stats()["entries"] == 1
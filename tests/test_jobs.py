@@ -0,0 +1,134 @@
+import threading
+import time
+
+import pytest
+
+from components.jobs import Job, JobRejected, JobRunner
+from components.resilience import RetryPolicy, call, check_deadline
+
+
+def token(delta, agent="manager"):
+    return {"type": "token", "agent": agent, "delta": delta}
+
+
+def test_tokens_are_merged_into_the_live_text():
+    job = Job(lambda: iter(()))
+    for delta in "Hello":
+        job.emit(token(delta))
+    job.emit({"type": "tool_call_delta", "agent": "manager", "delta": {}})
+
+    assert job.live_text("manager") == "Hello"
+    assert job.events() == ([], 0)
+
+    job.emit({"type": "message", "agent": "manager", "message": "Hello"})
+    assert job.live_text("manager") == ""
+    events, cursor = job.events()
+    assert [event["type"] for event in events] == ["message"] and cursor == 1
+
+
+def test_a_cursor_only_reads_new_events():
+    job = Job(lambda: iter(()))
+    job.emit({"type": "progress", "message": "one"})
+    events, cursor = job.events()
+    job.emit({"type": "progress", "message": "two"})
+
+    events, cursor = job.events(cursor)
+    assert [event["message"] for event in events] == ["two"] and cursor == 2
+    assert job.events(cursor) == ([], 2)
+
+
+def test_only_the_last_events_are_kept():
+    job = Job(lambda: iter(()), max_events=3)
+    for i in range(5):
+        job.emit({"type": "progress", "message": str(i)})
+
+    events, cursor = job.events()
+    assert [event["message"] for event in events] == ["2", "3", "4"] and cursor == 5
+    events, _ = job.events(4)
+    assert [event["message"] for event in events] == ["4"]
+
+
+def test_finished_job_ends_its_events():
+    job = Job(lambda: iter([token("a"), {"type": "done", "agent": "manager"}]))
+    job._execute()
+
+    events, _ = job.wait_events(0, timeout=1)
+    assert [event["type"] for event in events] == ["done", "job_end"]
+    assert job.status == "done" and job.live_text("manager") == ""
+
+
+def blocking_run(started, release):
+    """A job that signals it started, then waits for `release` (a long tool call that never yields an event)"""
+    def run():
+        started.set()
+        release.wait(5)
+        yield {"type": "done", "agent": "manager"}
+    return run
+
+
+def test_submit_rejects_jobs_beyond_the_workers_and_the_queue():
+    runner = JobRunner(max_workers=1, max_queued=1)
+    started, release = threading.Event(), threading.Event()
+    try:
+        running = runner.submit(blocking_run(started, release))
+        assert started.wait(5)
+        queued = runner.submit(blocking_run(threading.Event(), release))
+
+        with pytest.raises(JobRejected):
+            runner.submit(blocking_run(threading.Event(), release))
+        assert runner.rejected == 1
+        assert (running.status, queued.status) == ("running", "queued")
+    finally:
+        release.set()
+
+
+def test_a_cancelled_queued_job_never_starts():
+    runner = JobRunner(max_workers=1, max_queued=1)
+    started, release = threading.Event(), threading.Event()
+    queued_started = threading.Event()
+    try:
+        runner.submit(blocking_run(started, release))
+        assert started.wait(5)
+        queued = runner.submit(blocking_run(queued_started, release))
+
+        assert runner.cancel(queued.job_id)
+        release.set()
+        queued.wait_events(0, timeout=5)
+        assert queued.status == "cancelled" and not queued_started.is_set()
+        assert not runner.cancel(queued.job_id)
+    finally:
+        release.set()
+
+
+def test_cancel_stops_a_job_inside_a_long_tool_call():
+    def run():
+        # a scan or a sub-agent: it only checks the deadline / cancel flag, it yields no event
+        while True:
+            check_deadline("the tool call")
+            time.sleep(0.01)
+        yield
+
+    job = JobRunner(max_workers=1, max_queued=0).submit(run)
+    time.sleep(0.05)
+    assert job.status == "running"
+
+    job.cancel()
+    events, _ = job.wait_events(0, timeout=5)
+    assert job.status == "cancelled"
+    assert events[-1]["type"] == "job_end" and events[-1]["status"] == "cancelled"
+
+
+def test_cancel_cuts_the_retry_backoff_short():
+    def flaky():
+        raise TimeoutError("provider timeout")
+
+    def run():
+        call("test.cancel_backoff", flaky, policy=RetryPolicy(attempts=5, base_delay=30, max_delay=30))
+        yield
+
+    job = JobRunner(max_workers=1, max_queued=0).submit(run)
+    time.sleep(0.05)
+    started = time.monotonic()
+    job.cancel()
+    job.wait_events(0, timeout=5)
+    assert job.status == "cancelled" and time.monotonic() - started < 5
@@ -0,0 +1,51 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from components.map_reduce import MAP_PROMPT, MapReduceReadme
+from components.resilience import deadline, time_left
+
+
+@pytest.fixture
+def manifest(tmp_path):
+    path = tmp_path / "manifest.jsonl"
+    lines = [json.dumps({"version": 2})]
+    lines += [json.dumps({"path": f"pkg{i}/module.py", "content": "x = 1\n" * 50, "hash": str(i)}) for i in range(4)]
+    path.write_text("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_workers_inherit_the_run_deadline(manifest):
+    seen = []
+
+    def llm(prompt):
+        seen.append(time_left())
+        return SimpleNamespace(content="summary")
+
+    with deadline(100):
+        MapReduceReadme(llm, concurrency=2, chunk_tokens=200).run(manifest, "repo")
+
+    assert len(seen) == 5                          # 4 parts and the README
+    assert all(left is not None and left <= 100 for left in seen)
+
+
+def test_a_failed_part_does_not_abort_the_readme(manifest):
+    def llm(prompt):
+        system, user = prompt.messages[0]["content"], prompt.messages[1]["content"]
+        if system == MAP_PROMPT and "pkg1" in user:
+            raise RuntimeError("boom")
+        # the README is the summaries it was written from
+        return SimpleNamespace(content=user if system != MAP_PROMPT else "summary")
+
+    readme = MapReduceReadme(llm, concurrency=2, chunk_tokens=200).run(manifest, "repo")
+    assert "summary unavailable: RuntimeError: boom" in readme
+    assert "## pkg0" in readme and "## pkg3" in readme
+
+
+def test_fails_when_every_part_fails(manifest):
+    def llm(prompt):
+        raise RuntimeError("down")
+
+    with pytest.raises(RuntimeError, match="Every part"):
+        MapReduceReadme(llm, concurrency=2, chunk_tokens=200).run(manifest, "repo")
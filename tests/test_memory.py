@@ -0,0 +1,106 @@
+import json
+
+from components.game import Memory
+
+
+def tool_exchange(i, results=2, size=50):
+    """An assistant message with `results` tool calls, followed by their results"""
+    calls = [{"id": f"call_{i}_{j}", "type": "function", "function": {"name": "tool", "arguments": "{}"}}
+             for j in range(results)]
+    return [{"role": "assistant", "content": "", "tool_calls": calls}] + [
+        {"role": "tool", "tool_call_id": call["id"], "content": "result " * size} for call in calls
+    ]
+
+
+def assert_pairs_intact(messages):
+    """Every tool result follows the assistant message that called it, with no other message in between"""
+    open_calls = set()
+    for message in messages:
+        if message["role"] == "tool":
+            assert message["tool_call_id"] in open_calls, f"orphan tool result {message['tool_call_id']}"
+            open_calls.discard(message["tool_call_id"])
+            continue
+        assert not open_calls, f"tool calls without results: {open_calls}"
+        open_calls = {call["id"] for call in message.get("tool_calls") or []}
+    assert not open_calls, f"tool calls without results: {open_calls}"
+
+
+def filled_memory(exchanges=30, **kwargs):
+    memory = Memory(**kwargs)
+    memory.add_memory({"role": "user", "content": "write the README of the repository"})
+    for i in range(exchanges):
+        for message in tool_exchange(i, results=1 + i % 3):
+            memory.add_memory(message)
+        memory.add_memory({"role": "assistant", "content": f"step {i} done"})
+    return memory
+
+
+def test_token_budget_never_splits_a_tool_call_from_its_results():
+    memory = filled_memory(max_history=1000, max_tokens=10_000)
+    for budget in range(100, 3000, 37):
+        memory.max_tokens = budget
+        messages = memory.get_memories()
+        assert_pairs_intact(messages)
+
+
+def test_history_limit_never_splits_a_tool_call_from_its_results():
+    memory = filled_memory(max_history=1000, max_tokens=None)
+    for limit in range(2, 40):
+        messages = memory.get_memories(limit)
+        assert len(messages) <= limit
+        assert_pairs_intact(messages)
+
+
+def test_the_first_user_message_always_leads():
+    memory = filled_memory(max_history=1000, max_tokens=10_000)
+    for budget in (50, 300, 1000, 10_000):
+        memory.max_tokens = budget
+        messages = memory.get_memories()
+        assert messages[0] is memory.pinned
+        assert sum(message is memory.pinned for message in messages) == 1
+
+
+def test_the_first_user_message_survives_eviction_from_the_store():
+    memory = filled_memory(max_history=1000, max_tokens=10_000, max_items=20)
+    assert memory.pinned not in memory.items
+    messages = memory.get_memories()
+    assert messages[0] is memory.pinned
+    assert_pairs_intact(messages[1:])
+
+
+def test_window_stays_within_the_budget():
+    memory = filled_memory(max_history=1000, max_tokens=1500)
+    messages = memory.get_memories()
+    assert sum(Memory.count_tokens(message) for message in messages) <= 1500
+    # the newest messages are the ones kept
+    assert messages[-1]["content"] == "step 29 done"
+
+
+def test_an_oversized_last_exchange_is_truncated_not_dropped():
+    memory = Memory(max_history=1000, max_tokens=400)
+    memory.add_memory({"role": "user", "content": "task"})
+    for message in tool_exchange(0, results=2, size=2000):
+        memory.add_memory(message)
+
+    messages = memory.get_memories()
+    assert [message["role"] for message in messages] == ["user", "assistant", "tool", "tool"]
+    assert all(message["content"].endswith(Memory.TRUNCATED_NOTICE) for message in messages[2:])
+    # the stored results are left untouched
+    assert not memory.items[-1]["content"].endswith(Memory.TRUNCATED_NOTICE)
+    assert_pairs_intact(messages)
+
+
+def test_compaction_keeps_pairs_and_the_first_user_message():
+    memory = filled_memory(exchanges=0, max_history=1000, max_tokens=None,
+                           summarizer=lambda items: json.dumps(len(items)), compact_tokens=800, keep_tokens=300)
+    for i in range(20):
+        for message in tool_exchange(i):
+            memory.add_memory(message)
+        if memory._compacting is not None:
+            memory._compacting.join()
+
+    assert memory.compactions and "error" not in memory.compactions[0]
+    messages = memory.get_memories()
+    assert messages[0] is memory.pinned
+    assert messages[1]["role"] == "user" and messages[1]["content"].startswith(Memory.SUMMARY_PREFIX)
+    assert_pairs_intact(messages[2:])
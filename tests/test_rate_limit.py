@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from components.rate_limit import RateLimiter
+
+
+def wait_until(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for the condition"
+        time.sleep(0.001)
+
+
+def test_callers_are_admitted_in_arrival_order():
+    limiter = RateLimiter("test", max_in_flight=1)
+    admitted = []
+    holder = limiter.acquire()
+    holder.__enter__()
+
+    def worker(i):
+        with limiter.acquire():
+            admitted.append(i)
+
+    threads = []
+    for i in range(6):
+        thread = threading.Thread(target=worker, args=(i,))
+        thread.start()
+        threads.append(thread)
+        # start the next caller only once this one is queued, so the arrival order is known
+        wait_until(lambda: len(limiter._queue) == i + 1)
+
+    holder.__exit__(None, None, None)
+    for thread in threads:
+        thread.join(timeout=2)
+
+    assert admitted == list(range(6))
+    assert limiter.snapshot()["queued_now"] == 0
+
+
+def test_max_in_flight_caps_concurrent_calls():
+    limiter = RateLimiter("test", max_in_flight=2)
+    lock = threading.Lock()
+    running, peak = 0, 0
+
+    def worker():
+        nonlocal running, peak
+        with limiter.acquire():
+            with lock:
+                running += 1
+                peak = max(peak, running)
+            time.sleep(0.02)
+            with lock:
+                running -= 1
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert peak == 2
+    snapshot = limiter.snapshot()
+    assert (snapshot["calls"], snapshot["in_flight"]) == (8, 0)
+    assert snapshot["queued_calls"] >= 1
+
+
+def test_settle_charges_an_overdraft_to_the_next_callers():
+    limiter = RateLimiter("test", tpm=6000)          # 100 tokens per second
+    with limiter.acquire(tokens=1000) as permit:
+        assert limiter.tokens.level == pytest.approx(5000, abs=5)
+        permit.settle(7000)
+
+    # 6000 more tokens than reserved: the bucket is overdrawn by about 1000
+    assert limiter.tokens.level == pytest.approx(-1000, abs=5)
+    assert limiter.tokens.wait_time(100) == pytest.approx(11, abs=0.1)
+
+
+def test_settle_refunds_an_overestimate_up_to_the_capacity():
+    limiter = RateLimiter("test", tpm=6000)
+    with limiter.acquire(tokens=1000) as permit:
+        permit.settle(200)
+    assert limiter.tokens.level == pytest.approx(5800, abs=5)
+
+    with limiter.acquire(tokens=0) as permit:
+        permit.settle(-10000)
+    assert limiter.tokens.level == limiter.tokens.capacity
+
+
+def test_settle_without_usage_keeps_the_estimate():
+    limiter = RateLimiter("test", tpm=6000)
+    with limiter.acquire(tokens=1000) as permit:
+        permit.settle(None)
+    assert limiter.tokens.level == pytest.approx(5000, abs=5)
+
+
+def test_a_caller_that_gives_up_leaves_the_queue():
+    limiter = RateLimiter("test", max_in_flight=1)
+
+    async def main():
+        async with limiter.aacquire():
+            waiter = asyncio.ensure_future(limiter.aacquire().__aenter__())
+            await asyncio.sleep(0.02)
+            assert len(limiter._queue) == 1
+            waiter.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await waiter
+        assert len(limiter._queue) == 0
+        async with limiter.aacquire(poll=0.001):
+            assert limiter.in_flight == 1
+
+    asyncio.run(main())
+    assert limiter.in_flight == 0
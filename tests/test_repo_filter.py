@@ -0,0 +1,35 @@
+from components.repo_filter import RepoFilter
+from components.scanner import iter_repo_files
+
+
+def write(root, rel_path, text="x = 1\n"):
+    path = root / rel_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+
+
+def scanned(root):
+    return sorted(rel.replace("\\", "/") for rel, _ in iter_repo_files(str(root), RepoFilter(str(root))))
+
+
+def test_source_directories_named_like_outputs_are_kept(tmp_path):
+    for rel_path in ("build/builder.go", "dist/release.py", "vendor/lib.go", "third_party/patch.c", "src/main.py"):
+        write(tmp_path, rel_path)
+
+    assert scanned(tmp_path) == ["build/builder.go", "dist/release.py", "src/main.py", "third_party/patch.c", "vendor/lib.go"]
+
+
+def test_outputs_are_dropped_by_gitignore_and_gitattributes(tmp_path):
+    write(tmp_path, ".gitignore", "/build/\ndist/\n")
+    write(tmp_path, ".gitattributes", "vendor/** linguist-vendored\nthird_party/** linguist-generated\n")
+    for rel_path in ("build/out.js", "dist/bundle.py", "vendor/lib.go", "third_party/patch.c", "src/main.py"):
+        write(tmp_path, rel_path)
+
+    assert scanned(tmp_path) == [".gitattributes", ".gitignore", "src/main.py"]
+
+
+def test_tool_directories_are_always_dropped(tmp_path):
+    for rel_path in ("node_modules/pkg/index.js", "lib/site-packages/mod.py", "src/main.py"):
+        write(tmp_path, rel_path)
+
+    assert scanned(tmp_path) == ["src/main.py"]
@@ -0,0 +1,78 @@
+import subprocess
+
+import pytest
+
+from benchmarks.fixtures import make_repo, commit_change
+from components import repo_scan
+from components.git_mirror import GitMirror
+from components.scan_cache import ScanCache
+from components.scanner import iter_manifest
+
+
+@pytest.fixture
+def scanner(tmp_path, monkeypatch):
+    """Point the scanner at a fresh cache and mirror directory; return a function to start over with empty ones"""
+    def reset(name):
+        monkeypatch.setattr(repo_scan, "SCAN_MIRROR_DIR", str(tmp_path / name / "mirrors"))
+        monkeypatch.setattr(repo_scan, "scan_cache", ScanCache(str(tmp_path / name / "cache")))
+    reset("first")
+    return reset
+
+
+@pytest.fixture
+def exports(monkeypatch):
+    """The `paths` argument of every export: None for a full export"""
+    calls = []
+    export = GitMirror.export
+
+    def spy(self, commit_sha, dest, paths=None, *args, **kwargs):
+        calls.append(paths)
+        return export(self, commit_sha, dest, paths, *args, **kwargs)
+
+    monkeypatch.setattr(GitMirror, "export", spy)
+    return calls
+
+
+def test_an_incremental_rescan_matches_a_full_scan(tmp_path, scanner, exports):
+    url = make_repo(str(tmp_path), "small")
+    first_commit, _ = repo_scan.scan_repository(url)
+
+    commit_change(url, files_changed=3, files_deleted=2)
+    commit, manifest = repo_scan.scan_repository(url)
+    incremental = list(iter_manifest(manifest))
+
+    scanner("full")
+    full_commit, full_manifest = repo_scan.scan_repository(url)
+
+    assert commit == full_commit != first_commit
+    assert exports[0] is None and exports[1] is not None and exports[2] is None
+    assert incremental == list(iter_manifest(full_manifest))
+
+
+def test_a_rescan_of_the_same_commit_fetches_nothing(tmp_path, scanner, monkeypatch):
+    url = make_repo(str(tmp_path), "small")
+    commit, manifest = repo_scan.scan_repository(url)
+    report = repo_scan.scan_report(url)
+
+    def no_fetch(self):
+        raise AssertionError("fetched although the remote HEAD was already scanned")
+
+    monkeypatch.setattr(GitMirror, "sync", no_fetch)
+    assert repo_scan.scan_repository(url) == (commit, manifest)
+    assert repo_scan.scan_report(url) == report
+
+
+def test_git_commands_are_killed_after_the_timeout(tmp_path, monkeypatch):
+    seen = []
+
+    def run(args, **kwargs):
+        seen.append(kwargs.get("timeout"))
+        raise subprocess.TimeoutExpired(args, kwargs.get("timeout"))
+
+    monkeypatch.setattr(subprocess, "run", run)
+    mirror = GitMirror(str(tmp_path), "file:///nowhere", timeout=7)
+    with pytest.raises(subprocess.TimeoutExpired):
+        mirror.remote_head()
+    with pytest.raises(subprocess.TimeoutExpired):
+        mirror.sync()
+    assert seen == [7, 7]
@@ -0,0 +1,192 @@
+import pytest
+
+from components import resilience
+from components.resilience import CircuitBreaker, CircuitOpenError, DeadlineExceeded, RetryPolicy
+
+
+class Clock:
+    """A monotonic clock moved by hand, so the breaker timings are deterministic"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(resilience.time, "sleep", clock.sleep)
+    return clock
+
+
+class Transient(Exception):
+    status_code = 429
+
+
+class BadRequest(Exception):
+    status_code = 400
+
+
+def failing(exc):
+    def func():
+        raise exc
+    return func
+
+
+def open_breaker(breaker):
+    for _ in range(breaker.failure_threshold):
+        breaker.allow()
+        breaker.record_failure()
+
+
+def test_opens_after_the_failure_threshold(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3, reset_seconds=30)
+    for _ in range(2):
+        breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    assert breaker.rejections == 1
+
+
+def test_a_success_resets_the_consecutive_failures(clock):
+    breaker = CircuitBreaker("test", failure_threshold=3)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert (breaker.state, breaker.failures) == ("closed", 1)
+
+
+def test_half_open_lets_a_single_trial_through_and_closes_on_success(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+
+    clock.sleep(29)
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+
+    clock.sleep(1)
+    breaker.allow()                                   # the trial call
+    assert breaker.state == "half_open"
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()                               # only one trial at a time
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    breaker.allow()
+
+
+def test_a_failed_trial_opens_the_breaker_again(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock.sleep(30)
+
+    breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.sleep(29)
+    with pytest.raises(CircuitOpenError):
+        breaker.allow()
+    clock.sleep(1)
+    breaker.allow()
+    assert breaker.state == "half_open"
+
+
+def test_a_released_trial_lets_the_next_call_try(clock):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    open_breaker(breaker)
+    clock.sleep(30)
+
+    breaker.allow()
+    breaker.release()                                 # e.g. the trial got a 400
+    breaker.allow()
+    assert breaker.state == "half_open"
+
+
+def test_retries_count_as_one_breaker_failure(clock, monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_seconds=30)
+    monkeypatch.setitem(resilience.breakers, "retried", breaker)
+    policy = RetryPolicy(attempts=3, base_delay=0.1, max_delay=0.1)
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise Transient("rate limited")
+
+    with pytest.raises(Transient):
+        resilience.call("retried", func, policy=policy)
+    assert len(calls) == 3
+    assert (breaker.state, breaker.failures) == ("closed", 1)
+
+    with pytest.raises(Transient):
+        resilience.call("retried", func, policy=policy)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        resilience.call("retried", func, policy=policy)
+    assert len(calls) == 6
+
+
+def test_a_retry_that_succeeds_resets_the_failures(clock, monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    monkeypatch.setitem(resilience.breakers, "flaky", breaker)
+    results = iter([Transient("busy"), Transient("busy"), "ok"])
+
+    def func():
+        result = next(results)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    assert resilience.call("flaky", func, policy=RetryPolicy(attempts=3, base_delay=0.1)) == "ok"
+    assert (breaker.state, breaker.failures) == ("closed", 0)
+
+
+def test_client_errors_are_not_retried_and_do_not_count(clock, monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=1)
+    monkeypatch.setitem(resilience.breakers, "client", breaker)
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise BadRequest("bad request")
+
+    with pytest.raises(BadRequest):
+        resilience.call("client", func, policy=RetryPolicy(attempts=3))
+    assert len(calls) == 1
+    assert breaker.state == "closed"
+
+
+def test_a_failed_trial_is_not_retried(clock, monkeypatch):
+    breaker = CircuitBreaker("test", failure_threshold=1, reset_seconds=30)
+    monkeypatch.setitem(resilience.breakers, "trial", breaker)
+    open_breaker(breaker)
+    clock.sleep(30)
+    calls = []
+
+    def func():
+        calls.append(1)
+        raise Transient("still down")
+
+    with pytest.raises(Transient):
+        resilience.call("trial", func, policy=RetryPolicy(attempts=3, base_delay=0.1))
+    assert len(calls) == 1
+    assert breaker.state == "open"
+
+
+def test_no_retry_past_the_deadline(clock, monkeypatch):
+    monkeypatch.setitem(resilience.breakers, "slow", CircuitBreaker("test"))
+    with resilience.deadline(5):
+        assert resilience.timeout_for(600) == 5
+        clock.sleep(5)
+        with pytest.raises(DeadlineExceeded):
+            resilience.call("slow", failing(Transient("busy")))
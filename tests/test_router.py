@@ -0,0 +1,162 @@
+import time
+
+import pytest
+
+from components.game import Prompt
+from components.router import Backend, ModelRouter, StubBackend
+
+PROMPT = Prompt(messages=[{"role": "user", "content": "hi"}], tools=[])
+
+
+def stub(name, **kwargs):
+    # answer with the name of the backend, so a test can tell which one answered (and litellm is not imported)
+    return StubBackend(name, respond=lambda prompt: name, **kwargs)
+
+
+def make_router(backends, **kwargs):
+    options = {"hedge": False, "health_min_samples": 3, "probe_seconds": 60.0}
+    options.update(kwargs)
+    return ModelRouter(backends, **options)
+
+
+def test_fails_over_in_configured_order():
+    first, second, third = stub("first", error_rate=1.0), stub("second", error_rate=1.0), stub("third")
+    router = make_router([first, second, third])
+
+    assert router.complete(PROMPT) == "third"
+    assert (first.calls, second.calls, third.calls) == (1, 1, 1)
+    assert router.failovers == 2
+
+
+def test_raises_when_every_backend_fails():
+    router = make_router([stub("first", error_rate=1.0), stub("second", error_rate=1.0)])
+    with pytest.raises(RuntimeError, match="Every model backend failed"):
+        router.complete(PROMPT)
+
+
+def test_one_failure_does_not_demote_a_backend():
+    primary, fallback = stub("primary", error_rate=1.0), stub("fallback")
+    router = make_router([primary, fallback])
+
+    router.complete(PROMPT)
+    assert [b.name for b in router.order()] == ["primary", "fallback"]
+
+
+def test_demoted_after_min_samples_then_recovers_with_a_probe():
+    primary, fallback = stub("primary", error_rate=1.0), stub("fallback")
+    router = make_router([primary, fallback], probe_seconds=0.05)
+
+    for _ in range(3):
+        assert router.complete(PROMPT) == "fallback"
+    assert [b.name for b in router.order()] == ["fallback", "primary"]
+
+    # while demoted, calls go to the fallback without trying the primary
+    router.complete(PROMPT)
+    assert primary.calls == 3
+
+    primary.error_rate = 0.0
+    time.sleep(0.06)
+    assert router.complete(PROMPT) == "primary"       # the probe
+    assert router.probes == 1
+    assert [b.name for b in router.order()] == ["primary", "fallback"]
+
+
+def test_failed_probe_keeps_the_backend_demoted():
+    primary, fallback = stub("primary", error_rate=1.0), stub("fallback")
+    router = make_router([primary, fallback], probe_seconds=0.05)
+    for _ in range(3):
+        router.complete(PROMPT)
+    router.complete(PROMPT)                            # starts the probe clock
+    time.sleep(0.06)
+
+    assert router.complete(PROMPT) == "fallback"
+    assert primary.calls == 4
+    assert [b.name for b in router.order()] == ["fallback", "primary"]
+
+
+def test_old_samples_expire():
+    primary, fallback = stub("primary", error_rate=1.0), stub("fallback")
+    router = make_router([primary, fallback], stats_max_age=0.05)
+    for _ in range(3):
+        router.complete(PROMPT)
+    assert router.order()[0] is fallback
+
+    time.sleep(0.06)
+    assert router.order()[0] is primary
+
+
+def warm_up(router, backend, calls):
+    for _ in range(calls):
+        router._call(backend, PROMPT)
+
+
+def test_hedges_a_call_slower_than_p95_and_the_first_answer_wins():
+    latency = {"primary": 0.01}
+    primary = stub("primary", latency=lambda: latency["primary"])
+    fallback = stub("fallback", latency=0.01)
+    router = make_router([primary, fallback], hedge=True, hedge_min_samples=5)
+    warm_up(router, primary, 5)
+
+    latency["primary"] = 0.5
+    started = time.perf_counter()
+    assert router.complete(PROMPT) == "fallback"
+    assert time.perf_counter() - started < 0.3
+    assert (router.hedges, router.hedge_wins) == (1, 1)
+
+
+def test_no_hedge_when_the_primary_answers_within_p95():
+    primary, fallback = stub("primary", latency=0.05), stub("fallback")
+    router = make_router([primary, fallback], hedge=True, hedge_min_samples=5, hedge_factor=3.0)
+    warm_up(router, primary, 5)
+
+    assert router.complete(PROMPT) == "primary"
+    assert router.hedges == 0
+    assert fallback.calls == 0
+
+
+def test_no_hedge_before_enough_samples():
+    primary, fallback = stub("primary", latency=0.05), stub("fallback")
+    router = make_router([primary, fallback], hedge=True, hedge_min_samples=5)
+    warm_up(router, primary, 4)
+
+    assert router.hedge_deadline(primary) is None
+    assert router.complete(PROMPT) == "primary"
+    assert fallback.calls == 0
+
+
+class FlakyStream(Backend):
+    """Yields `tokens` and then fails, or fails before the first token if `tokens` is empty"""
+    def __init__(self, name, tokens):
+        self.name = name
+        self.tokens = tokens
+
+    def stream(self, prompt):
+        for token in self.tokens:
+            yield {"type": "token", "text": token}
+        raise RuntimeError(f"{self.name}: stream dropped")
+
+
+def test_stream_fails_over_before_the_first_token():
+    router = make_router([FlakyStream("broken", []), stub("fallback")])
+    events = list(router.stream(PROMPT))
+
+    assert events == [{"type": "message", "message": "fallback"}]
+    assert router.failovers == 1
+
+
+def test_stream_does_not_fail_over_after_the_first_token():
+    fallback = stub("fallback")
+    router = make_router([FlakyStream("broken", ["Hel"]), fallback])
+    events = []
+    with pytest.raises(RuntimeError, match="stream dropped"):
+        for event in router.stream(PROMPT):
+            events.append(event)
+
+    assert events == [{"type": "token", "text": "Hel"}]
+    assert fallback.calls == 0
+
+
+def test_async_complete_fails_over():
+    import asyncio
+    router = make_router([stub("first", error_rate=1.0), stub("second")])
+    assert asyncio.run(router.acomplete(PROMPT)) == "second"
@@ -1,19 +1,46 @@
 import streamlit as st
-import pandas as pd
 import time
 import datetime as dt
 import json
+import uuid
+import contextvars
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+from components.event_log import event_log
+
+# session id of the CLI (and of any code running outside a streamlit script)
+CLI_SESSION_ID = uuid.uuid4().hex
+
+# session id of the code running outside the streamlit script thread on behalf of a session (e.g. a background job)
+session_id_var: contextvars.ContextVar[str | None] = contextvars.ContextVar("session_id", default=None)
 
 def stream_data(msg):
     for word in msg.split(" "):
         yield word + " "
         time.sleep(0.02)
 
+def bind_thread_context(func):
+    """
+    Wrap func so that it runs in a worker thread with the caller's streamlit script context
+    (so st.write / st.session_state keep working) and a copy of the caller's contextvars.
+    """
+    script_ctx = get_script_run_ctx(suppress_warning=True)
+    context = contextvars.copy_context()
+
+    def wrapper(*args, **kwargs):
+        if script_ctx is not None:
+            add_script_run_ctx(ctx=script_ctx)
+        # one copy per call: a context cannot be entered by two threads at once
+        return context.copy().run(func, *args, **kwargs)
+    return wrapper
+
 def format_message(message):
-    if not (message.startswith("{") and message.endswith("}")):
+    if not isinstance(message, str) or not (message.startswith("{") and message.endswith("}")):
         return message
     
-    body = json.loads(message)
+    try:
+        body = json.loads(message)
+    except json.JSONDecodeError:
+        return message
     if "message" in body:
         return body['message']
     elif "result" in body:
@@ -32,54 +59,75 @@ def format_tool_calls(messages):
     return value
 
 
+def get_session_id():
+    """Id of the current streamlit session, or of the CLI process outside streamlit"""
+    if session_id_var.get() is not None:
+        return session_id_var.get()
+    if get_script_run_ctx(suppress_warning=True) is None:
+        return CLI_SESSION_ID
+    if "session_id" not in st.session_state:
+        st.session_state["session_id"] = uuid.uuid4().hex
+    return st.session_state["session_id"]
+
+
 def add_global_memory(agent_name, memory):
-    if "global_memory" not in st.session_state:
-        st.session_state["global_memory"] = []
-        
-    
-    st.session_state['global_memory'].append(
-        {"agent_session": agent_name, 
-            "role": memory.get("role", None),
-            "content": memory.get("content", None),
-            "tool_calls": memory.get("tool_calls", None),
-            "time": memory.get("time", None)
-        }
+    """Append a message to the global event log. The concise rendering is computed once, here."""
+    content = memory.get("content", None)
+    tool_calls = memory.get("tool_calls", None)
+    event_log.append(
+        session = get_session_id(),
+        agent = agent_name,
+        role = memory.get("role", None),
+        content = content,
+        tool_calls = tool_calls,
+        concise_content = format_message(content),
+        concise_tool_calls = format_tool_calls(tool_calls),
+        timestamp = float(memory.get("time", None) or time.time())
     )
 
 
 @st.dialog("Global Memory", width = "large")
 def render_global_memory():
-    if not st.session_state['global_memory']:
+    session = get_session_id()
+    total = event_log.count(session = session)
+    if not total:
         st.warning("No memory yet!")
     else:
-        df = pd.DataFrame(st.session_state['global_memory'])
-        df['time_on_display'] = df['time'].apply(lambda x: dt.datetime.fromtimestamp(float(x)).strftime("%Y-%m-%d %H:%M:%S"))
-
         LEFT, RIGHT = st.columns((0.2, 0.8))
         with LEFT:
-            agent = st.selectbox("Agent filter", ['all'] + df['agent_session'].unique().tolist(), index = 0)
+            agent = st.selectbox("Agent filter", ['all'] + event_log.agents(session = session), index = 0)
             mode  = st.pills("Render mode", ["raw", "concise"], default = "concise")
+            search = st.text_input("Search content")
+            page_size = st.selectbox("Rows per page", [25, 50, 100, 200], index = 1)
 
-        with RIGHT:
-            if agent != "all":
-                df = df[df['agent_session'] == agent]
-
-            if mode == "concise":
-                df['content'] = df['content'].apply(lambda x: format_message(x))
-                df['tool_calls'] = df['tool_calls'].apply(lambda x: format_tool_calls(x))
-
-            st.dataframe(df.sort_values(by = "time", ascending = True),
-                column_config = {
-                    "time": None
-                }
-            )
+            # filtering and pagination run in SQLite: only one page is loaded
+            filters = {"session": session, "agent": None if agent == "all" else agent, "search": search or None}
+            matched = event_log.count(**filters)
+            pages = max((matched + page_size - 1) // page_size, 1)
+            page = st.number_input(f"Page (of {pages})", min_value = 1, max_value = pages, value = 1, step = 1)
+            st.caption(f"{matched} of {total} events")
 
-def render_sidebar(agent_registry):
+        with RIGHT:
+            rows = event_log.query(**filters, offset = (page - 1) * page_size, limit = page_size)
+            content_key, tool_calls_key = ("concise_content", "concise_tool_calls") if mode == "concise" else ("content", "tool_calls")
+            st.dataframe([
+                {
+                    "agent_session": row["agent"],
+                    "role": row["role"],
+                    "content": row[content_key],
+                    "tool_calls": row[tool_calls_key],
+                    "time_on_display": dt.datetime.fromtimestamp(row["time"]).strftime("%Y-%m-%d %H:%M:%S")
+                } for row in rows
+            ])
+
+def render_sidebar(agent_registry, session = None):
     """
     Render a streamlit sidebar
     
     :param agent_registry: the AgentRegistry object
+    :param session: the Session object, to show its README and the token usage of its memory
     """
+    memory = session.memory if session is not None else None
     with st.sidebar:
         st.header("README Writer Agent")
         st.caption("A multi-agent system that analyzes a remote git repository and writes a README.md file. Start using it by pasting a :blue[**public remote github repository url.**]")
@@ -87,10 +135,10 @@ def render_sidebar(agent_registry):
 
         st.subheader(":material/output_circle: **Most Recent Result**")
         with st.container(border = True):
-            if "README" in st.session_state:
+            if session is not None and session.readme is not None:
                 st.download_button(
                     label = "README.md",
-                    data = st.session_state.README,
+                    data = session.readme,
                     file_name = "README.md",
                     icon = ":material/download:",
                     width = "stretch",
@@ -105,6 +153,10 @@ def render_sidebar(agent_registry):
         with st.container(border = True):
             for agent in agent_registry.agents.keys():
                 with st.expander(agent):
+                    if not agent_registry.is_loaded(agent):
+                        # listing the tools would import the agent: wait until it is first called
+                        st.caption("Loaded on first use.")
+                        continue
                     text = "\n"
                     for tool in agent_registry.get_agent_tool_registry(agent):
                         text += f"> {tool}\n"
@@ -113,10 +165,24 @@ def render_sidebar(agent_registry):
 
         st.subheader(":material/memory: **Analyze Global Memory**")
         with st.container(border = True):
-            st.caption(":red[Clicking this button will interrupt any running session.]")
-            if st.button("Click to open", width = "stretch", disabled = st.session_state['running']):
+            if st.button("Click to open", width = "stretch"):
                 render_global_memory()
 
+            if memory is not None:
+                st.caption(f"Stored memory: {len(memory.items)} messages, {memory.total_tokens()} tokens")
+                for compaction in memory.compactions[-3:]:
+                    if "error" in compaction:
+                        st.caption(f":red[Compaction failed: {compaction['error']}]")
+                    else:
+                        st.caption(f"Compacted {compaction['messages']} messages: {compaction['tokens_before']} → {compaction['tokens_after']} tokens")
+
+            from components.model import limiters
+            for name, limiter in list(limiters.items()):
+                stats = limiter.snapshot()
+                if stats["calls"]:
+                    st.caption(f"{name}: {stats['in_flight']} in flight, {stats['queued_now']} queued, "
+                               f"queue wait p95 {stats['wait_p95_s']}s")
+
             "Other sidebar design components go here"
         
 def handle_running_session(func):